@@ -15,62 +15,539 @@ It relies on two components:
     - given a current price update for an asset, detects an arbitrage
     possibility by comparing it to stored prices
 
-To achieve this, the application instantiates an asyncroneous task for
-each asset and market combination to run infinite loop of price request
-and arbitrage detection jobs.
+To achieve this, the application polls each asset and market
+combination in a pipeline of stages connected by bounded queues: price
+requests, arbitrage detection and price updates, each stage run by its
+own number of workers (see `core.pipeline`).
 
 Configurations:
 
-MAX_CONCURRENT_TASKS (environment variable) - number of tasks to be
-    executed concurrently
+MAX_CONCURRENT_TASKS (environment variable) - number of price requests
+    executed concurrently, unless PIPELINE_FETCH_WORKERS is set
+PIPELINE_FETCH_WORKERS, PIPELINE_DETECT_WORKERS, PIPELINE_UPDATE_WORKERS
+    (environment variables) - number of workers of each pipeline stage
+PIPELINE_QUEUE_SIZE (environment variable) - capacity of queues between
+    stages. A newer price of a pair waiting in a queue replaces the
+    older one
 PRICES_REQUEST_INTERVAL_S (environment variable) - min timeout since
     succesfull request. Applies for each asset and market combination
     separately
+FETCH_MAX_CONNECTIONS, FETCH_KEEPALIVE_EXPIRY_S, FETCH_HTTP2 (environment
+    variables) - connection pool of the HTTP client shared by all tasks
+PRICES_FETCH_MODE (environment variable) - `pair` (default) polls each
+    asset and market combination in the pipeline every
+    PRICES_REQUEST_INTERVAL_S, `batch` a single task fetching all
+    of them with batch requests of at most FETCH_BATCH_SIZE pairs,
+    `stream` a single task receiving prices from the generator stream
+    and falling back to batch polling when the stream is unavailable,
+    `adaptive` polls each pair in the pipeline about as often as its
+    price changes and assets close to an arbitrage more often, within
+    POLL_RATE_LIMIT_RPS requests per second (see `core.poll_scheduler`)
+DETECTOR_MODE (environment variable) - `default` checks each price for
+    arbitrage as it arrives, `vectorized` checks each batch of prices at
+    once over assets x markets matrices (`batch` fetch mode only)
+ALERT_DEDUPLICATION, ALERT_MARGIN_CHANGE (environment variables) - an
+    ongoing opportunity is logged once it opens or closes, and again
+    only if its margin moves by more than ALERT_MARGIN_CHANGE share
+
+Prices with a version already processed are skipped, so unchanged
+quotes cost no detection.
+
+CATALOG_REFRESH_INTERVAL_S (environment variable) - tracked asset and
+    market pairs are discovered from the generator catalog at startup
+    and follow its changes, checked this often (see `core.catalog`)
+LATENCY_REPORT_INTERVAL_S (environment variable) - fetch, queueing,
+    detection and tick to detection latency percentiles, over all
+    prices and per generator replica, are logged this often; 0 disables
+    latency tracing (see `utils.latency`)
+FETCH_MAX_RETRIES, FETCH_RETRY_BACKOFF_S, FETCH_RETRY_MAX_BACKOFF_S,
+    FETCH_RETRY_BUDGET_RATIO, FETCH_BREAKER_FAILURES, FETCH_BREAKER_RESET_S,
+    FETCH_HEDGE, FETCH_HEDGE_PERCENTILE (environment variables) - failed
+    requests are retried with jittered exponential backoff within a
+    retry budget, requests to a failing generator are stopped by its
+    circuit breaker, and slow ones hedged if enabled (see
+    `utils.resilience`)
+PRICES_UPSTREAMS, PRICES_UPSTREAM_ROUTES, UPSTREAM_MAX_FAILS,
+    UPSTREAM_FAIL_TIMEOUT_S (environment variables) - generator replicas
+    requested directly instead of PRICES_SOURCE_HOST, in groups routed
+    by market, with weighted load balancing and failover (see
+    `utils.upstreams`)
+METRICS_HOST, METRICS_PORT (environment variables) - address runtime
+    metrics are served at in Prometheus text format (`/metrics`); port
+    0, the default, disables the metrics server
+
+To use all cores of a host, `app.sharded` runs several analyzer
+processes, each tracking a shard of the assets.
 """
 import asyncio
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, List, Optional, Tuple, Union
+
 from decouple import config
+import httpx
 
+from .utils.event_sink import ArbitrageEventSink, create_event_sink
 from .utils.fetch_requests import PriceFetcher
+from .utils.latency import LatencyTracker
+from .utils.metrics import (LoopLagMonitor, MetricsRegistry, Samples,
+                            serve_metrics)
 from .utils.logger import get_logger
+from .utils.resilience import CircuitBreaker
+from .utils.upstreams import Upstream
+from .core.batch_detector import BatchArbitrageDetector
+from .core.catalog import CatalogTracker
 from .core.detector import ArbitrageDetector
+from .core.pipeline import PricesPipeline
+from .core.poll_scheduler import AdaptivePollScheduler, PollScheduler
 
 
 logger = get_logger(__name__)
-semaphore = asyncio.Semaphore(int(config('MAX_CONCURRENT_TASKS')))
 prices_request_interval_s = float(config('PRICES_REQUEST_INTERVAL_S'))
+# `pair` and `adaptive` modes pipeline
+pipeline_fetch_workers = int(config('PIPELINE_FETCH_WORKERS',
+                                    default=config('MAX_CONCURRENT_TASKS')))
+pipeline_detect_workers = int(config('PIPELINE_DETECT_WORKERS', default=1))
+pipeline_update_workers = int(config('PIPELINE_UPDATE_WORKERS', default=1))
+pipeline_queue_size = int(config('PIPELINE_QUEUE_SIZE', default=1000))
+pipeline_report_interval_s = float(config('PIPELINE_REPORT_INTERVAL_S',
+                                          default=60))
+# `pair` polls each asset and market separately, `batch` polls all of
+# them with a few batch requests, `stream` subscribes to prices stream,
+# `adaptive` polls each pair at its own pace within a global rate limit
+prices_fetch_mode = config('PRICES_FETCH_MODE', default='pair')
+# tracked pairs follow the generator catalog, requested this often (0
+# for startup only)
+catalog_refresh_interval_s = float(config('CATALOG_REFRESH_INTERVAL_S',
+                                          default=60))
+# `default` checks each price as it arrives, `vectorized` checks each
+# batch of prices at once (`batch` fetch mode only)
+detector_mode = config('DETECTOR_MODE', default='default')
+stream_reconnect_attempts = int(config('STREAM_RECONNECT_ATTEMPTS',
+                                       default=3))
+stream_fallback_s = float(config('STREAM_FALLBACK_S', default=30))
+STREAM_RECONNECT_DELAY_S = 0.5
+poll_rate_limit_rps = float(config('POLL_RATE_LIMIT_RPS', default=100))
+poll_min_interval_s = float(config('POLL_MIN_INTERVAL_S', default=0.1))
+poll_max_interval_s = float(config('POLL_MAX_INTERVAL_S', default=5))
+poll_near_crossing = float(config('POLL_NEAR_CROSSING', default=0.02))
+# detections are written to these files too, if set
+event_sink_jsonl_path = config('EVENT_SINK_JSONL_PATH', default='')
+event_sink_sqlite_path = config('EVENT_SINK_SQLITE_PATH', default='')
+event_sink_flush_size = int(config('EVENT_SINK_FLUSH_SIZE', default=100))
+event_sink_flush_interval_s = float(config('EVENT_SINK_FLUSH_INTERVAL_S',
+                                           default=1))
+event_sink_queue_size = int(config('EVENT_SINK_QUEUE_SIZE', default=10000))
+# `drop_oldest` or `drop_new`
+event_sink_queue_full_policy = config('EVENT_SINK_QUEUE_FULL_POLICY',
+                                      default='drop_oldest')
+# an ongoing opportunity is reported when it opens, closes or its margin
+# moves by more than ALERT_MARGIN_CHANGE share, instead of every check
+alert_margin_change = (float(config('ALERT_MARGIN_CHANGE', default=0.1))
+                       if config('ALERT_DEDUPLICATION', default=True,
+                                 cast=bool)
+                       else None)
+# stages of checked prices are traced into latency histograms reported
+# this often, 0 disables tracing
+latency_report_interval_s = float(config('LATENCY_REPORT_INTERVAL_S',
+                                         default=60))
+# runtime metrics server, off (0) unless a port is set
+metrics_server_host = config('METRICS_HOST', default='127.0.0.1')
+metrics_server_port = int(config('METRICS_PORT', default=0))
 
 
-async def fetch_and_process_price(
+async def fetch_and_process_prices(
         price_fetcher: PriceFetcher, detector: ArbitrageDetector,
-        asset: str, market: str
+        pairs: List[Tuple[str, str]]
         ):
-    """High-level function that runs infinite loop to fetch new price of
-    an asset on specific market and check for arbitrage opportunity
+    """High-level function that runs infinite loop to fetch new prices of
+    all provided asset and market pairs at once and check each of them
+    for arbitrage opportunity
     """
     while True:
-        asset_data = await price_fetcher.fetch_price(asset=asset,
-                                                     market=market)
-        if asset_data:
+        prices = await price_fetcher.fetch_prices(pairs)
+        for asset_data in prices.values():
             await detector.check_for_arbitrage(asset_data)
-            async with semaphore:
-                asyncio.create_task(detector.price_update(asset_data))
-                await asyncio.sleep(delay=prices_request_interval_s)
+            await detector.price_update(asset_data)
+        await asyncio.sleep(delay=prices_request_interval_s)
+
+
+async def fetch_and_detect_batches(
+        price_fetcher: PriceFetcher, batch_detector: BatchArbitrageDetector,
+        pairs: List[Tuple[str, str]]
+        ):
+    """High-level function that runs infinite loop to fetch new prices of
+    all provided asset and market pairs at once and check the whole batch
+    for arbitrage opportunities in one vectorized pass
+    """
+    while True:
+        prices = await price_fetcher.fetch_prices(pairs)
+        batch_detector.add_ticks(prices.values())
+        batch_detector.detect()
+        await asyncio.sleep(delay=prices_request_interval_s)
+
+
+async def poll_and_process_prices(
+        price_fetcher: PriceFetcher, detector: ArbitrageDetector,
+        scheduler: PollScheduler,
+        metrics: Optional[MetricsRegistry] = None
+        ):
+    """High-level function that runs infinite loop to poll asset and
+    market pairs when the scheduler finds them due and check their prices
+    for arbitrage opportunity, in fetch, detect and update stages
+    """
+    pipeline = PricesPipeline(
+        price_fetcher, detector, scheduler,
+        fetch_workers=pipeline_fetch_workers,
+        detect_workers=pipeline_detect_workers,
+        update_workers=pipeline_update_workers,
+        queue_size=pipeline_queue_size,
+        report_interval_s=pipeline_report_interval_s)
+    if metrics is not None:
+        add_pipeline_metrics(metrics, pipeline)
+    await pipeline.run()
+
+
+async def stream_and_process_prices(
+        price_fetcher: PriceFetcher, detector: ArbitrageDetector,
+        pairs: List[Tuple[str, str]]
+        ):
+    """High-level function that runs infinite loop to receive prices of
+    provided asset and market pairs from the generator prices stream and
+    check each of them for arbitrage opportunity as soon as it arrives.
+
+    Lost stream is reconnected with exponential backoff. Each connection
+    starts with current prices of all pairs, so reconnection resumes from
+    the latest state. Once `STREAM_RECONNECT_ATTEMPTS` attempts in a row
+    fail, or the generator has no stream, prices are polled for
+    `STREAM_FALLBACK_S` before the stream is tried again.
+    """
+    failed_attempts = 0
+    while True:
+        received = False
+        # pairs may change with the catalog, the stream is subscribed to
+        # pairs tracked at the moment
+        assets = list(dict.fromkeys(asset for asset, _ in pairs))
+        markets = list(dict.fromkeys(market for _, market in pairs))
+        catalog_version = detector.catalog_version
+        try:
+            async for asset_data in price_fetcher.stream_prices(assets,
+                                                                markets):
+                received = True
+                await detector.check_for_arbitrage(asset_data)
+                await detector.price_update(asset_data)
+                if detector.catalog_version != catalog_version:
+                    logger.info("Catalog changed, resubscribing")
+                    break
+            else:
+                logger.warning("Prices stream closed by the generator")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Prices stream is not available: {e}")
+            failed_attempts = stream_reconnect_attempts
+        except httpx.RequestError as e:
+            logger.error(f"Prices stream error: {e!r}")
+
+        failed_attempts = 0 if received else failed_attempts + 1
+        if failed_attempts >= stream_reconnect_attempts:
+            logger.warning(
+                f"Falling back to polling for {stream_fallback_s} s")
+            try:
+                await asyncio.wait_for(
+                    fetch_and_process_prices(price_fetcher, detector, pairs),
+                    timeout=stream_fallback_s)
+            except asyncio.TimeoutError:
+                pass
+            failed_attempts = 0
+        else:
+            await asyncio.sleep(STREAM_RECONNECT_DELAY_S
+                                * 2 ** max(0, failed_attempts - 1))
+
+
+def get_event_sink(path_suffix: str = '') -> Optional[ArbitrageEventSink]:
+    """Detections sink configured by EVENT_SINK_* variables, None if no
+    destination is set"""
+    return create_event_sink(
+        jsonl_path=event_sink_jsonl_path,
+        sqlite_path=event_sink_sqlite_path,
+        path_suffix=path_suffix,
+        flush_size=event_sink_flush_size,
+        flush_interval_s=event_sink_flush_interval_s,
+        queue_size=event_sink_queue_size,
+        queue_full_policy=event_sink_queue_full_policy)
+
+
+def add_analyzer_metrics(
+        registry: MetricsRegistry, price_fetcher: PriceFetcher,
+        detector: Union[ArbitrageDetector, BatchArbitrageDetector],
+        loop_lag: LoopLagMonitor,
+        event_sink: Optional[ArbitrageEventSink] = None
+        ) -> None:
+    """Metrics of the fetcher, the detector checking prices, the event
+    loop and the event sink, read from them on scrape"""
+    registry.add_value(
+        'analyzer_fetch_requests_total', 'counter',
+        'HTTP requests sent to the generator',
+        lambda: price_fetcher.requests_count)
+    registry.add_value(
+        'analyzer_fetch_prices_total', 'counter',
+        'Prices received from the generator',
+        lambda: price_fetcher.prices_count)
+    registry.add(
+        'analyzer_fetch_errors_total', 'counter',
+        'Failed requests by error type',
+        lambda: [({'type': error_type}, count) for error_type, count
+                 in sorted(price_fetcher.errors.items())])
+    registry.add(
+        'analyzer_fetch_resilience_total', 'counter',
+        'Retries, circuit breaker rejections and hedged requests by'
+        ' outcome',
+        lambda: [({'outcome': outcome}, count)
+                 for outcome, count in price_fetcher.outcomes.items()])
+    registry.add(
+        'analyzer_circuit_state', 'gauge',
+        'Circuit breaker state by generator, 1 for the current one',
+        lambda: [({'upstream': base_url, 'state': state},
+                  breaker.state == state)
+                 for base_url, breaker
+                 in sorted(price_fetcher.breakers.items())
+                 for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN,
+                               CircuitBreaker.HALF_OPEN)])
+    registry.add(
+        'analyzer_circuit_opened_total', 'counter',
+        'Times the circuit breaker opened by generator',
+        lambda: [({'upstream': base_url}, breaker.opened_count)
+                 for base_url, breaker
+                 in sorted(price_fetcher.breakers.items())])
+    upstreams = price_fetcher.upstreams
+    if upstreams is not None:
+        registry.add_value(
+            'analyzer_fetch_failovers_total', 'counter',
+            'Requests sent to another upstream after one failed',
+            lambda: price_fetcher.failovers_count)
+
+        def collect_by_upstream(get_value: Callable[[Upstream], float]
+                                ) -> Samples:
+            return [({'group': group.name, 'upstream': upstream.base_url},
+                     get_value(upstream))
+                    for group in upstreams.groups.values()
+                    for upstream in group.upstreams]
+
+        for name, kind, documentation, get_value in (
+                ('requests_total', 'counter', 'Requests sent',
+                 lambda upstream: upstream.requests_count),
+                ('fails_total', 'counter', 'Failed requests',
+                 lambda upstream: upstream.fails_count),
+                ('ejections_total', 'counter',
+                 'Times ejected after repeated failures',
+                 lambda upstream: upstream.ejections_count),
+                ('available', 'gauge', 'Whether not ejected',
+                 lambda upstream: upstream.is_available()),
+                ('outstanding', 'gauge', 'Requests and streams in flight',
+                 lambda upstream: upstream.outstanding)):
+            registry.add(
+                f'analyzer_upstream_{name}', kind,
+                f'{documentation}, by generator upstream',
+                partial(collect_by_upstream, get_value))
+    registry.add_value(
+        'analyzer_checks_total', 'counter', 'Prices checked for arbitrage',
+        lambda: detector.checks_count)
+    registry.add_value(
+        'analyzer_skipped_total', 'counter',
+        'Prices skipped as already processed',
+        lambda: detector.skipped_count)
+    registry.add_value(
+        'analyzer_detections_total', 'counter',
+        'Arbitrage opportunities detected',
+        lambda: detector.detections_count)
+    registry.add_value(
+        'analyzer_alerts_suppressed_total', 'counter',
+        'Detections of open opportunities not reported again',
+        lambda: (0 if detector.tracker is None
+                 else detector.tracker.suppressed_count))
+    # the batch detector has no locks
+    if not isinstance(detector, BatchArbitrageDetector):
+        registry.add_value(
+            'analyzer_lock_acquisitions_total', 'counter',
+            'Asset lock acquisitions', lambda: detector.lock_wait.count)
+        registry.add_value(
+            'analyzer_lock_contended_total', 'counter',
+            'Asset lock acquisitions that had to wait',
+            lambda: detector.lock_wait.contended_count)
+        registry.add_value(
+            'analyzer_lock_wait_seconds_total', 'counter',
+            'Time spent waiting for asset locks',
+            lambda: detector.lock_wait.total_s)
+        registry.add_value(
+            'analyzer_lock_wait_max_seconds', 'gauge',
+            'Longest wait for an asset lock',
+            lambda: detector.lock_wait.max_s)
+    latency = detector.latency
+    if latency is not None:
+        registry.add(
+            'analyzer_tick_latency_seconds', 'summary',
+            'Stages of checked prices, over all prices and by generator'
+            ' replica (see utils.latency)',
+            lambda: [
+                ({'stage': stage} if dimension == 'all'
+                 else {'stage': stage, 'server': name}, histogram)
+                for (stage, dimension, name), histogram
+                in latency.histograms.items() if dimension != 'asset'])
+    registry.add(
+        'analyzer_event_loop_lag_seconds', 'summary',
+        'Delay of event loop wakeups, i.e. of work waiting for the loop',
+        lambda: [({}, loop_lag.histogram)])
+    if event_sink is not None:
+        registry.add(
+            'analyzer_events_total', 'counter',
+            'Detection events by outcome: queued, written, dropped once'
+            ' the queue is full and failed to be written',
+            lambda: [({'outcome': outcome}, count) for outcome, count in (
+                ('queued', event_sink.put_count),
+                ('written', event_sink.written_count),
+                ('dropped', event_sink.dropped_count),
+                ('failed', event_sink.failed_count))])
+
+
+def add_pipeline_metrics(registry: MetricsRegistry,
+                         pipeline: PricesPipeline) -> None:
+    """Queues of the pipeline and polls of its scheduler, i.e. how long
+    prices wait for a free worker"""
+    queues = pipeline.get_stats()
+    registry.add(
+        'analyzer_pipeline_queue_depth', 'gauge',
+        'Pairs waiting in a pipeline queue, by the stage it feeds',
+        lambda: [({'stage': stage}, queue.qsize())
+                 for stage, queue in queues.items()])
+    registry.add(
+        'analyzer_pipeline_queue_max_depth', 'gauge',
+        'Highest number of pairs waiting in a pipeline queue',
+        lambda: [({'stage': stage}, queue.max_depth)
+                 for stage, queue in queues.items()])
+    registry.add(
+        'analyzer_pipeline_replaced_total', 'counter',
+        'Prices replaced by a newer one while waiting in a pipeline queue',
+        lambda: [({'stage': stage}, queue.dropped_count)
+                 for stage, queue in queues.items()])
+    registry.add_value(
+        'analyzer_polls_total', 'counter', 'Polls of asset and market pairs',
+        lambda: pipeline.scheduler.polls_count)
+
+
+def get_latency_tracker() -> Optional[LatencyTracker]:
+    """Latency tracker of checked prices, None if tracing is disabled
+    by LATENCY_REPORT_INTERVAL_S"""
+    return LatencyTracker() if latency_report_interval_s > 0 else None
+
+
+async def report_latency(latency: LatencyTracker) -> None:
+    """Log latency percentiles every LATENCY_REPORT_INTERVAL_S"""
+    while True:
+        await asyncio.sleep(latency_report_interval_s)
+        latency.log_report()
+
+
+async def run(price_fetcher: PriceFetcher, detector: ArbitrageDetector,
+              batch_detector: Optional[BatchArbitrageDetector] = None,
+              event_sink: Optional[ArbitrageEventSink] = None,
+              asset_filter: Optional[Callable[[str], bool]] = None,
+              metrics_port: Optional[int] = None
+              ) -> None:
+    """Fetches and processes prices of every asset and market combination
+    of the generator catalog passing `asset_filter`, in the configured
+    fetch mode. The catalog is discovered first and followed every
+    CATALOG_REFRESH_INTERVAL_S; without a catalog, pairs of the detector
+    lists are tracked.
+    `batch_detector` is used in `batch` mode with `vectorized` detector,
+    created out of the detector lists and `event_sink` if not provided.
+    Latency of the detector tracker, if any, is reported periodically.
+    Metrics are served at `metrics_port`, METRICS_PORT by default.
+    """
+    port = metrics_server_port if metrics_port is None else metrics_port
+    metrics = MetricsRegistry() if port > 0 else None
+    catalog = CatalogTracker(price_fetcher, detector,
+                             asset_filter=asset_filter,
+                             refresh_interval_s=catalog_refresh_interval_s)
+    await catalog.refresh()
+    pairs = catalog.pairs
+
+    if prices_fetch_mode == 'batch' and detector_mode == 'vectorized':
+        if batch_detector is None:
+            batch_detector = BatchArbitrageDetector(
+                detector.assets_list, detector.markets_list,
+                event_sink=event_sink,
+                alert_margin_change=alert_margin_change,
+                latency=detector.latency)
+        else:
+            batch_detector.set_catalog(detector.assets_list,
+                                       detector.markets_list)
+        catalog.batch_detector = batch_detector
+        processing = fetch_and_detect_batches(price_fetcher, batch_detector,
+                                              pairs)
+    elif prices_fetch_mode == 'batch':
+        processing = fetch_and_process_prices(price_fetcher, detector, pairs)
+    elif prices_fetch_mode == 'stream':
+        processing = stream_and_process_prices(price_fetcher, detector,
+                                               pairs)
+    else:
+        if prices_fetch_mode == 'adaptive':
+            catalog.scheduler = AdaptivePollScheduler(
+                pairs, detector,
+                rate_limit=poll_rate_limit_rps,
+                min_interval_s=poll_min_interval_s,
+                max_interval_s=poll_max_interval_s,
+                initial_interval_s=prices_request_interval_s,
+                near_crossing=poll_near_crossing)
+        else:
+            catalog.scheduler = PollScheduler(
+                pairs, interval_s=prices_request_interval_s)
+        processing = poll_and_process_prices(price_fetcher, detector,
+                                             catalog.scheduler, metrics)
+
+    background = []
+    if catalog_refresh_interval_s > 0:
+        background.append(catalog.run())
+    if detector.latency is not None:
+        background.append(report_latency(detector.latency))
+    server = None
+    if metrics is not None:
+        loop_lag = LoopLagMonitor()
+        background.append(loop_lag.run())
+        add_analyzer_metrics(metrics, price_fetcher,
+                             catalog.batch_detector or detector, loop_lag,
+                             event_sink)
+        try:
+            server = await serve_metrics(metrics, metrics_server_host, port)
+            logger.info(
+                f"Metrics served at http://{metrics_server_host}:{port}"
+                "/metrics")
+        except OSError as e:
+            logger.error(f"Metrics server failed to start: {e}")
+    tasks = [asyncio.create_task(coro) for coro in background]
+    try:
+        await processing
+    finally:
+        for task in tasks:
+            task.cancel()
+        if server is not None:
+            server.close()
 
 
 async def main():
     """Initializes application and launches an asynchronous task for
     each asset and market combination
     """
-    detector = ArbitrageDetector()
+    event_sink = get_event_sink()
+    detector = ArbitrageDetector(event_sink=event_sink,
+                                 alert_margin_change=alert_margin_change,
+                                 latency=get_latency_tracker())
     price_fetcher = PriceFetcher()
+    await price_fetcher.start()
 
-    # initialize task for each asset / market pair
-    tasks = [
-        fetch_and_process_price(price_fetcher, detector, asset, market)
-        for asset in detector.assets_list
-        for market in detector.markets_list
-    ]
-    await asyncio.gather(*tasks)
+    try:
+        async with event_sink or nullcontext():
+            await run(price_fetcher, detector, event_sink=event_sink)
+    finally:
+        await price_fetcher.close()
 
 
 if __name__ == "__main__":
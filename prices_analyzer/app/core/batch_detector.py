@@ -0,0 +1,249 @@
+"""
+Batch Arbitrage Detector Module
+
+Vectorized counterpart of `ArbitrageDetector`: prices are kept in
+assets x markets NumPy matrices, ticks are accumulated and all
+cross-market opportunities of a batch are detected in one pass.
+"""
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .opportunity_tracker import OpportunityTracker, QuoteGetter
+from ..utils import schemas
+from ..utils.event_sink import ArbitrageEventSink
+from ..utils.latency import LatencyTracker
+from ..utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class BatchArbitrageDetector:
+    """
+    Implements vectorized arbitrage detector.
+
+    Functionality:
+    - Keeps latest buying and selling price of each asset on each market
+        in assets x markets matrices
+    - Accumulates ticks (`add_tick`, `add_ticks_arrays`)
+    - Detects arbitrage of every asset having ticks in the batch at once
+        (`detect`): the lowest buying price of a row is compared with the
+        highest selling one. A market's buying price is always above its
+        selling price, so an opportunity always involves two different
+        markets.
+
+    Messages are the same as `ArbitrageDetector.check_for_arbitrage`
+    ones, one per asset with the best buying and selling markets.
+    Applied ticks and detected opportunities are counted in
+    `checks_count` and `detections_count`. Opportunities are put into
+    `event_sink` as well, if set.
+
+    As in `ArbitrageDetector`, ticks with the version of the stored price
+    are skipped (`skipped_count`), and with `alert_margin_change` set
+    opportunities are logged and put into the sink only when they open,
+    close or their margin moves by more than this share. If `latency` is
+    set, stages of queued ticks are recorded into it once their batch is
+    detected; ticks applied as arrays carry no timestamps to trace.
+    """
+
+    def __init__(self, assets_list: List[str], markets_list: List[str],
+                 event_sink: Optional[ArbitrageEventSink] = None,
+                 alert_margin_change: Optional[float] = None,
+                 latency: Optional[LatencyTracker] = None) -> None:
+        if not assets_list:
+            raise ValueError("No assets provided")
+        self.assets_list = list(assets_list)
+        self.markets_list = list(markets_list)
+        self.event_sink = event_sink
+        self.latency = latency
+        # queued ticks, kept for latency tracing only
+        self._traced: List[schemas.AssetPriceFromApi] = []
+        self.tracker = (OpportunityTracker(alert_margin_change)
+                        if alert_margin_change is not None else None)
+        self.asset_ids = {asset: idx
+                          for idx, asset in enumerate(self.assets_list)}
+        self.market_ids = {market: idx
+                           for idx, market in enumerate(self.markets_list)}
+
+        shape = (len(self.assets_list), len(self.markets_list))
+        # markets without prices never take part in an opportunity
+        self.prices_buy = np.full(shape, np.inf)
+        self.prices_sell = np.full(shape, -np.inf)
+        # version of each price, -1 if unknown
+        self.versions = np.full(shape, -1, dtype=np.int64)
+        self._dirty = np.zeros(len(self.assets_list), dtype=bool)
+        self._pending: Tuple[List[int], List[int], List[float],
+                             List[float]] = ([], [], [], [])
+        self.checks_count = 0
+        self.detections_count = 0
+        self.skipped_count = 0
+
+    def set_catalog(self, assets_list: List[str], markets_list: List[str]
+                    ) -> None:
+        """Track provided assets and markets instead of the current ones.
+        Matrices are rebuilt keeping prices of pairs still tracked;
+        queued ticks are applied first."""
+        self._apply_pending()
+        assets_list = list(dict.fromkeys(assets_list))
+        markets_list = list(dict.fromkeys(markets_list))
+        kept_assets = [(idx, self.asset_ids[asset])
+                       for idx, asset in enumerate(assets_list)
+                       if asset in self.asset_ids]
+        kept_markets = [(idx, self.market_ids[market])
+                        for idx, market in enumerate(markets_list)
+                        if market in self.market_ids]
+
+        shape = (len(assets_list), len(markets_list))
+        prices_buy = np.full(shape, np.inf)
+        prices_sell = np.full(shape, -np.inf)
+        versions = np.full(shape, -1, dtype=np.int64)
+        dirty = np.zeros(len(assets_list), dtype=bool)
+        if kept_assets and kept_markets:
+            new_rows, old_rows = zip(*kept_assets)
+            new_cols, old_cols = zip(*kept_markets)
+            new_cells = np.ix_(new_rows, new_cols)
+            old_cells = np.ix_(old_rows, old_cols)
+            prices_buy[new_cells] = self.prices_buy[old_cells]
+            prices_sell[new_cells] = self.prices_sell[old_cells]
+            versions[new_cells] = self.versions[old_cells]
+            dirty[list(new_rows)] = self._dirty[list(old_rows)]
+
+        if self.tracker is not None:
+            self.tracker.forget(
+                set(self.assets_list).difference(assets_list),
+                set(self.markets_list).difference(markets_list))
+        self.assets_list = assets_list
+        self.markets_list = markets_list
+        self.asset_ids = {asset: idx for idx, asset in enumerate(assets_list)}
+        self.market_ids = {market: idx
+                           for idx, market in enumerate(markets_list)}
+        self.prices_buy = prices_buy
+        self.prices_sell = prices_sell
+        self.versions = versions
+        self._dirty = dirty
+
+    def add_tick(self, asset_price: schemas.AssetPriceFromApi) -> None:
+        """Queue a price for the next batch. Unknown assets and markets
+        are ignored."""
+        asset_id = self.asset_ids.get(asset_price.name, None)
+        market_id = self.market_ids.get(asset_price.market, None)
+        if asset_id is None or market_id is None:
+            return
+        if asset_price.version is not None:
+            if self.versions[asset_id, market_id] == asset_price.version:
+                self.skipped_count += 1
+                return
+            self.versions[asset_id, market_id] = asset_price.version
+        asset_ids, market_ids, prices, spreads = self._pending
+        asset_ids.append(asset_id)
+        market_ids.append(market_id)
+        prices.append(asset_price.price)
+        spreads.append(asset_price.spread)
+        if self.latency is not None:
+            self._traced.append(asset_price)
+
+    def add_ticks(self, asset_prices: Iterable[schemas.AssetPriceFromApi]
+                  ) -> None:
+        """Queue several prices for the next batch"""
+        for asset_price in asset_prices:
+            self.add_tick(asset_price)
+
+    def add_ticks_arrays(self, asset_ids: np.ndarray, market_ids: np.ndarray,
+                         prices: np.ndarray, spreads: np.ndarray) -> None:
+        """Apply ticks given as arrays of asset and market ids, mid prices
+        and spreads in percent. Of several ticks of a pair the last one
+        wins."""
+        self.prices_buy[asset_ids, market_ids] = np.round(
+            prices * (1 + spreads / 100), 4)
+        self.prices_sell[asset_ids, market_ids] = np.round(
+            prices * (1 - spreads / 100), 4)
+        self._dirty[asset_ids] = True
+        self.checks_count += len(asset_ids)
+
+    def _apply_pending(self) -> None:
+        """Move queued ticks into the matrices"""
+        asset_ids, market_ids, prices, spreads = self._pending
+        if asset_ids:
+            self.add_ticks_arrays(
+                np.array(asset_ids), np.array(market_ids),
+                np.array(prices), np.array(spreads))
+            self._pending = ([], [], [], [])
+
+    def detect(self) -> Dict[str, schemas.ArbitrageDetectorResponse]:
+        """Detect arbitrage of all assets having ticks since the previous
+        call. Returns responses of assets with an opportunity found.
+        """
+        started_at = time.time()
+        self._apply_pending()
+        rows = np.flatnonzero(self._dirty)
+        self._dirty[rows] = False
+        if not rows.size:
+            return {}
+
+        prices_buy = self.prices_buy[rows]
+        prices_sell = self.prices_sell[rows]
+        buy_markets = prices_buy.argmin(axis=1)
+        sell_markets = prices_sell.argmax(axis=1)
+        row_ids = np.arange(rows.size)
+        best_buy = prices_buy[row_ids, buy_markets]
+        best_sell = prices_sell[row_ids, sell_markets]
+        found = np.flatnonzero(best_sell > best_buy)
+
+        responses = {}
+        detected = {}
+        detected_at = time.time()
+        for row_id in found.tolist():
+            price_buy = float(best_buy[row_id])
+            price_sell = float(best_sell[row_id])
+            event = schemas.ArbitrageEvent(
+                self.assets_list[rows[row_id]],
+                self.markets_list[buy_markets[row_id]],
+                self.markets_list[sell_markets[row_id]],
+                price_buy, price_sell, round(price_sell - price_buy, 4),
+                detected_at)
+            detected[event.asset] = event
+            responses[event.asset] = schemas.ArbitrageDetectorResponse(
+                arbitrage_found=True,
+                details=[{"message": event.get_message()}])
+        self.detections_count += len(responses)
+        if self._traced and self.latency is not None:
+            for asset_price in self._traced:
+                self.latency.record_tick(asset_price, started_at,
+                                         detected_at)
+            self._traced = []
+
+        if self.tracker is None:
+            events = list(detected.values())
+        else:
+            # checked assets with open opportunities get them closed if
+            # not detected anymore
+            checked = np.zeros(len(self.assets_list), dtype=bool)
+            checked[rows] = True
+            assets = list(detected) + [
+                asset for asset in self.tracker.opportunities
+                if asset not in detected and checked[self.asset_ids[asset]]]
+            events = []
+            for asset in assets:
+                events += self.tracker.update(
+                    asset, [detected[asset]] if asset in detected else [],
+                    detected_at, self._get_quote_getter(asset))
+        for event in events:
+            logger.info(event.get_message())
+            if self.event_sink is not None:
+                self.event_sink.put(event)
+        return responses
+
+    def _get_quote_getter(self, asset: str) -> QuoteGetter:
+        """Current buying and selling price of an asset, given a buying
+        and a selling market"""
+        asset_id = self.asset_ids[asset]
+
+        def get_quote(market_buy: str, market_sell: str
+                      ) -> Tuple[float, float]:
+            return (
+                float(self.prices_buy[asset_id, self.market_ids[market_buy]]),
+                float(self.prices_sell[asset_id,
+                                       self.market_ids[market_sell]]))
+        return get_quote
@@ -0,0 +1,85 @@
+"""
+Catalog Tracker Module
+
+Keeps asset and market pairs tracked by the analyzer in line with the
+generator catalog: the catalog is discovered at startup and requested
+again periodically, and pairs are added and removed in place, without a
+restart.
+"""
+import asyncio
+from typing import Callable, List, Optional
+
+from ..utils.fetch_requests import Pair, PriceFetcher
+from ..utils.logger import get_logger
+from .batch_detector import BatchArbitrageDetector
+from .detector import ArbitrageDetector
+from .poll_scheduler import PollScheduler
+
+
+logger = get_logger(__name__)
+
+
+class CatalogTracker:
+    """
+    Tracked pairs following the generator catalog.
+
+    Functionality:
+    - `refresh` requests the catalog and, once its version changes,
+        applies it to the detector, and to the scheduler and the batch
+        detector if set. Only assets passing `asset_filter` are tracked,
+        e.g. assets of a shard
+    - `run` refreshes every `refresh_interval_s`
+
+    `pairs` is updated in place, so loops iterating over it pick up
+    changes. Until a catalog is received, pairs of the detector lists are
+    tracked, and they stay tracked if the generator has no catalog.
+    """
+
+    def __init__(self, price_fetcher: PriceFetcher,
+                 detector: ArbitrageDetector,
+                 asset_filter: Optional[Callable[[str], bool]] = None,
+                 refresh_interval_s: float = 60) -> None:
+        self.price_fetcher = price_fetcher
+        self.detector = detector
+        self.asset_filter = asset_filter
+        self.refresh_interval_s = refresh_interval_s
+        self.scheduler: Optional[PollScheduler] = None
+        self.batch_detector: Optional[BatchArbitrageDetector] = None
+        self.pairs: List[Pair] = self._get_detector_pairs()
+
+    def _get_detector_pairs(self) -> List[Pair]:
+        """Every combination of assets and markets of the detector"""
+        return [(asset, market)
+                for asset in self.detector.assets_list
+                for market in self.detector.markets_list]
+
+    async def refresh(self) -> bool:
+        """Request the catalog and apply it if its version changed.
+        Returns True if it was applied."""
+        catalog = await self.price_fetcher.fetch_catalog()
+        if (catalog is None
+                or catalog.version == self.detector.catalog_version):
+            return False
+
+        assets = [asset for asset in catalog.assets
+                  if self.asset_filter is None or self.asset_filter(asset)]
+        tracked = set(self.pairs)
+        self.detector.set_catalog(assets, catalog.markets, catalog.version)
+        self.pairs[:] = self._get_detector_pairs()
+        if self.batch_detector is not None:
+            self.batch_detector.set_catalog(assets, catalog.markets)
+        if self.scheduler is not None:
+            self.scheduler.set_pairs(self.pairs)
+
+        added = len(set(self.pairs) - tracked)
+        logger.info(
+            f"Catalog {catalog.version}: tracking {len(self.pairs)} pairs"
+            f" ({added} added, {len(tracked) + added - len(self.pairs)}"
+            " removed)")
+        return True
+
+    async def run(self) -> None:
+        """Refresh the catalog periodically until cancelled"""
+        while True:
+            await asyncio.sleep(self.refresh_interval_s)
+            await self.refresh()
@@ -1,108 +1,274 @@
 """
 Core Arbitrage Detector Module
 
-Consists of a class, responsible for keeping track of highest and lowest
-detected prices and performing arbitrage detection
+Consists of a class, responsible for keeping track of prices of each
+asset on each market and performing arbitrage detection
 """
 import asyncio
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+from .opportunity_tracker import OpportunityTracker
+from .order_book import AssetOrderBook
 from ..utils import schemas
+from ..utils.event_sink import ArbitrageEventSink
+from ..utils.latency import LatencyTracker
 from ..utils.logger import get_logger
 
 
 logger = get_logger(__name__)
 
 
+class LockWaitStats:
+    """Time spent waiting to acquire asset locks"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.contended_count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    @property
+    def mean_s(self) -> float:
+        """Mean wait per acquisition"""
+        return self.total_s / self.count if self.count else 0.0
+
+    def observe(self, wait_s: float, contended: bool) -> None:
+        """Record a lock acquisition"""
+        self.count += 1
+        self.contended_count += contended
+        self.total_s += wait_s
+        self.max_s = max(self.max_s, wait_s)
+
+
 class ArbitrageDetector:
     """
     Implements arbitrage detector.
 
     Functionality:
-    - Tracks lowest buying and highest selling prices detected,
-        including market where price was detected.
+    - Tracks latest buying and selling prices of each asset on each
+        market in a per asset order book, so the lowest buying and
+        highest selling prices across markets are known at any time.
     - Provided a new price for an asset, detect arbitrage opportunity
+
+    Each asset has its own lock, so prices of unrelated assets never wait
+    for each other. Time spent waiting for locks is kept in `lock_wait`.
+
+    `assets_list` restricts tracked assets, e.g. to a shard of them.
+    Tracked assets and markets can be changed later with `set_catalog`,
+    e.g. once the generator catalog is discovered.
+    Checked prices and detected opportunities are counted in
+    `checks_count` and `detections_count`. Opportunities are logged and,
+    if `event_sink` is set, put into it as `ArbitrageEvent` records.
+
+    A price of a pair with the version already stored is not checked
+    again, such prices are counted in `skipped_count`. If
+    `alert_margin_change` is set, opportunities are reported only when
+    they open, close or their margin moves by more than this share (see
+    `OpportunityTracker`), otherwise on every detection.
+
+    If `latency` is set, stages of every checked price are recorded into
+    it, from the fetch to the end of the check (see `LatencyTracker`).
     """
 
-    def __init__(self) -> None:
-        self.prices_dict: Dict[str, schemas.AssetData] = {}
-        self.assets_list: Optional[List[str]] = None
-        self.markets_list: Optional[List[str]] = None
-        self.lock = asyncio.Lock()
-        self._set_assets_list()
+    # version of the generator catalog tracked, None until discovered
+    catalog_version: Optional[str] = None
+    # latency histograms of checked prices, None if not traced
+    latency: Optional[LatencyTracker] = None
+
+    def __init__(self, assets_list: Optional[List[str]] = None,
+                 event_sink: Optional[ArbitrageEventSink] = None,
+                 alert_margin_change: Optional[float] = None,
+                 latency: Optional[LatencyTracker] = None) -> None:
+        self.event_sink = event_sink
+        self.latency = latency
+        self.tracker = (OpportunityTracker(alert_margin_change)
+                        if alert_margin_change is not None else None)
+        # (asset, market) -> version of the stored price
+        self.versions: Dict[Tuple[str, str], int] = {}
+        self.skipped_count = 0
+        self.order_books: Dict[str, AssetOrderBook] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.lock_wait = LockWaitStats()
+        self.checks_count = 0
+        self.detections_count = 0
+        # filled with defaults right away, see `_set_assets_list`
+        self.assets_list: List[str] = []
+        self.markets_list: List[str] = []
+        self._set_assets_list(assets_list)
         self._set_markets_list()
         self._initialize_prices()
 
-    def _set_assets_list(self) -> None:
-        """Mocks getting and storing a list of assets to track"""
-        self.assets_list = ["Copper", "Oil"]
+    def _set_assets_list(self, assets_list: Optional[List[str]] = None
+                         ) -> None:
+        """Store a list of assets to track, defaults until the catalog is
+        discovered"""
+        self.assets_list = (list(assets_list) if assets_list is not None
+                            else ["Copper", "Oil"])
 
     def _set_markets_list(self) -> None:
-        """Mocks getting and storing a list of markets to track"""
+        """Store a list of markets to track, defaults until the catalog is
+        discovered"""
         self.markets_list = ["US", "UK"]
 
     def _initialize_prices(self) -> None:
-        """Mocks getting initial prices for each asset"""
+        """Create empty order book of each asset"""
         if not self.assets_list:
             raise ValueError("No assets provided")
         for asset in self.assets_list:
-            self.prices_dict[asset] = schemas.AssetData(
-                price_buy=float('inf'),
-                price_sell=0.0,
-                location_buy="US",
-                location_sell="US")
+            self.order_books[asset] = AssetOrderBook()
+            self.locks[asset] = asyncio.Lock()
+
+    def set_catalog(self, assets_list: List[str], markets_list: List[str],
+                    version: Optional[str] = None) -> None:
+        """Track provided assets and markets instead of the current ones.
+        Prices of pairs still tracked are kept, new assets get empty
+        order books, prices of assets and markets no longer tracked are
+        dropped along with their open opportunities."""
+        assets_list = list(dict.fromkeys(assets_list))
+        markets_list = list(dict.fromkeys(markets_list))
+        removed_assets = set(self.order_books).difference(assets_list)
+        removed_markets = set(self.markets_list).difference(markets_list)
+
+        for asset in removed_assets:
+            del self.order_books[asset]
+            del self.locks[asset]
+        for asset in assets_list:
+            if asset not in self.order_books:
+                self.order_books[asset] = AssetOrderBook()
+                self.locks[asset] = asyncio.Lock()
+        for market in removed_markets:
+            for order_book in self.order_books.values():
+                order_book.remove(market)
+
+        if removed_assets or removed_markets:
+            self.versions = {
+                pair: pair_version
+                for pair, pair_version in self.versions.items()
+                if pair[0] in self.order_books
+                and pair[1] not in removed_markets}
+            if self.tracker is not None:
+                self.tracker.forget(removed_assets, removed_markets)
+        self.assets_list = assets_list
+        self.markets_list = markets_list
+        self.catalog_version = version
+
+    @asynccontextmanager
+    async def _asset_lock(self, asset: str) -> AsyncIterator[None]:
+        """Hold lock of an asset, recording time waited for it"""
+        lock = self.locks[asset]
+        contended = lock.locked()
+        started = time.perf_counter()
+        async with lock:
+            self.lock_wait.observe(time.perf_counter() - started, contended)
+            yield
+
+    @property
+    def prices_dict(self) -> Dict[str, schemas.AssetData]:
+        """Lowest buying and highest selling price of each asset across
+        markets, with their markets. Location is empty if no price of an
+        asset was received yet."""
+        prices_dict = {}
+        for asset, order_book in self.order_books.items():
+            price_buy, location_buy = (order_book.best_buy()
+                                       or (float('inf'), ""))
+            price_sell, location_sell = (order_book.best_sell()
+                                         or (0.0, ""))
+            prices_dict[asset] = schemas.AssetData(
+                price_buy=price_buy,
+                price_sell=price_sell,
+                location_buy=location_buy,
+                location_sell=location_sell)
+        return prices_dict
+
+    def is_seen(self, asset_price: schemas.AssetPriceFromApi) -> bool:
+        """Returns True if the version of the price is already stored, so
+        the price needs no processing"""
+        return (asset_price.version is not None
+                and self.versions.get((asset_price.name, asset_price.market))
+                == asset_price.version)
+
+    @staticmethod
+    def _get_buy_sell_prices(
+            asset_price: schemas.AssetPriceFromApi
+            ) -> Tuple[float, float]:
+        """Buying and selling price of a quote, given mid price and spread
+        in percent"""
+        return (
+            round(asset_price.price * (1 + asset_price.spread / 100), 4),
+            round(asset_price.price * (1 - asset_price.spread / 100), 4))
 
     async def check_for_arbitrage(
             self,
             asset_price: schemas.AssetPriceFromApi
             ) -> schemas.ArbitrageDetectorResponse:
-        """Compares provided asset price with current stored price and
-        provides a response indicating if an arbitrage opportunity is
-        detected
+        """Compares provided asset price with the best prices of the asset
+        on other markets and provides a response indicating if an
+        arbitrage opportunity is detected
         """
 
         response = schemas.ArbitrageDetectorResponse()
 
-        async with self.lock:
-            asset_data = self.prices_dict.get(asset_price.name, None)
-            if not asset_data:
-                return response
-
-            curr_price_buy = asset_data.price_buy
-            curr_price_sell = asset_data.price_sell
+        order_book = self.order_books.get(asset_price.name, None)
+        if order_book is None:
+            return response
+        if self.is_seen(asset_price):
+            self.skipped_count += 1
+            return response
+        self.checks_count += 1
+        if self.latency is not None:
+            started_at = time.time()
 
-            new_price_buy = round(
-                asset_price.price * (1 + asset_price.spread / 100),
-                4)
-            new_price_sell = round(
-                asset_price.price * (1 - asset_price.spread / 100),
-                4)
+        events = []
+        async with self._asset_lock(asset_price.name):
+            new_price_buy, new_price_sell = self._get_buy_sell_prices(
+                asset_price)
             new_location = asset_price.market
+            best_sell = order_book.best_sell(exclude_market=new_location)
+            best_buy = order_book.best_buy(exclude_market=new_location)
+
+            if best_sell is not None and new_price_buy < best_sell[0]:
+                curr_price_sell, location_sell = best_sell
+                events.append((new_location, location_sell,
+                               new_price_buy, curr_price_sell))
 
-            if (new_price_buy < curr_price_sell
-                    and asset_data.location_sell != new_location):
-                message = (
-                    "Arbitrage possibility detected:"
-                    f" Buy {asset_price.name} from {new_location}"
-                    f" for {new_price_buy}"
-                    f", sell at {asset_data.location_sell}"
-                    f" for {curr_price_sell}, margin:"
-                    f" {round(curr_price_sell - new_price_buy, 4)}")
-                logger.info(message)
-                response.details.append({"message": message})
-                response.arbitrage_found = True
-
-            if (new_price_sell > curr_price_buy
-                    and asset_data.location_buy != new_location):
-                message = (
-                    "Arbitrage possibility detected:"
-                    f" Buy {asset_price.name} from {asset_data.location_buy}"
-                    f" for {curr_price_buy},"
-                    f" sell at {new_location} for {new_price_sell},"
-                    f" margin: {round(new_price_sell - curr_price_buy, 4)}")
-                logger.info(message)
-                response.details.append({"message": message})
-                response.arbitrage_found = True
+            if best_buy is not None and new_price_sell > best_buy[0]:
+                curr_price_buy, location_buy = best_buy
+                events.append((location_buy, new_location,
+                               curr_price_buy, new_price_sell))
+
+        # records are formatted and emitted once the lock is released
+        detected_at = time.time()
+        detected = [
+            schemas.ArbitrageEvent(
+                asset_price.name, market_buy, market_sell, price_buy,
+                price_sell, round(price_sell - price_buy, 4), detected_at)
+            for market_buy, market_sell, price_buy, price_sell in events]
+        response.details = [{"message": event.get_message()}
+                            for event in detected]
+        response.arbitrage_found = bool(detected)
+        self.detections_count += len(detected)
+        if self.latency is not None:
+            self.latency.record_tick(asset_price, started_at, detected_at)
+
+        if self.tracker is not None:
+            def get_quote(market_buy: str, market_sell: str
+                          ) -> Tuple[float, float]:
+                # the checked price is not stored in the order book yet
+                return (
+                    new_price_buy if market_buy == new_location
+                    else order_book.prices_buy[market_buy],
+                    new_price_sell if market_sell == new_location
+                    else order_book.prices_sell[market_sell])
+
+            detected = self.tracker.update(asset_price.name, detected,
+                                           detected_at, get_quote,
+                                           market=new_location)
+        for event in detected:
+            logger.info(event.get_message())
+            if self.event_sink is not None:
+                self.event_sink.put(event)
 
         return response
 
@@ -112,6 +278,12 @@ class ArbitrageDetector:
         """Asyncroneous wrapper over function implementation. Adds
         timeout functionality to drop execution if takes much longer
         than expected"""
+        lock = self.locks.get(asset_data.name, None)
+        if lock is None or not lock.locked():
+            # nothing to wait for, spare a task for the timeout
+            await self._price_update_internal(asset_data)
+            return
+
         try:
             # timeout to to prevent long wait time
             await asyncio.wait_for(self._price_update_internal(asset_data),
@@ -128,49 +300,30 @@ class ArbitrageDetector:
             asset_data: schemas.AssetPriceFromApi
             ) -> None:
         """Implementation of price update.
-        A price is updated in any of these cases:
-        1) the new price comes from the same market as currently stored
-            value
-        2) the new buying price is lower than the stored one
-        3) the new selling price is lower than the stored one
+        The new price replaces the previous price of the same market in
+        the asset order book, whether it is better or worse, so the best
+        prices across markets are always exact.
         """
-        async with self.lock:
-            curr_entry = self.prices_dict.get(asset_data.name, None)
-
-            if not curr_entry:
-                logger.error(
-                    f"Asset {asset_data.name} not found in prices_dict.")
-                return
-
-            new_price_buy = round(
-                asset_data.price * (1 + asset_data.spread / 100),
-                4)
-            new_price_sell = round(
-                asset_data.price * (1 - asset_data.spread / 100),
-                4)
-            new_location = asset_data.market
+        order_book = self.order_books.get(asset_data.name, None)
+
+        if order_book is None:
+            logger.error(
+                f"Asset {asset_data.name} not found in order books.")
+            return
+        if self.is_seen(asset_data):
+            return
+
+        async with self._asset_lock(asset_data.name):
+            new_price_buy, new_price_sell = self._get_buy_sell_prices(
+                asset_data)
 
             logger.debug((
                 f"Asset: {asset_data.name}, market: {asset_data.market}"
-                f" curr_price_buy: {curr_entry.price_buy}"
                 f" new_price_buy: {new_price_buy}"
-                f" curr_price_sell: {curr_entry.price_sell}"
                 f" new_price_sell: {new_price_sell}"))
 
-            if (new_price_buy < curr_entry.price_buy
-                    or new_location == curr_entry.location_buy):
-                logger.debug(
-                    f"Updating buying price for asset: {asset_data.name}"
-                    f", market: {asset_data.market} to {new_price_buy}")
-                curr_entry.price_buy = new_price_buy
-                curr_entry.location_buy = new_location
-
-            if (new_price_sell > curr_entry.price_sell
-                    or new_location == curr_entry.location_sell):
-                logger.debug(
-                    f"Updating selling price for asset: {asset_data.name}"
-                    f", market: {asset_data.market} to {new_price_sell}")
-                curr_entry.price_sell = new_price_sell
-                curr_entry.location_sell = new_location
-
-            self.prices_dict[asset_data.name] = curr_entry
+            order_book.update(asset_data.market, new_price_buy,
+                              new_price_sell)
+            if asset_data.version is not None:
+                self.versions[(asset_data.name, asset_data.market)] = (
+                    asset_data.version)
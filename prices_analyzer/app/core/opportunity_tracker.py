@@ -0,0 +1,96 @@
+"""
+Opportunity Tracker Module
+
+Keeps detected arbitrage opportunities open until they are gone, so an
+opportunity persisting over many checks is reported when it opens,
+changes materially and closes, rather than on every check.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..utils import schemas
+
+
+# buying and selling market of an opportunity
+Opportunity = Tuple[str, str]
+# current buying price on the buying market and selling price on the
+# selling market of an opportunity
+QuoteGetter = Callable[[str, str], Tuple[float, float]]
+
+
+class OpportunityTracker:
+    """
+    Open arbitrage opportunities of each asset.
+
+    An opportunity, an asset with its buying and selling market, opens
+    once detected and closes once a check covering it does not detect it
+    anymore. A check covers opportunities involving the checked market,
+    or all opportunities of the asset if no market is given.
+
+    Detections of an open opportunity are reported again only if its
+    margin moved by more than `margin_change` (share of the last reported
+    margin); the others are counted in `suppressed_count`.
+    """
+
+    def __init__(self, margin_change: float = 0.1) -> None:
+        self.margin_change = margin_change
+        # asset -> opportunity -> last reported margin
+        self.opportunities: Dict[str, Dict[Opportunity, float]] = {}
+        self.suppressed_count = 0
+
+    def update(self, asset: str, detected: List[schemas.ArbitrageEvent],
+               detected_at: float, get_quote: QuoteGetter,
+               market: Optional[str] = None
+               ) -> List[schemas.ArbitrageEvent]:
+        """Take opportunities detected by a check of an asset and return
+        events to report: opened, materially changed and closed ones.
+        `get_quote` provides current prices of closed opportunities.
+        """
+        opened = self.opportunities.get(asset, None)
+        if opened is None:
+            if not detected:
+                return []
+            opened = self.opportunities[asset] = {}
+
+        events = []
+        found = set()
+        for event in detected:
+            opportunity = (event.market_buy, event.market_sell)
+            found.add(opportunity)
+            margin = opened.get(opportunity, None)
+            if margin is None:
+                events.append(event)
+            elif abs(event.margin - margin) > self.margin_change * margin:
+                events.append(event._replace(status='update'))
+            else:
+                self.suppressed_count += 1
+                continue
+            opened[opportunity] = event.margin
+
+        closed = [opportunity for opportunity in opened
+                  if opportunity not in found
+                  and (market is None or market in opportunity)]
+        for market_buy, market_sell in closed:
+            del opened[(market_buy, market_sell)]
+            price_buy, price_sell = get_quote(market_buy, market_sell)
+            events.append(schemas.ArbitrageEvent(
+                asset, market_buy, market_sell, price_buy, price_sell,
+                round(price_sell - price_buy, 4), detected_at, 'close'))
+
+        if not opened:
+            del self.opportunities[asset]
+        return events
+
+    def forget(self, assets: Iterable[str], markets: Iterable[str]) -> None:
+        """Drop open opportunities of assets or markets no longer tracked,
+        without reporting them closed"""
+        for asset in assets:
+            self.opportunities.pop(asset, None)
+        markets = set(markets)
+        if not markets:
+            return
+        for asset, opened in list(self.opportunities.items()):
+            for opportunity in [opportunity for opportunity in opened
+                                if markets.intersection(opportunity)]:
+                del opened[opportunity]
+            if not opened:
+                del self.opportunities[asset]
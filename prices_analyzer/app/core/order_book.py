@@ -0,0 +1,106 @@
+"""
+Order Book Module
+
+Keeps latest buying (ask) and selling (bid) prices of an asset on every
+market, giving the best prices across markets at any time.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+
+# stale heap entries tolerated per live quote before heaps are rebuilt
+COMPACTION_RATIO = 4
+
+
+class AssetOrderBook:
+    """
+    Latest quotes of an asset on each market.
+
+    Functionality:
+    - Stores latest buying and selling price of each market, O(log M)
+        per update for M markets
+    - Returns the lowest buying and the highest selling price across
+        markets, optionally excluding a market
+
+    Prices are indexed with a min heap of buying prices and a max heap of
+    selling prices. Updating a quote pushes a new entry without removing
+    the previous one; outdated entries are dropped lazily once they reach
+    the top of a heap.
+    """
+
+    def __init__(self) -> None:
+        self.prices_buy: Dict[str, float] = {}
+        self.prices_sell: Dict[str, float] = {}
+        # (price, market) and (-price, market) heaps, may hold outdated
+        # entries
+        self._buy_heap: List[Tuple[float, str]] = []
+        self._sell_heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.prices_buy)
+
+    def update(self, market: str, price_buy: float,
+               price_sell: float) -> None:
+        """Store latest quote of a market"""
+        if self.prices_buy.get(market) != price_buy:
+            self.prices_buy[market] = price_buy
+            heapq.heappush(self._buy_heap, (price_buy, market))
+        if self.prices_sell.get(market) != price_sell:
+            self.prices_sell[market] = price_sell
+            heapq.heappush(self._sell_heap, (-price_sell, market))
+
+        if (max(len(self._buy_heap), len(self._sell_heap))
+                > COMPACTION_RATIO * len(self) + 16):
+            self._compact()
+
+    def remove(self, market: str) -> None:
+        """Forget quote of a market. Its heap entries become outdated."""
+        self.prices_buy.pop(market, None)
+        self.prices_sell.pop(market, None)
+
+    def best_buy(self, exclude_market: Optional[str] = None
+                 ) -> Optional[Tuple[float, str]]:
+        """Return the lowest buying price and its market, None if there
+        are no quotes (of other markets)"""
+        return self._best(self._buy_heap, self.prices_buy, 1,
+                          exclude_market)
+
+    def best_sell(self, exclude_market: Optional[str] = None
+                  ) -> Optional[Tuple[float, str]]:
+        """Return the highest selling price and its market, None if there
+        are no quotes (of other markets)"""
+        return self._best(self._sell_heap, self.prices_sell, -1,
+                          exclude_market)
+
+    @staticmethod
+    def _best(heap: List[Tuple[float, str]], prices: Dict[str, float],
+              sign: int, exclude_market: Optional[str]
+              ) -> Optional[Tuple[float, str]]:
+        """Return top valid entry of a heap, skipping excluded market.
+        Outdated entries met on the way are removed."""
+        # a market may have several valid entries if its price returned
+        # to an earlier value
+        skipped = []
+        best = None
+        while heap:
+            key, market = heap[0]
+            if prices.get(market) != sign * key:
+                heapq.heappop(heap)  # outdated
+            elif market == exclude_market:
+                skipped.append(heapq.heappop(heap))
+            else:
+                best = (sign * key, market)
+                break
+
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return best
+
+    def _compact(self) -> None:
+        """Rebuild heaps out of latest quotes only"""
+        self._buy_heap = [(price, market)
+                          for market, price in self.prices_buy.items()]
+        self._sell_heap = [(-price, market)
+                           for market, price in self.prices_sell.items()]
+        heapq.heapify(self._buy_heap)
+        heapq.heapify(self._sell_heap)
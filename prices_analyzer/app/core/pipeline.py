@@ -0,0 +1,157 @@
+"""
+Prices Pipeline Module
+
+Polls prices of asset and market pairs and checks them for arbitrage in
+stages connected by bounded queues: fetch -> detect -> update. Each stage
+runs its own number of workers, and a full queue holds its producers
+back, so memory stays bounded when a stage lags behind.
+"""
+import asyncio
+from typing import Any, Dict, Tuple
+
+from ..utils.fetch_requests import Pair, PriceFetcher
+from ..utils.logger import get_logger
+from .detector import ArbitrageDetector
+from .poll_scheduler import PollScheduler
+
+
+logger = get_logger(__name__)
+
+
+class ConflatingQueue:
+    """
+    Bounded FIFO queue holding at most one value per pair.
+
+    A value put for a pair already waiting in the queue replaces the
+    waiting value in place, so only the latest value of a pair is
+    processed; replaced values are counted in `dropped_count`. A value of
+    any other pair waits for room once the queue is full.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._pairs: asyncio.Queue = asyncio.Queue(maxsize)
+        self._values: Dict[Pair, Any] = {}
+        self.put_count = 0
+        self.dropped_count = 0
+        self.max_depth = 0
+
+    def qsize(self) -> int:
+        """Number of pairs waiting in the queue"""
+        return self._pairs.qsize()
+
+    async def put(self, pair: Pair, value: Any) -> None:
+        """Put latest value of a pair, waiting for room if needed"""
+        self.put_count += 1
+        if pair in self._values:
+            self._values[pair] = value
+            self.dropped_count += 1
+            return
+
+        self._values[pair] = value
+        try:
+            await self._pairs.put(pair)
+        except asyncio.CancelledError:
+            self._values.pop(pair, None)
+            raise
+        self.max_depth = max(self.max_depth, self._pairs.qsize())
+
+    async def get(self) -> Tuple[Pair, Any]:
+        """Take the oldest waiting pair and its latest value"""
+        pair = await self._pairs.get()
+        return pair, self._values.pop(pair)
+
+
+class PricesPipeline:
+    """
+    Staged prices processing.
+
+    Stages:
+    - schedule: hands pairs due for a poll by the scheduler to fetching
+    - fetch: `fetch_workers` workers request prices of pairs. Concurrent
+        requests are bounded by the number of workers
+    - detect: `detect_workers` workers check fetched prices for arbitrage
+    - update: `update_workers` workers store checked prices in the
+        detector
+
+    Stages are connected by `ConflatingQueue`s of `queue_size` pairs. A
+    pair is polled again once the scheduler finds it due after its
+    previous poll; a newer price of a pair still waiting for detection or
+    update replaces the older one. Depth of queues is logged every
+    `report_interval_s`.
+    """
+
+    def __init__(self, price_fetcher: PriceFetcher,
+                 detector: ArbitrageDetector, scheduler: PollScheduler,
+                 fetch_workers: int = 1, detect_workers: int = 1,
+                 update_workers: int = 1, queue_size: int = 1000,
+                 report_interval_s: float = 60) -> None:
+        if min(fetch_workers, detect_workers, update_workers) < 1:
+            raise ValueError("Each stage needs at least one worker")
+        self.price_fetcher = price_fetcher
+        self.detector = detector
+        self.scheduler = scheduler
+        # pairs may be added later, so workers are not capped by their
+        # current number; idle ones just wait on the queue
+        self.fetch_workers = fetch_workers
+        self.detect_workers = detect_workers
+        self.update_workers = update_workers
+        self.report_interval_s = report_interval_s
+        self.fetch_queue = ConflatingQueue(queue_size)
+        self.detect_queue = ConflatingQueue(queue_size)
+        self.update_queue = ConflatingQueue(queue_size)
+
+    async def run(self) -> None:
+        """Run all stages until cancelled or a worker fails"""
+        stages = (
+            [self._schedule(), self._report()]
+            + [self._fetch() for _ in range(self.fetch_workers)]
+            + [self._detect() for _ in range(self.detect_workers)]
+            + [self._update() for _ in range(self.update_workers)])
+        tasks = [asyncio.create_task(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, ConflatingQueue]:
+        """Queues of the pipeline by the stage they feed"""
+        return {'fetch': self.fetch_queue, 'detect': self.detect_queue,
+                'update': self.update_queue}
+
+    async def _schedule(self) -> None:
+        while True:
+            pair = await self.scheduler.next_pair()
+            await self.fetch_queue.put(pair, pair)
+
+    async def _fetch(self) -> None:
+        while True:
+            pair, _ = await self.fetch_queue.get()
+            asset_data = await self.price_fetcher.fetch_price(
+                asset=pair[0], market=pair[1])
+            if not asset_data:
+                self.scheduler.observe_failure(pair)
+                continue
+            self.scheduler.observe(pair, asset_data)
+            await self.detect_queue.put(pair, asset_data)
+
+    async def _detect(self) -> None:
+        while True:
+            pair, asset_data = await self.detect_queue.get()
+            await self.detector.check_for_arbitrage(asset_data)
+            await self.update_queue.put(pair, asset_data)
+
+    async def _update(self) -> None:
+        while True:
+            _, asset_data = await self.update_queue.get()
+            await self.detector.price_update(asset_data)
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_interval_s)
+            logger.info("Pipeline queues (depth/max/dropped): " + ", ".join(
+                f"{stage} {queue.qsize()}/{queue.max_depth}"
+                f"/{queue.dropped_count}"
+                for stage, queue in self.get_stats().items()))
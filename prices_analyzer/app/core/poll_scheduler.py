@@ -0,0 +1,294 @@
+"""
+Poll Scheduler Module
+
+Decides when each asset and market pair is polled next: at a fixed
+interval, or adaptively, about as often as its price changes and more
+often for assets close to an arbitrage opportunity, all polls sharing a
+global requests rate budget.
+"""
+import asyncio
+import heapq
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..utils import schemas
+from ..utils.fetch_requests import Pair
+from .detector import ArbitrageDetector
+
+
+# weight of the latest poll in change rate estimates
+SMOOTHING = 0.2
+# polls seeing a change are capped below 100%, where the change rate
+# estimate diverges
+MAX_CHANGE_RATIO = 0.95
+
+
+class TokenBucket:
+    """
+    Requests rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity` (a second worth
+    of tokens by default), each request takes one.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, rate: float, capacity: Optional[float] = None
+                 ) -> None:
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = self.clock()
+
+    def try_acquire(self, now: Optional[float] = None) -> float:
+        """Take a token if available. Returns 0 if taken, time until a
+        token is available otherwise."""
+        now = self.clock() if now is None else now
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait for a token and take it"""
+        while (wait_s := self.try_acquire()) > 0:
+            await asyncio.sleep(wait_s)
+
+
+class PairPollState:
+    """Latest polled price of a pair and estimate of its change rate"""
+
+    def __init__(self) -> None:
+        self.price: Optional[float] = None
+        self.spread: Optional[float] = None
+        self.version: Optional[int] = None
+        self.polled_at: Optional[float] = None
+        # smoothed share of polls that saw a new price and smoothed
+        # time between polls
+        self.change_ratio = 0.5
+        self.poll_interval_s: Optional[float] = None
+
+    def observe(self, asset_price: schemas.AssetPriceFromApi,
+                now: float) -> bool:
+        """Store polled price. Returns True if it changed since the
+        previous poll: its version differs, or price or spread if the
+        version is not provided."""
+        # prices of other sources may lack the version at all
+        version = getattr(asset_price, 'version', None)
+        if version is not None:
+            changed = version != self.version
+        else:
+            changed = (asset_price.price != self.price
+                       or asset_price.spread != self.spread)
+        if self.polled_at is not None:
+            elapsed_s = now - self.polled_at
+            self.poll_interval_s = (
+                elapsed_s if self.poll_interval_s is None
+                else (1 - SMOOTHING) * self.poll_interval_s
+                + SMOOTHING * elapsed_s)
+            self.change_ratio = ((1 - SMOOTHING) * self.change_ratio
+                                 + SMOOTHING * changed)
+        self.price = asset_price.price
+        self.spread = asset_price.spread
+        self.version = version
+        self.polled_at = now
+        return changed
+
+    @property
+    def change_rate(self) -> Optional[float]:
+        """Estimated price changes per second, None until polled twice.
+
+        A poll sees a change if at least one happened since the previous
+        poll, so with changes coming as a Poisson process at rate r and
+        polls every p seconds, changes are seen by 1 - exp(-r * p) of
+        polls.
+        """
+        if not self.poll_interval_s:
+            return None
+        return (-math.log(1 - min(self.change_ratio, MAX_CHANGE_RATIO))
+                / self.poll_interval_s)
+
+
+class PollScheduler:
+    """
+    Polling schedule of asset and market pairs.
+
+    Functionality:
+    - Polls each pair `interval_s` after its previous poll completed
+    - Hands out due pairs earliest deadline first, at most `rate_limit`
+        per second in total if set
+
+    A pair handed out by `next_pair` is not polled again until its poll
+    is reported with `observe` or `observe_failure`. Pairs can be added
+    and removed with `set_pairs`.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, pairs: List[Pair], interval_s: float = 0.5,
+                 rate_limit: Optional[float] = None,
+                 now: Optional[float] = None) -> None:
+        now = self.clock() if now is None else now
+        self.interval_s = interval_s
+        self.bucket: Optional[TokenBucket] = None
+        if rate_limit is not None:
+            self.bucket = TokenBucket(rate_limit)
+            self.bucket.updated_at = now
+        self.states: Dict[Pair, PairPollState] = {
+            pair: PairPollState() for pair in pairs}
+        # (deadline, pair) of pairs not being polled
+        self.deadlines: List[Tuple[float, Pair]] = [
+            (now, pair) for pair in self.states]
+        heapq.heapify(self.deadlines)
+        # wakes up `next_pair` waiting for a later deadline
+        self._rescheduled = asyncio.Event()
+        self.polls_count = 0
+        self.changes_count = 0
+
+    def get_interval(self, pair: Pair) -> float:
+        """Time until the next poll of a pair"""
+        return self.interval_s
+
+    def set_pairs(self, pairs: List[Pair], now: Optional[float] = None
+                  ) -> None:
+        """Poll provided pairs from now on. New pairs are due right away,
+        pairs still polled keep their state and deadline."""
+        now = self.clock() if now is None else now
+        states = {pair: self.states.get(pair) or PairPollState()
+                  for pair in pairs}
+        new_pairs = [pair for pair in states if pair not in self.states]
+        removed = len(self.states) + len(new_pairs) > len(states)
+        self.states = states
+        if removed:
+            self.deadlines = [(deadline, pair)
+                              for deadline, pair in self.deadlines
+                              if pair in states]
+            heapq.heapify(self.deadlines)
+        for pair in new_pairs:
+            heapq.heappush(self.deadlines, (now, pair))
+        self._rescheduled.set()
+
+    def observe(self, pair: Pair, asset_price: schemas.AssetPriceFromApi,
+                now: Optional[float] = None) -> bool:
+        """Store polled price and schedule the next poll of the pair.
+        Returns True if the price changed."""
+        state = self.states.get(pair, None)
+        if state is None:
+            return False  # removed while being polled
+        now = self.clock() if now is None else now
+        changed = state.observe(asset_price, now)
+        self.polls_count += 1
+        self.changes_count += changed
+        self._schedule(pair, now + self.get_interval(pair))
+        return changed
+
+    def observe_failure(self, pair: Pair, now: Optional[float] = None
+                        ) -> None:
+        """Schedule the next poll of a pair whose poll failed"""
+        if pair not in self.states:
+            return
+        now = self.clock() if now is None else now
+        self._schedule(pair, now + self.get_interval(pair))
+
+    def _schedule(self, pair: Pair, deadline: float) -> None:
+        """Add next poll of a pair to the schedule"""
+        heapq.heappush(self.deadlines, (deadline, pair))
+        self._rescheduled.set()
+
+    def get_due(self, now: float
+                ) -> Tuple[Optional[Pair], Optional[float]]:
+        """Take the most overdue pair if it is due and the rate budget
+        allows. Returns the pair, or None and time to wait (None until
+        a pair is rescheduled)."""
+        if not self.deadlines:
+            return None, None
+        deadline, pair = self.deadlines[0]
+        if deadline > now:
+            return None, deadline - now
+        wait_s = self.bucket.try_acquire(now) if self.bucket else 0
+        if wait_s > 0:
+            return None, wait_s
+        heapq.heappop(self.deadlines)
+        return pair, 0.0
+
+    async def next_pair(self) -> Pair:
+        """Wait for the next pair to poll"""
+        while True:
+            self._rescheduled.clear()
+            pair, wait_s = self.get_due(self.clock())
+            if pair is not None:
+                return pair
+            try:
+                await asyncio.wait_for(self._rescheduled.wait(), wait_s)
+            except asyncio.TimeoutError:
+                pass
+
+
+class AdaptivePollScheduler(PollScheduler):
+    """
+    Adaptive polling schedule of asset and market pairs.
+
+    Functionality:
+    - Learns change rate of each pair from successive polled prices and
+        polls it `polls_per_change` times per expected change, within
+        `min_interval_s` and `max_interval_s`
+    - Shortens intervals of all markets of an asset as the gap between
+        its best buying and selling prices (from the detector order book)
+        narrows below `near_crossing` of the price, down to
+        `min_interval_s` once they cross
+    - Hands out due pairs earliest deadline first, at most `rate_limit`
+        per second in total
+    """
+
+    def __init__(self, pairs: List[Pair],
+                 detector: Optional[ArbitrageDetector] = None,
+                 rate_limit: Optional[float] = 100,
+                 min_interval_s: float = 0.1,
+                 max_interval_s: float = 5.0,
+                 initial_interval_s: float = 0.5,
+                 near_crossing: float = 0.02,
+                 polls_per_change: float = 2,
+                 now: Optional[float] = None) -> None:
+        if not 0 < min_interval_s <= max_interval_s:
+            raise ValueError(
+                f"Invalid poll intervals: {min_interval_s}, {max_interval_s}")
+        super().__init__(pairs, interval_s=initial_interval_s,
+                         rate_limit=rate_limit, now=now)
+        self.detector = detector
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.near_crossing = near_crossing
+        self.polls_per_change = polls_per_change
+
+    def get_interval(self, pair: Pair) -> float:
+        """Time until the next poll of a pair"""
+        change_rate = self.states[pair].change_rate
+        if change_rate is None:
+            interval_s = self.interval_s
+        elif change_rate > 0:
+            interval_s = 1 / (change_rate * self.polls_per_change)
+        else:
+            interval_s = self.max_interval_s
+        interval_s *= self._get_urgency(pair[0])
+        return min(max(interval_s, self.min_interval_s), self.max_interval_s)
+
+    def _get_urgency(self, asset: str) -> float:
+        """Scale of poll intervals of an asset: 1 if its best buying and
+        selling prices are far apart, down to 0 as they cross"""
+        if self.detector is None or self.near_crossing <= 0:
+            return 1.0
+        order_book = self.detector.order_books.get(asset, None)
+        if order_book is None:
+            return 1.0
+        best_buy = order_book.best_buy()
+        best_sell = order_book.best_sell()
+        if best_buy is None or best_sell is None:
+            return 1.0
+        gap = (best_buy[0] - best_sell[0]) / best_sell[0]
+        return min(max(gap / self.near_crossing, 0.0), 1.0)
@@ -0,0 +1,247 @@
+"""Multi-process sharded analyzer launcher
+
+Runs the analyzer on all cores of a host:
+- assets of the generator catalog are partitioned across
+  `ANALYZER_SHARDS` worker processes. All markets of an asset belong to
+  the same shard, so arbitrage detection stays local to a process.
+  Assets added to the catalog later are assigned to a shard by a hash of
+  their name, so every shard agrees on it
+- each shard runs its own `PriceFetcher` and `ArbitrageDetector` in the
+  configured fetch and detector modes (see `app.app`)
+- logs of all shards, detections included, are written to the launcher
+  output, tagged with the shard
+- each shard reports its throughput every `SHARD_REPORT_INTERVAL_S`,
+  the launcher logs them with the total
+- each shard writes detection events to its own files, if configured
+  (`events.jsonl` becomes `events.shard0.jsonl`, etc.)
+- each shard serves its own metrics, shard N at `METRICS_PORT` + N
+
+Usage (from `prices_analyzer` folder):
+    python -m app.sharded
+"""
+import asyncio
+from contextlib import nullcontext
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+import os
+import queue
+import time
+from typing import Callable, Dict, List, NamedTuple, Union
+import zlib
+
+from decouple import config
+
+from . import app as analyzer
+from .core.batch_detector import BatchArbitrageDetector
+from .core.detector import ArbitrageDetector
+from .utils.fetch_requests import PriceFetcher
+from .utils.logger import get_logger
+
+
+# not `__name__`, the module runs as `__main__`
+logger = get_logger('app.sharded')
+
+
+class ShardStats(NamedTuple):
+    """Throughput of a shard over a report interval"""
+    shard_id: int
+    prices_per_s: float
+    detections: int
+
+
+def partition_assets(assets_list: List[str], n_shards: int
+                     ) -> List[List[str]]:
+    """Split assets round robin into at most `n_shards` non empty shards"""
+    if n_shards < 1:
+        raise ValueError(f"Number of shards must be positive: {n_shards}")
+    n_shards = min(n_shards, len(assets_list))
+    return [assets_list[shard_id::n_shards] for shard_id in range(n_shards)]
+
+
+def get_asset_filter(shard_id: int, n_shards: int, shard_assets: List[str],
+                     launch_assets: List[str]) -> Callable[[str], bool]:
+    """Tells if an asset belongs to a shard: assets of the catalog the
+    launcher partitioned stay in their shard, the other ones go to the
+    shard given by a stable hash of their name"""
+    shard_assets_set = set(shard_assets)
+    launch_assets_set = set(launch_assets)
+
+    def belongs(asset: str) -> bool:
+        if asset in launch_assets_set:
+            return asset in shard_assets_set
+        return zlib.crc32(asset.encode()) % n_shards == shard_id
+    return belongs
+
+
+async def get_catalog_assets() -> List[str]:
+    """Assets of the generator catalog, the detector default ones if the
+    catalog is not available"""
+    async with PriceFetcher() as price_fetcher:
+        catalog = await price_fetcher.fetch_catalog()
+    if catalog is None:
+        logger.warning("Catalog is not available, using default assets")
+        return ArbitrageDetector().assets_list
+    return catalog.assets
+
+
+def format_throughput(stats: Dict[int, ShardStats], n_shards: int) -> str:
+    """Report line of latest throughput of each shard and their total"""
+    shards = ", ".join(
+        f"shard {shard_id}: {stats[shard_id].prices_per_s:.1f}"
+        f"/{stats[shard_id].detections}" if shard_id in stats
+        else f"shard {shard_id}: -"
+        for shard_id in range(n_shards))
+    total_rate = sum(shard.prices_per_s for shard in stats.values())
+    total_detections = sum(shard.detections for shard in stats.values())
+    return (f"Throughput: {total_rate:.1f} prices/s,"
+            f" {total_detections} detections ({shards})")
+
+
+async def report_throughput(
+        shard_id: int,
+        detector: Union[ArbitrageDetector, BatchArbitrageDetector],
+        stats_queue: Union[queue.Queue, multiprocessing.Queue],
+        interval_s: float) -> None:
+    """Periodically put shard throughput since the previous report into
+    the stats queue"""
+    checks_count = detector.checks_count
+    detections_count = detector.detections_count
+    reported_at = time.monotonic()
+    while True:
+        await asyncio.sleep(interval_s)
+        now = time.monotonic()
+        stats_queue.put(ShardStats(
+            shard_id,
+            (detector.checks_count - checks_count) / (now - reported_at),
+            detector.detections_count - detections_count))
+        checks_count = detector.checks_count
+        detections_count = detector.detections_count
+        reported_at = now
+
+
+def _route_logs(shard_id: int, log_queue: multiprocessing.Queue) -> None:
+    """Send records of the application loggers to the launcher, with
+    the shard appended to the logger name"""
+    def tag_shard(record: logging.LogRecord) -> bool:
+        record.name = f"{record.name}[shard {shard_id}]"
+        return True
+
+    handler = QueueHandler(log_queue)
+    handler.addFilter(tag_shard)
+    for name, shard_logger in list(logging.Logger.manager.loggerDict.items()):
+        if (name.startswith('app') and isinstance(shard_logger, logging.Logger)
+                and shard_logger.handlers):
+            shard_logger.handlers = [handler]
+
+
+async def _run_shard(shard_id: int, n_shards: int, assets_list: List[str],
+                     launch_assets: List[str],
+                     stats_queue: multiprocessing.Queue,
+                     report_interval_s: float) -> None:
+    """Analyze prices of shard assets, reporting throughput"""
+    event_sink = analyzer.get_event_sink(path_suffix=f".shard{shard_id}")
+    detector = ArbitrageDetector(
+        assets_list=assets_list, event_sink=event_sink,
+        alert_margin_change=analyzer.alert_margin_change,
+        latency=analyzer.get_latency_tracker())
+    batch_detector = None
+    if (analyzer.prices_fetch_mode == 'batch'
+            and analyzer.detector_mode == 'vectorized'):
+        batch_detector = BatchArbitrageDetector(
+            detector.assets_list, detector.markets_list,
+            event_sink=event_sink,
+            alert_margin_change=analyzer.alert_margin_change,
+            latency=detector.latency)
+
+    async with PriceFetcher() as price_fetcher, \
+            event_sink or nullcontext():
+        reporter = asyncio.create_task(report_throughput(
+            shard_id, batch_detector or detector, stats_queue,
+            report_interval_s))
+        try:
+            await analyzer.run(
+                price_fetcher, detector, batch_detector,
+                asset_filter=get_asset_filter(shard_id, n_shards,
+                                              assets_list, launch_assets),
+                # each shard serves its own metrics on the next port
+                metrics_port=(analyzer.metrics_server_port + shard_id
+                              if analyzer.metrics_server_port > 0 else 0))
+        finally:
+            reporter.cancel()
+
+
+def run_shard(shard_id: int, n_shards: int, assets_list: List[str],
+              launch_assets: List[str],
+              log_queue: multiprocessing.Queue,
+              stats_queue: multiprocessing.Queue,
+              report_interval_s: float) -> None:
+    """Shard process entry point"""
+    _route_logs(shard_id, log_queue)
+    logger.info(f"Shard {shard_id} tracking {len(assets_list)} assets")
+    try:
+        asyncio.run(_run_shard(shard_id, n_shards, assets_list,
+                               launch_assets, stats_queue,
+                               report_interval_s))
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    """Starts a process per shard of assets and writes their logs and
+    throughput reports until all of them exit. Shards are terminated
+    once the launcher is interrupted.
+    """
+    n_shards = int(config('ANALYZER_SHARDS', default=os.cpu_count() or 1))
+    report_interval_s = float(config('SHARD_REPORT_INTERVAL_S', default=10))
+    launch_assets = asyncio.run(get_catalog_assets())
+    shards = partition_assets(launch_assets, n_shards)
+
+    context = multiprocessing.get_context('spawn')
+    log_queue = context.Queue()
+    stats_queue = context.Queue()
+    listener = QueueListener(log_queue, *logger.handlers,
+                             respect_handler_level=True)
+    listener.start()
+
+    workers = [
+        context.Process(
+            target=run_shard,
+            args=(shard_id, len(shards), assets_list, launch_assets,
+                  log_queue, stats_queue, report_interval_s),
+            name=f'analyzer_shard_{shard_id}',
+            daemon=True)
+        for shard_id, assets_list in enumerate(shards)]
+    logger.info(f"Starting {len(workers)} analyzer shards")
+    for worker in workers:
+        worker.start()
+
+    stats: Dict[int, ShardStats] = {}
+    report_at = time.monotonic() + report_interval_s
+    try:
+        while any(worker.is_alive() for worker in workers):
+            try:
+                shard_stats = stats_queue.get(
+                    timeout=max(report_at - time.monotonic(), 0))
+                stats[shard_stats.shard_id] = shard_stats
+            except queue.Empty:
+                pass
+            if time.monotonic() >= report_at:
+                for shard_id, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        stats.pop(shard_id, None)
+                logger.info(format_throughput(stats, len(workers)))
+                report_at += report_interval_s
+        logger.error("All analyzer shards exited")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        listener.stop()
+
+
+if __name__ == '__main__':
+    main()
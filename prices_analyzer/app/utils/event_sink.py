@@ -0,0 +1,207 @@
+"""
+Arbitrage Event Sink Module
+
+Structured output of detected arbitrage opportunities: detectors put
+events into a bounded in-memory queue without waiting, and a background
+task writes them in batches to JSONL files and/or SQLite databases.
+Writes run in a worker thread, off the event loop.
+"""
+import asyncio
+from collections import deque
+import json
+import os
+import sqlite3
+from typing import Deque, List, Optional, Protocol
+
+from . import schemas
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+QUEUE_FULL_POLICIES = ('drop_oldest', 'drop_new')
+
+
+class EventWriter(Protocol):
+    """Destination of arbitrage events batches"""
+
+    def write(self, events: List[schemas.ArbitrageEvent]) -> None:
+        """Write a batch of events"""
+
+    def close(self) -> None:
+        """Release the destination"""
+
+
+class JsonlEventWriter:
+    """Appends events to a JSON lines file, an object per event"""
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._file = open(file_path, 'a', encoding='utf-8')
+
+    def write(self, events: List[schemas.ArbitrageEvent]) -> None:
+        self._file.write(''.join(
+            json.dumps(event._asdict(), separators=(',', ':')) + '\n'
+            for event in events))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SqliteEventWriter:
+    """Inserts events into `arbitrage_events` table of a SQLite database,
+    a transaction per batch"""
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        # used by one worker thread at a time
+        self._connection = sqlite3.connect(file_path,
+                                           check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS arbitrage_events ("
+            " asset TEXT, market_buy TEXT, market_sell TEXT,"
+            " price_buy REAL, price_sell REAL, margin REAL,"
+            " detected_at REAL, status TEXT)")
+        self._connection.commit()
+
+    def write(self, events: List[schemas.ArbitrageEvent]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO arbitrage_events"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                events)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class ArbitrageEventSink:
+    """
+    Batched asynchronous writer of arbitrage events.
+
+    Functionality:
+    - `put` queues an event without waiting. Once `queue_size` events are
+        waiting, `queue_full_policy` drops either the oldest waiting
+        event (`drop_oldest`) or the new one (`drop_new`); dropped events
+        are counted in `dropped_count`
+    - `run` writes waiting events to every writer in batches of at most
+        `flush_size`, once `flush_size` events are waiting or
+        `flush_interval_s` after the previous write
+    - `close` writes remaining events and closes writers
+
+    `written_count` and `failed_count` count events by writer, an event
+    written to two destinations is counted twice.
+
+    Used as an async context manager, runs in a background task until
+    the context is left, then closes.
+    """
+
+    def __init__(self, writers: List[EventWriter], flush_size: int = 100,
+                 flush_interval_s: float = 1.0, queue_size: int = 10000,
+                 queue_full_policy: str = 'drop_oldest') -> None:
+        if queue_full_policy not in QUEUE_FULL_POLICIES:
+            raise ValueError(
+                f"Unknown queue full policy: {queue_full_policy}")
+        self.writers = writers
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.queue_size = queue_size
+        self.queue_full_policy = queue_full_policy
+        self._events: Deque[schemas.ArbitrageEvent] = deque()
+        self._flush_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.put_count = 0
+        self.written_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0
+
+    def put(self, event: schemas.ArbitrageEvent) -> None:
+        """Queue an event for writing"""
+        self.put_count += 1
+        if len(self._events) >= self.queue_size:
+            self.dropped_count += 1
+            if self.queue_full_policy == 'drop_new':
+                return
+            self._events.popleft()
+        self._events.append(event)
+        if len(self._events) >= self.flush_size:
+            self._flush_requested.set()
+
+    async def run(self) -> None:
+        """Write events until stopped by leaving the context"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(),
+                                       self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all waiting events"""
+        self._flush_requested.clear()
+        while self._events:
+            batch = [self._events.popleft()
+                     for _ in range(min(self.flush_size, len(self._events)))]
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: List[schemas.ArbitrageEvent]) -> None:
+        """Write a batch to every writer. A failing writer loses the batch
+        without affecting the others or stopping the sink."""
+        for writer in self.writers:
+            try:
+                writer.write(batch)
+            except (OSError, sqlite3.Error) as e:
+                self.failed_count += len(batch)
+                logger.error(f"Failed to write {len(batch)} arbitrage"
+                             f" events with {type(writer).__name__}: {e}")
+            except Exception:  # pylint: disable=W0703
+                self.failed_count += len(batch)
+                logger.exception(f"Failed to write {len(batch)} arbitrage"
+                                 f" events with {type(writer).__name__}")
+            else:
+                self.written_count += len(batch)
+
+    async def close(self) -> None:
+        """Write waiting events and close writers"""
+        await self.flush()
+        for writer in self.writers:
+            writer.close()
+
+    async def __aenter__(self) -> 'ArbitrageEventSink':
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # not cancelled, a batch may be being written in a thread
+        self._stopping = True
+        self._flush_requested.set()
+        if self._task is not None:
+            await self._task
+        await self.close()
+
+
+def create_event_sink(jsonl_path: str = '', sqlite_path: str = '',
+                      path_suffix: str = '', **kwargs
+                      ) -> Optional[ArbitrageEventSink]:
+    """Sink writing to the given destinations, None if there are none.
+    `path_suffix` is inserted before extensions of destinations, e.g. to
+    give each process its own files."""
+    writers: List[EventWriter] = []
+    if jsonl_path:
+        writers.append(JsonlEventWriter(
+            _add_suffix(jsonl_path, path_suffix)))
+    if sqlite_path:
+        writers.append(SqliteEventWriter(
+            _add_suffix(sqlite_path, path_suffix)))
+    if not writers:
+        return None
+    return ArbitrageEventSink(writers, **kwargs)
+
+
+def _add_suffix(file_path: str, suffix: str) -> str:
+    """Insert suffix before file extension"""
+    root, extension = os.path.splitext(file_path)
+    return f"{root}{suffix}{extension}"
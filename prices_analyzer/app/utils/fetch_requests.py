@@ -1,65 +1,729 @@
 """Module responsible for fetching data from an API endpoint
 """
 import asyncio
-from typing import Optional, Union
+from collections import defaultdict
+from functools import partial
+import importlib.util
+import time
+from typing import (AsyncGenerator, AsyncIterator, Awaitable, Callable,
+                    Dict, Iterable, Iterator, List, Optional, Tuple,
+                    TypeVar, Union)
 from decouple import config
 import httpx
 
 from ..utils import schemas
 from ..utils.logger import get_logger
+from ..utils.resilience import (CircuitBreaker, CircuitOpenError, HedgeDelay,
+                                RetryBudget, get_backoff_s)
+from ..utils.upstreams import (Upstream, UpstreamRouter, parse_routes,
+                               parse_upstream_groups)
 
 
 logger = get_logger(__name__)
 
+Pair = Tuple[str, str]
+Prices = Dict[Pair, schemas.AssetPriceFromApi]
+T = TypeVar('T')
+_STREAM_END = object()
+
+RESILIENCE_OUTCOMES = (
+    'retried', 'retry_succeeded', 'retry_failed', 'retries_exhausted',
+    'retry_budget_exhausted', 'circuit_rejected', 'hedged', 'hedge_won',
+    'hedge_budget_exhausted')
+
+
+def is_retryable(response: httpx.Response) -> bool:
+    """Whether a response is a failure worth retrying"""
+    return (response.is_server_error
+            or response.status_code == httpx.codes.TOO_MANY_REQUESTS)
+
+
+async def iter_sse_events(lines: AsyncIterator[str]
+                          ) -> AsyncIterator[Tuple[str, str]]:
+    """Parse Server-Sent Events stream lines into (event, data) pairs.
+    Comments, e.g. keepalives, are skipped."""
+    event = 'message'
+    data: List[str] = []
+    async for line in lines:
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+        elif not line.startswith(':'):
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+
+
+async def merge_streams(streams: List[AsyncGenerator[T, None]]
+                        ) -> AsyncGenerator[T, None]:
+    """Items of several async generators as they arrive. Ends once any
+    of them ends or fails, raising its error; the others are closed."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=len(streams))
+
+    async def forward(stream: AsyncGenerator[T, None]) -> None:
+        error = None
+        try:
+            async for item in stream:
+                await queue.put((item, None))
+        except Exception as e:  # pylint: disable=W0703
+            error = e
+        finally:
+            await stream.aclose()
+        await queue.put((_STREAM_END, error))
+
+    tasks = [asyncio.ensure_future(forward(stream)) for stream in streams]
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 
 class PriceFetcher:
     """Class responsible for fetching price of an asset on a market from
     predefined API.
 
-    Reads API url adress from .env but can be overridden on initialisation
+    Reads API url adress and connection pool settings from .env but can be
+    overridden on initialisation.
+
+    Owns a long-lived HTTP client, so connections are kept alive and
+    reused across requests instead of being set up for each one. Call
+    `start` before and `close` after use, or use as an async context
+    manager.
+
+    Requests are single-flight: concurrent callers asking for the same
+    asset and market share one in-flight request. `fetch_prices` fetches
+    many pairs with a few batch requests to the generator `/prices`
+    endpoint, falling back to concurrent single requests if the endpoint
+    is not available. `stream_prices` subscribes to the generator prices
+    stream instead of polling. `fetch_catalog` gets the assets and markets
+    the generator provides.
+
+    With upstreams (`PRICES_UPSTREAMS`, see `utils.upstreams`) requests
+    go straight to generator replicas instead of a single host, e.g.
+    Nginx: to a group of replicas chosen by market
+    (`PRICES_UPSTREAM_ROUTES`), balanced by weighted least outstanding
+    requests, and to another replica of the group if one fails.
+    Replicas failing `UPSTREAM_MAX_FAILS` times within
+    `UPSTREAM_FAIL_TIMEOUT_S` are ejected for that long. Batches never
+    mix groups, and streams of several groups are merged.
+
+    Failed requests are retried up to `FETCH_MAX_RETRIES` times after
+    a jittered exponential backoff (`FETCH_RETRY_BACKOFF_S` doubled with
+    each retry, at most `FETCH_RETRY_MAX_BACKOFF_S`), within a retry
+    budget of `FETCH_RETRY_BUDGET_RATIO` retries per request. Each
+    generator has a circuit breaker, opened by `FETCH_BREAKER_FAILURES`
+    failures in a row for `FETCH_BREAKER_RESET_S`. With `FETCH_HEDGE`,
+    a price request not answered within `FETCH_HEDGE_PERCENTILE` of
+    recent request durations is sent again, the first response wins;
+    hedged requests take from the retry budget too. Outcomes are counted
+    in `outcomes` (see `utils.resilience`).
+
+    Received prices are stamped with the serving replica and the request
+    and response times, for latency tracing (see `utils.latency`).
+    HTTP requests sent and prices received are counted in
+    `requests_count` and `prices_count`, failed requests in `errors` by
+    error type: `http_<status>` or the request error class name.
     """
+    upstreams: Optional[UpstreamRouter] = None
+
+    # pylint: disable=R0913
     def __init__(
             self,
             host: Optional[str] = None,
             port: Optional[str] = None,
             protocol: Optional[str] = None,
+            max_connections: Optional[int] = None,
+            keepalive_expiry_s: Optional[float] = None,
+            http2: Optional[bool] = None,
+            batch_size: Optional[int] = None,
+            upstreams: Optional[UpstreamRouter] = None,
             ):
         self.prices_source_protocol = (
             protocol
             or config('PRICES_SOURCE_PROTOCOL', default="http"))
         self.prices_source_host = host or config('PRICES_SOURCE_HOST')
         self.prices_source_port = port or config('PRICES_SOURCE_PORT')
+        self.max_connections = (
+            max_connections
+            or config('FETCH_MAX_CONNECTIONS', default=100, cast=int))
+        self.keepalive_expiry_s = (
+            keepalive_expiry_s
+            or config('FETCH_KEEPALIVE_EXPIRY_S', default=30, cast=float))
+        self.http2 = (config('FETCH_HTTP2', default=False, cast=bool)
+                      if http2 is None else http2)
+        # generator sends keepalives every 15 s, a silent stream is dead
+        self.stream_read_timeout_s = config(
+            'STREAM_READ_TIMEOUT_S', default=45, cast=float)
+        self.batch_size = (
+            batch_size or config('FETCH_BATCH_SIZE', default=100, cast=int))
+        # unknown until the first batch request
+        self.batch_supported = True
+        self.client: Optional[httpx.AsyncClient] = None
+        # pair -> request in flight, resolving to prices of its pairs
+        self._in_flight: Dict[Pair, asyncio.Task] = {}
+        self.upstreams = upstreams or self._get_upstreams_from_config()
+        self.requests_count = 0
+        self.prices_count = 0
+        self.errors: Dict[str, int] = {}
+        # requests sent to another upstream after one failed
+        self.failovers_count = 0
+        self.max_retries = config('FETCH_MAX_RETRIES', default=2, cast=int)
+        self.retry_backoff_s = config('FETCH_RETRY_BACKOFF_S', default=0.1,
+                                      cast=float)
+        self.retry_max_backoff_s = config('FETCH_RETRY_MAX_BACKOFF_S',
+                                          default=2, cast=float)
+        self.retry_budget = RetryBudget(config(
+            'FETCH_RETRY_BUDGET_RATIO', default=0.1, cast=float))
+        self.breaker_failures = config('FETCH_BREAKER_FAILURES', default=5,
+                                       cast=int)
+        self.breaker_reset_s = config('FETCH_BREAKER_RESET_S', default=5,
+                                      cast=float)
+        # generator base URL -> its circuit breaker
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.hedge_delay = (
+            HedgeDelay(config('FETCH_HEDGE_PERCENTILE', default=95,
+                              cast=float))
+            if config('FETCH_HEDGE', default=False, cast=bool) else None)
+        self.outcomes: Dict[str, int] = dict.fromkeys(RESILIENCE_OUTCOMES, 0)
         self._get_api_url_template()
 
+    def _get_upstreams_from_config(self) -> Optional[UpstreamRouter]:
+        spec = config('PRICES_UPSTREAMS', default='')
+        if not spec:
+            return None
+        return UpstreamRouter(
+            parse_upstream_groups(
+                spec, self.prices_source_protocol,
+                max_fails=config('UPSTREAM_MAX_FAILS', default=3, cast=int),
+                fail_timeout_s=config('UPSTREAM_FAIL_TIMEOUT_S', default=30,
+                                      cast=float)),
+            parse_routes(config('PRICES_UPSTREAM_ROUTES', default='')))
+
     def _get_api_url_template(self) -> None:
-        self.api_url_template: str = (
+        self.api_base_url: str = (
             f"{self.prices_source_protocol}://{self.prices_source_host}"
-            f":{self.prices_source_port}/"
+            f":{self.prices_source_port}")
+        self.api_url_template: str = (
+            f"{self.api_base_url}/"
             f"price?asset_name={{asset}}&market={{market}}")
 
+    def _count_error(self, error: Union[BaseException, httpx.Response]
+                     ) -> None:
+        """Count a failed request by its error type, or by status of an
+        error response"""
+        if isinstance(error, httpx.HTTPStatusError):
+            error = error.response
+        if isinstance(error, httpx.Response):
+            error_type = f"http_{error.status_code}"
+        else:
+            error_type = type(error).__name__
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def _get_group_name(self, market: str) -> str:
+        """Name of the upstream group serving a market, empty without
+        upstreams"""
+        if self.upstreams is None:
+            return ''
+        return self.upstreams.get_group(market).name
+
+    def _get_breaker(self, base_url: str) -> CircuitBreaker:
+        breaker = self.breakers.get(base_url, None)
+        if breaker is None:
+            breaker = self.breakers[base_url] = CircuitBreaker(
+                self.breaker_failures, self.breaker_reset_s, name=base_url)
+        return breaker
+
+    async def _get(self, path: str, market: Optional[str] = None,
+                   hedge: bool = False, **kwargs) -> httpx.Response:
+        """GET a generator endpoint, retrying failures within the retry
+        budget after a jittered backoff; the last error or response goes
+        to the caller. Requests are hedged if `hedge` and hedging is
+        enabled."""
+        await self.start()
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            error: Union[Exception, httpx.Response]
+            try:
+                response = await (
+                    self._send_hedged(path, market, **kwargs) if hedge
+                    else self._send_routed(path, market, **kwargs))
+                if not is_retryable(response):
+                    if attempt:
+                        # e.g. a 404 answered to a retry is not a success
+                        self.outcomes['retry_succeeded'
+                                      if response.is_success
+                                      else 'retry_failed'] += 1
+                    return response
+                error = response
+            except CircuitOpenError:
+                # no generator would take it, a retry would not either
+                raise
+            except httpx.RequestError as e:
+                error = e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                if self.max_retries:
+                    self.outcomes['retries_exhausted'] += 1
+            elif not self.retry_budget.withdraw():
+                self.outcomes['retry_budget_exhausted'] += 1
+            else:
+                self._count_error(error)
+                self.outcomes['retried'] += 1
+                await asyncio.sleep(get_backoff_s(
+                    attempt, self.retry_backoff_s, self.retry_max_backoff_s))
+                continue
+            if isinstance(error, httpx.Response):
+                return error
+            raise error
+
+    async def _send_hedged(self, path: str, market: Optional[str],
+                           **kwargs) -> httpx.Response:
+        """Send a request, and the same request again if there is no
+        response within the hedge delay. The first successful response
+        is returned, the other request cancelled."""
+        delay_s = None if self.hedge_delay is None else self.hedge_delay.get()
+        if delay_s is None:
+            return await self._send_routed(path, market, **kwargs)
+
+        tasks = [asyncio.ensure_future(
+            self._send_routed(path, market, **kwargs))]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=delay_s)
+            if pending:
+                if self.retry_budget.withdraw():
+                    self.outcomes['hedged'] += 1
+                    # the first request is outstanding, so the hedge goes
+                    # to another upstream of the group if there is one
+                    tasks.append(asyncio.ensure_future(
+                        self._send_routed(path, market, **kwargs)))
+                else:
+                    self.outcomes['hedge_budget_exhausted'] += 1
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                completed = [task for task in tasks if task in done]
+                for task in completed:
+                    if (task.exception() is None
+                            and not is_retryable(task.result())):
+                        if task is not tasks[0]:
+                            self.outcomes['hedge_won'] += 1
+                        return task.result()
+                if not pending:
+                    return completed[-1].result()
+                # failed before the other one, which may still succeed
+                self._count_error(completed[0].exception()
+                                  or completed[0].result())
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send_routed(self, path: str, market: Optional[str],
+                           **kwargs) -> httpx.Response:
+        """Send a request to the generator. With upstreams, to an
+        upstream of the group serving `market`, failing over to the
+        others of the group on request errors, server error responses
+        and open circuits."""
+        if self.upstreams is None:
+            return await self._send(self.api_base_url, path, **kwargs)
+
+        group = self.upstreams.get_group(market)
+        tried: List[Upstream] = []
+        while True:
+            upstream = group.select(exclude=tried)
+            if upstream is None:
+                raise httpx.RequestError(
+                    f"No upstream available in group {group.name}")
+            tried.append(upstream)
+            is_last = len(tried) == len(group.upstreams)
+            try:
+                response = await self._send(upstream.base_url, path,
+                                            upstream, **kwargs)
+            except httpx.RequestError as e:
+                if is_last:
+                    raise
+                self.failovers_count += 1
+                if not isinstance(e, CircuitOpenError):
+                    self._count_error(e)
+                    logger.warning(f"Request to {upstream.base_url} failed,"
+                                   f" trying another upstream: {e!r}")
+                continue
+
+            if not response.is_server_error or is_last:
+                return response
+            self._count_error(response)
+            self.failovers_count += 1
+            logger.warning(f"{upstream.base_url} responded with"
+                           f" {response.status_code}, trying another"
+                           " upstream")
+
+    async def _send(self, base_url: str, path: str,
+                    upstream: Optional[Upstream] = None, **kwargs
+                    ) -> httpx.Response:
+        """Send a single request, unless the circuit of the generator is
+        open, recording its outcome in the circuit breaker and the
+        upstream"""
+        breaker = self._get_breaker(base_url)
+        if not breaker.allow_request():
+            self.outcomes['circuit_rejected'] += 1
+            raise CircuitOpenError(f"Circuit of {base_url} is open")
+
+        self.requests_count += 1
+        if upstream is not None:
+            upstream.requests_count += 1
+            upstream.outstanding += 1
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(  # type: ignore
+                f"{base_url}{path}", **kwargs)
+        except httpx.RequestError:
+            breaker.record_failure()
+            if upstream is not None:
+                upstream.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # e.g. lost a hedge, no outcome to record
+            breaker.release_probe()
+            raise
+        finally:
+            if upstream is not None:
+                upstream.outstanding -= 1
+
+        if response.is_server_error:
+            breaker.record_failure()
+            if upstream is not None:
+                upstream.record_failure()
+        else:
+            breaker.record_success()
+            if upstream is not None:
+                upstream.record_success()
+            if self.hedge_delay is not None:
+                self.hedge_delay.record(time.perf_counter() - started)
+        return response
+
     def get_api(self, asset, market) -> str:
         """construct api url reying on template and provided values"""
         return self.api_url_template.format(asset=asset, market=market)
 
+    async def start(self) -> None:
+        """Create the shared HTTP client. HTTP/2 requires `h2` package,
+        falls back to HTTP/1.1 if it is not installed.
+        """
+        if self.client is not None:
+            return
+
+        http2 = self.http2
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning("HTTP/2 requested but `h2` package is not"
+                           " installed, falling back to HTTP/1.1")
+            http2 = False
+
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry_s),
+            http2=http2)
+        logger.debug(f"HTTP client started: {self.max_connections}"
+                     f" connections, HTTP/2 {http2}")
+
+    async def close(self) -> None:
+        """Close the shared HTTP client and its connections"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def __aenter__(self) -> 'PriceFetcher':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_in_flight(self, pairs: List[Pair],
+                       fetch: Callable[[], Awaitable[Prices]]
+                       ) -> asyncio.Task:
+        """Start request fetching provided pairs and register it as in
+        flight for each of them until it is done"""
+        task = asyncio.ensure_future(fetch())
+        for pair in pairs:
+            self._in_flight[pair] = task
+
+        def unregister(_: asyncio.Task) -> None:
+            for pair in pairs:
+                if self._in_flight.get(pair) is task:
+                    del self._in_flight[pair]
+
+        task.add_done_callback(unregister)
+        return task
+
     async def fetch_price(
             self, asset: str, market: str
             ) -> Union[schemas.AssetPriceFromApi, None]:
-        """try to get value from the endpoint"""
-        asset_data = None
+        """try to get value from the endpoint, joining a request already
+        in flight for the same asset and market if there is one"""
+        pair = (asset, market)
+        task = self._in_flight.get(pair, None)
+        if task is None:
+            task = self._get_in_flight(
+                [pair], lambda: self._fetch_price(asset, market))
+        # a cancelled caller must not cancel the request other callers
+        # are waiting for
+        prices = await asyncio.shield(task)
+        return prices.get(pair, None)
+
+    async def fetch_prices(self, pairs: Iterable[Pair]) -> Prices:
+        """Fetch current prices of provided (asset, market) pairs.
+        Pairs are grouped into batch requests of at most `batch_size`
+        pairs, or requested one by one concurrently if the generator has
+        no batch endpoint. Pairs that failed to be fetched are missing in
+        the result.
+        """
+        tasks: Dict[Pair, asyncio.Task] = {}
+        new_pairs = []
+        for pair in dict.fromkeys(pairs):
+            if pair in self._in_flight:
+                tasks[pair] = self._in_flight[pair]
+            else:
+                new_pairs.append(pair)
+
+        if self.batch_supported:
+            for batch in self._get_batches(new_pairs):
+                task = self._get_in_flight(
+                    batch, partial(self._fetch_batch, batch))
+                tasks.update(dict.fromkeys(batch, task))
+        else:
+            for asset, market in new_pairs:
+                tasks[asset, market] = self._get_in_flight(
+                    [(asset, market)],
+                    partial(self._fetch_price, asset, market))
+
+        prices: Prices = {}
+        for task in set(tasks.values()):
+            prices.update(await asyncio.shield(task))
+        return {pair: prices[pair] for pair in tasks if pair in prices}
+
+    def _get_batches(self, pairs: List[Pair]) -> Iterator[List[Pair]]:
+        """Split pairs into batches of at most `batch_size` pairs, each
+        being all combinations of some assets and markets, as the batch
+        endpoint expects, and all served by the same upstream group"""
+        markets_by_asset: Dict[Tuple[str, str], List[str]] = (
+            defaultdict(list))
+        for asset, market in pairs:
+            markets_by_asset[asset, self._get_group_name(market)].append(
+                market)
+
+        assets_by_markets: Dict[Tuple[str, ...], List[str]] = (
+            defaultdict(list))
+        for (asset, _), asset_markets in markets_by_asset.items():
+            assets_by_markets[tuple(asset_markets)].append(asset)
+
+        for markets, assets in assets_by_markets.items():
+            markets_per_batch = min(len(markets), self.batch_size)
+            assets_per_batch = max(1, self.batch_size // markets_per_batch)
+            for markets_start in range(0, len(markets), markets_per_batch):
+                batch_markets = markets[
+                    markets_start:markets_start + markets_per_batch]
+                for assets_start in range(0, len(assets), assets_per_batch):
+                    yield [
+                        (asset, market)
+                        for asset in assets[
+                            assets_start:assets_start + assets_per_batch]
+                        for market in batch_markets]
+
+    async def fetch_catalog(self) -> Optional[schemas.Catalog]:
+        """Request assets and markets catalog of the generator. Returns
+        None if it is not available."""
         try:
-            async with (httpx.AsyncClient(timeout=httpx.Timeout(10.0))
-                        as client):
-                api_url = self.get_api(asset=asset, market=market)
-                response = await client.get(api_url)
+            response = await self._get('/catalog')
+            response.raise_for_status()
+            return schemas.Catalog(**response.json())
+        except httpx.HTTPStatusError as e:
+            self._count_error(e)
+            logger.error(f"HTTP error for the catalog: {e}")
+        except httpx.RequestError as e:
+            self._count_error(e)
+            logger.error(f"Request error for the catalog: {e}")
+        except ValueError as e:
+            logger.error(f"Invalid catalog: {e}")
+        return None
+
+    async def stream_prices(
+            self, assets: List[str], markets: List[str]
+            ) -> AsyncIterator[schemas.AssetPriceFromApi]:
+        """Subscribe to the generator Server-Sent Events prices stream.
+        Yields current prices of all combinations of provided assets and
+        markets first, then each update as it happens. Ends once the
+        generator closes the stream; HTTP and connection errors are raised
+        to the caller. With upstreams, markets of each group are streamed
+        from an upstream of the group, all streams merged.
+        """
+        if self.upstreams is None:
+            stream = self._stream_prices(self.api_base_url, assets, markets)
+        else:
+            markets_by_group: Dict[str, List[str]] = defaultdict(list)
+            for market in markets:
+                markets_by_group[self._get_group_name(market)].append(market)
+            streams = []
+            for group_name, group_markets in markets_by_group.items():
+                upstream = self.upstreams.groups[group_name].select()
+                if upstream is None:
+                    raise httpx.RequestError(
+                        f"No upstream available in group {group_name}")
+                streams.append(self._stream_prices(
+                    upstream.base_url, assets, group_markets, upstream))
+            stream = (streams[0] if len(streams) == 1
+                      else merge_streams(streams))
+        try:
+            async for asset_price in stream:
+                yield asset_price
+        finally:
+            await stream.aclose()
+
+    async def _stream_prices(
+            self, base_url: str, assets: List[str], markets: List[str],
+            upstream: Optional[Upstream] = None
+            ) -> AsyncGenerator[schemas.AssetPriceFromApi, None]:
+        """Prices stream of a generator, tracking load and health of its
+        upstream if given"""
+        await self.start()
+        self.requests_count += 1
+        if upstream is not None:
+            upstream.requests_count += 1
+            upstream.outstanding += 1
+        try:
+            async with self.client.stream(  # type: ignore
+                    'GET', f"{base_url}/prices/stream",
+                    params={'asset_name': assets, 'market': markets},
+                    headers={'Accept': 'text/event-stream'},
+                    timeout=httpx.Timeout(10.0,
+                                          read=self.stream_read_timeout_s)
+                    ) as response:
                 response.raise_for_status()
-                asset_data = response.json()
-                logger.debug(f"Received asset data: {asset_data}")
-                asset_data = schemas.AssetPriceFromApi(**asset_data)
+                logger.info("Subscribed to prices stream")
+                if upstream is not None:
+                    upstream.record_success()
+                server_id = response.headers.get('x-server-id', None)
+                async for event, data in iter_sse_events(
+                        response.aiter_lines()):
+                    if event == 'price':
+                        received_at = time.time()
+                        self.prices_count += 1
+                        # prices are frozen, trace fields go into a copy
+                        yield schemas.AssetPriceFromApi.model_validate_json(
+                            data).model_copy(update={
+                                'server_id': server_id,
+                                'received_at': received_at})
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            self._count_error(e)
+            if upstream is not None:
+                upstream.record_failure()
+            raise
+        finally:
+            if upstream is not None:
+                upstream.outstanding -= 1
+
+    async def _fetch_price(self, asset: str, market: str) -> Prices:
+        """Request price of a single pair"""
+        asset_data = None
+        try:
+            requested_at = time.time()
+            response = await self._get(
+                '/price', market, hedge=True,
+                params={'asset_name': asset, 'market': market})
+            received_at = time.time()
+            response.raise_for_status()
+            asset_data = response.json()
+            logger.debug(f"Received asset data: {asset_data}")
+            asset_data = schemas.AssetPriceFromApi(
+                **asset_data,
+                server_id=response.headers.get('x-server-id', None),
+                requested_at=requested_at, received_at=received_at)
+            self.prices_count += 1
 
         except httpx.HTTPStatusError as e:
+            self._count_error(e)
             logger.error(f"HTTP error for {asset} in {market}: {e}")
-            await asyncio.sleep(0.1)
+        except CircuitOpenError as e:
+            self._count_error(e)
+            logger.debug(f"Not requested {asset} in {market}: {e}")
         except httpx.RequestError as e:
+            self._count_error(e)
             logger.error(f"Request error for {asset} in {market}: {e}")
-            await asyncio.sleep(0.1)
-        return asset_data
+
+        return {} if asset_data is None else {(asset, market): asset_data}
+
+    async def _fetch_batch(self, batch: List[Pair]) -> Prices:
+        """Request prices of a batch of pairs from the batch endpoint.
+        Switches to single requests if the generator has no such
+        endpoint."""
+        try:
+            requested_at = time.time()
+            # all markets of a batch are served by the same group
+            response = await self._get(
+                '/prices', batch[0][1], hedge=True,
+                params={
+                    'asset_name': list(dict.fromkeys(a for a, _ in batch)),
+                    'market': list(dict.fromkeys(m for _, m in batch))})
+            received_at = time.time()
+            if response.status_code in (httpx.codes.NOT_FOUND,
+                                        httpx.codes.METHOD_NOT_ALLOWED):
+                logger.warning("Batch prices endpoint is not available,"
+                               " falling back to single requests")
+                self.batch_supported = False
+                return await self._fetch_singles(batch)
+            response.raise_for_status()
+            prices_data = response.json()['prices']
+
+        except httpx.HTTPStatusError as e:
+            self._count_error(e)
+            logger.error(f"HTTP error for a batch of {len(batch)} pairs:"
+                         f" {e}")
+            return {}
+        except CircuitOpenError as e:
+            self._count_error(e)
+            logger.debug(f"Not requested a batch of {len(batch)} pairs: {e}")
+            return {}
+        except httpx.RequestError as e:
+            self._count_error(e)
+            logger.error(f"Request error for a batch of {len(batch)} pairs:"
+                         f" {e}")
+            return {}
+
+        requested = set(batch)
+        server_id = response.headers.get('x-server-id', None)
+        prices: Prices = {}
+        for asset_data in prices_data:
+            asset_price = schemas.AssetPriceFromApi(
+                **asset_data, server_id=server_id,
+                requested_at=requested_at, received_at=received_at)
+            pair = (asset_price.name, asset_price.market)
+            if pair in requested:
+                prices[pair] = asset_price
+        self.prices_count += len(prices)
+        logger.debug(f"Received {len(prices)} prices in a batch")
+        return prices
+
+    async def _fetch_singles(self, pairs: List[Pair]) -> Prices:
+        """Request prices of pairs one by one, concurrently"""
+        prices: Prices = {}
+        for pair_prices in await asyncio.gather(
+                *(self._fetch_price(asset, market)
+                  for asset, market in pairs)):
+            prices.update(pair_prices)
+        return prices
@@ -0,0 +1,107 @@
+"""
+Tick Latency Tracing Module
+
+Tracks how fresh prices are by the time they are checked for arbitrage.
+Each checked tick is split into stages, using Unix timestamps carried
+by the price:
+- `fetch`: from the request start to the response (`received_at -
+    requested_at`), polling only
+- `queue`: from the response to the start of the check, e.g. time spent
+    in pipeline queues
+- `detect`: duration of the check itself
+- `tick_to_detection`: from the generator update of the price to the
+    end of the check (`updated_at` stamped by the generator), i.e. end
+    to end freshness, including generator to analyzer clock skew
+
+Durations are kept in histograms over all ticks, per asset and per
+upstream server (`server_id`, replica named by the generator in
+`X-Server-Id` header).
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import schemas
+from .histogram import DEFAULT_PERCENTILES, LatencyHistogram
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+STAGES = ('fetch', 'queue', 'detect', 'tick_to_detection')
+# stage, dimension, asset or server name ('' for `all`)
+HistogramKey = Tuple[str, str, str]
+
+
+class LatencyTracker:
+    """
+    Latency histograms of tick processing stages.
+
+    `record_tick` records every stage of a checked tick; stages missing
+    timestamps, e.g. `fetch` of streamed prices, are skipped.
+    """
+
+    def __init__(self, percentiles: Iterable[float] = DEFAULT_PERCENTILES
+                 ) -> None:
+        self.percentiles = list(percentiles)
+        self.histograms: Dict[HistogramKey, LatencyHistogram] = {}
+
+    def _get_histogram(self, key: HistogramKey) -> LatencyHistogram:
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    def record(self, stage: str, value_s: float, asset: Optional[str] = None,
+               server: Optional[str] = None) -> None:
+        """Count a duration of a stage over all ticks, for the asset and
+        for the server, if given"""
+        self._get_histogram((stage, 'all', '')).record(value_s)
+        if asset is not None:
+            self._get_histogram((stage, 'asset', asset)).record(value_s)
+        if server is not None:
+            self._get_histogram((stage, 'server', server)).record(value_s)
+
+    def record_tick(self, asset_price: schemas.AssetPriceFromApi,
+                    started_at: float, checked_at: float) -> None:
+        """Record stages of a tick checked from `started_at` till
+        `checked_at` (Unix time)"""
+        asset, server = asset_price.name, asset_price.server_id
+        received_at = asset_price.received_at
+        if received_at is not None:
+            if asset_price.requested_at is not None:
+                self.record('fetch', received_at - asset_price.requested_at,
+                            asset, server)
+            self.record('queue', started_at - received_at, asset, server)
+        self.record('detect', checked_at - started_at, asset, server)
+        if asset_price.updated_at:
+            self.record('tick_to_detection',
+                        checked_at - asset_price.updated_at, asset, server)
+
+    def get(self, stage: str, dimension: str = 'all', name: str = ''
+            ) -> Optional[LatencyHistogram]:
+        """Histogram of a stage over all ticks, or of an asset or a
+        server, None if nothing was recorded"""
+        return self.histograms.get((stage, dimension, name), None)
+
+    def get_report(self, dimension: str = 'all') -> List[str]:
+        """Report lines of every stage and name of a dimension"""
+        return [
+            f"{stage}{f' {name}' if name else ''}:"
+            f" {histogram.format(self.percentiles)}"
+            for (stage, dimension_, name), histogram
+            in sorted(self.histograms.items(),
+                      key=lambda item: (STAGES.index(item[0][0]),
+                                        item[0][2]))
+            if dimension_ == dimension]
+
+    def log_report(self) -> None:
+        """Log latency of every stage over all ticks and per server, and
+        per asset on debug level"""
+        for line in self.get_report('all'):
+            logger.info(f"Latency {line}")
+        for line in self.get_report('server'):
+            logger.info(f"Latency per server, {line}")
+        if logger.isEnabledFor(logging.DEBUG):
+            for line in self.get_report('asset'):
+                logger.debug(f"Latency per asset, {line}")
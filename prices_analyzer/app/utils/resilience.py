@@ -0,0 +1,164 @@
+"""
+Resilience Module
+
+Building blocks keeping failing or slow generators from being hammered
+by retries, used by `PriceFetcher`:
+- `RetryBudget`: retries (and hedged requests) allowed as a share of
+  requests, so retries can't multiply the load on an overloaded
+  generator
+- `get_backoff_s`: exponential backoff with full jitter, so retries of
+  many pairs failing at once are spread over time
+- `CircuitBreaker`: once an upstream fails `failure_threshold` times in
+  a row, requests to it fail fast for `reset_timeout_s`, then a single
+  probe request decides whether it is back
+- `HedgeDelay`: delay after which a second request for the same data
+  is sent, a percentile of recent request durations
+"""
+import random
+import time
+from typing import Callable, Optional
+
+import httpx
+
+from .histogram import LatencyHistogram
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class CircuitOpenError(httpx.RequestError):
+    """A request refused without being sent, as the circuit of its
+    upstream is open. Handled as any other request error."""
+
+
+class RetryBudget:
+    """
+    Token bucket of retries: each request deposits `ratio` of a token,
+    each retry takes a whole one. Holds at most `max_tokens`, starting
+    full, so short bursts of failures are retried, and sustained ones
+    at most `ratio` of requests.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0
+                 ) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        """Count a request"""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a token for a retry, False if none is left"""
+        # deposits of e.g. 0.1 add up to slightly less than a token
+        if self.tokens < 1 - 1e-9:
+            return False
+        self.tokens = max(0.0, self.tokens - 1)
+        return True
+
+
+def get_backoff_s(attempt: int, base_s: float, max_s: float,
+                  uniform: Callable[[float, float], float] = random.uniform
+                  ) -> float:
+    """Random delay before retry `attempt` (1 for the first one), up to
+    `base_s` doubled with each attempt and at most `max_s`"""
+    return uniform(0.0, min(max_s, base_s * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Per upstream circuit breaker.
+
+    `closed`: requests go through, consecutive failures are counted.
+    `open`: after `failure_threshold` of them requests are refused for
+    `reset_timeout_s`. `half_open`: then one probe request at a time
+    goes through, closing the circuit if it succeeds and opening it
+    again if it fails. 0 `failure_threshold` never opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout_s: float = 5.0, name: str = '') -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._probing = False
+
+    def allow_request(self, now: Optional[float] = None) -> bool:
+        """Whether a request may be sent; in `half_open` state the
+        allowed one is the probe"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout_s:
+                return False
+            self.state, self._probing = self.HALF_OPEN, False
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """Let another probe through, e.g. once an allowed request was
+        cancelled without an outcome"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        """Close the circuit"""
+        self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        """Count a failure, opening the circuit once there are
+        `failure_threshold` in a row or the probe failed"""
+        if self.failure_threshold <= 0:
+            return
+        self.failures += 1
+        # failures of requests sent before it opened don't extend it
+        if self.state == self.OPEN:
+            return
+        if (self.state == self.HALF_OPEN
+                or self.failures >= self.failure_threshold):
+            self.state, self._probing = self.OPEN, False
+            self.opened_at = time.monotonic() if now is None else now
+            self.opened_count += 1
+            logger.warning(f"Circuit of {self.name} opened after"
+                           f" {self.failures} failures in a row")
+
+
+class HedgeDelay:
+    """
+    `percentile` of durations of recent requests. Durations are kept in
+    windows of `window_size` requests, the last full window is used
+    until the current one has `min_samples`. None before that.
+    """
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20,
+                 window_size: int = 1000) -> None:
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.histogram = LatencyHistogram()
+        self._previous: Optional[LatencyHistogram] = None
+
+    def record(self, duration_s: float) -> None:
+        """Count a request duration"""
+        self.histogram.record(duration_s)
+        if self.histogram.count >= self.window_size:
+            self._previous, self.histogram = (self.histogram,
+                                              LatencyHistogram())
+
+    def get(self) -> Optional[float]:
+        """Current delay, None while there are too few samples"""
+        histogram = (self.histogram
+                     if self.histogram.count >= self.min_samples
+                     else self._previous)
+        if histogram is None:
+            return None
+        return histogram.get_percentiles([self.percentile])[0]
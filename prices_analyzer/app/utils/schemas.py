@@ -1,5 +1,5 @@
 """Pydantic data validation schemas"""
-from typing import List
+from typing import List, NamedTuple, Optional
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -45,6 +45,11 @@ class PriceBaseAPI(BaseModel):
     """
     price: float = Field(gt=0)
     spread: float = Field(gt=0)
+    # changes only when the generator updates the price; None if the
+    # generator does not provide it
+    version: Optional[int] = None
+    # Unix time of the generator update; None if not provided
+    updated_at: Optional[float] = None
 
 
 class AssetPrice(Asset, PriceBase):
@@ -52,7 +57,21 @@ class AssetPrice(Asset, PriceBase):
 
 
 class AssetPriceFromApi(Asset, PriceBaseAPI):
-    pass
+    """Asset price received from the generator. Trace fields are set by
+    the fetcher: replica that served the price (`X-Server-Id` header),
+    Unix time of the request start (polling only) and of the response
+    """
+    server_id: Optional[str] = None
+    requested_at: Optional[float] = None
+    received_at: Optional[float] = None
+
+
+class Catalog(BaseModel):
+    """Assets and markets the generator provides prices for, with a
+    version changing only when they do"""
+    assets: List[str]
+    markets: List[str]
+    version: str
 
 
 class PriceConfig(BaseModel):
@@ -80,3 +99,27 @@ class ArbitrageDetectorResponse(BaseModel):
     """Arbitrage detector response data model"""
     arbitrage_found: bool = False
     details: list[dict[str, str]] = []
+
+
+class ArbitrageEvent(NamedTuple):
+    """Compact record of a detected arbitrage opportunity: buy `asset` on
+    `market_buy`, sell on `market_sell`. `detected_at` is a Unix
+    timestamp. `status` is `open` for a new opportunity, `update` for a
+    material margin change of an open one and `close` once it is gone."""
+    asset: str
+    market_buy: str
+    market_sell: str
+    price_buy: float
+    price_sell: float
+    margin: float
+    detected_at: float
+    status: str = 'open'
+
+    def get_message(self) -> str:
+        """Human readable detection message"""
+        return ("Arbitrage possibility "
+                f"{'closed' if self.status == 'close' else 'detected'}:"
+                f" Buy {self.asset} from {self.market_buy}"
+                f" for {self.price_buy},"
+                f" sell at {self.market_sell} for {self.price_sell},"
+                f" margin: {self.margin}")
@@ -0,0 +1,203 @@
+"""
+Upstreams Module
+
+Client-side load balancing of requests across generator replicas, the
+way Nginx does it in front of them (see `nginx/nginx.conf`), without
+the extra proxy hop:
+- upstreams are split into groups, requests are routed to a group by
+  market, markets without a route go to the first (default) group
+- within a group the upstream with the fewest outstanding requests per
+  weight is selected, ties are broken by smooth weighted round robin
+  (as Nginx `least_conn`), so idle upstreams get requests in
+  proportion to their weights
+- passive health checks: an upstream failing `max_fails` times within
+  `fail_timeout_s` is ejected for `fail_timeout_s`. It then gets
+  requests again, and a single failure ejects it again until a request
+  succeeds. If every upstream of a group is ejected, the one recovering
+  first is tried anyway
+
+Groups and routes are described in Nginx-like notation, e.g.
+`general: gen_1_1:8000 weight=1, gen_1_2:8000 weight=3;
+dedicated: gen_2_1:8000` and `UK: dedicated, US: dedicated`.
+"""
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class Upstream:
+    """
+    A generator endpoint and its load and health state.
+
+    `outstanding` are requests in flight, maintained by the caller;
+    `requests_count`, `fails_count` and `ejections_count` are totals.
+    """
+    # pylint: disable=R0902
+
+    def __init__(self, base_url: str, weight: int = 1, max_fails: int = 3,
+                 fail_timeout_s: float = 30.0) -> None:
+        if weight < 1:
+            raise ValueError(f"Weight must be positive: {weight}")
+        self.base_url = base_url.rstrip('/')
+        self.weight = weight
+        self.max_fails = max_fails
+        self.fail_timeout_s = fail_timeout_s
+        self.outstanding = 0
+        self.requests_count = 0
+        self.fails_count = 0
+        self.ejections_count = 0
+        self.ejected_until = 0.0
+        # failures since `_failed_since`, counted towards `max_fails`
+        self._fails = 0
+        self._failed_since = 0.0
+        # smooth weighted round robin state
+        self.current_weight = 0
+
+    def __repr__(self) -> str:
+        return f"Upstream({self.base_url!r}, weight={self.weight})"
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """Whether the upstream is not ejected"""
+        now = time.monotonic() if now is None else now
+        return now >= self.ejected_until
+
+    def record_success(self) -> None:
+        """Forget failures, including the ones that ejected it"""
+        self._fails = 0
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        """Count a failed request, ejecting the upstream once it failed
+        `max_fails` times within `fail_timeout_s`. 0 `max_fails` never
+        ejects it."""
+        now = time.monotonic() if now is None else now
+        self.fails_count += 1
+        if not self.max_fails:
+            return
+        if (self._fails < self.max_fails
+                and now - self._failed_since > self.fail_timeout_s):
+            self._fails, self._failed_since = 0, now
+        self._fails += 1
+        if self._fails >= self.max_fails:
+            self.ejected_until = now + self.fail_timeout_s
+            self.ejections_count += 1
+            logger.warning(f"Upstream {self.base_url} ejected for"
+                           f" {self.fail_timeout_s} s after {self._fails}"
+                           " failures")
+
+
+class UpstreamGroup:
+    """Upstreams serving the same markets"""
+
+    def __init__(self, name: str, upstreams: Sequence[Upstream]) -> None:
+        if not upstreams:
+            raise ValueError(f"Upstream group {name} has no upstreams")
+        self.name = name
+        self.upstreams = list(upstreams)
+
+    def select(self, exclude: Iterable[Upstream] = (),
+               now: Optional[float] = None) -> Optional[Upstream]:
+        """Upstream for the next request, among the ones not in
+        `exclude`, e.g. already tried; None if none is left"""
+        excluded = set(exclude)
+        candidates = [upstream for upstream in self.upstreams
+                      if upstream not in excluded]
+        if not candidates:
+            return None
+        now = time.monotonic() if now is None else now
+        available = [upstream for upstream in candidates
+                     if upstream.is_available(now)]
+        if not available:
+            return min(candidates,
+                       key=lambda upstream: upstream.ejected_until)
+
+        least_load = min(upstream.outstanding / upstream.weight
+                         for upstream in available)
+        tied = [upstream for upstream in available
+                if upstream.outstanding / upstream.weight == least_load]
+        if len(tied) == 1:
+            return tied[0]
+        for upstream in tied:
+            upstream.current_weight += upstream.weight
+        selected = max(tied, key=lambda upstream: upstream.current_weight)
+        selected.current_weight -= sum(upstream.weight for upstream in tied)
+        return selected
+
+
+class UpstreamRouter:
+    """Routes requests to upstream groups by market"""
+
+    def __init__(self, groups: Sequence[UpstreamGroup],
+                 routes: Optional[Dict[str, str]] = None) -> None:
+        if not groups:
+            raise ValueError("No upstream groups provided")
+        self.groups = {group.name: group for group in groups}
+        self.default_group = groups[0]
+        self.routes: Dict[str, UpstreamGroup] = {}
+        for market, group_name in (routes or {}).items():
+            if group_name not in self.groups:
+                raise ValueError(f"Market {market} is routed to unknown"
+                                 f" upstream group {group_name}")
+            self.routes[market] = self.groups[group_name]
+
+    @property
+    def upstreams(self) -> List[Upstream]:
+        """Upstreams of all groups"""
+        return [upstream for group in self.groups.values()
+                for upstream in group.upstreams]
+
+    def get_group(self, market: Optional[str] = None) -> UpstreamGroup:
+        """Group serving a market, the default one if the market has no
+        route or is not known"""
+        if market is None:
+            return self.default_group
+        return self.routes.get(market, self.default_group)
+
+
+def parse_upstream_groups(spec: str, protocol: str = 'http',
+                          max_fails: int = 3, fail_timeout_s: float = 30.0
+                          ) -> List[UpstreamGroup]:
+    """Parse `name: address [weight=N] [max_fails=N] [fail_timeout=Ns],
+    ...; name: ...` into upstream groups. Addresses without a scheme get
+    `protocol`."""
+    groups = []
+    for group_spec in filter(None, map(str.strip, spec.split(';'))):
+        name, separator, servers_spec = group_spec.partition(':')
+        if not separator:
+            raise ValueError(f"Upstream group has no name: {group_spec}")
+        upstreams = []
+        for server_spec in filter(None,
+                                  map(str.strip, servers_spec.split(','))):
+            address, *options = server_spec.split()
+            if '://' not in address:
+                address = f"{protocol}://{address}"
+            weight, server_max_fails, server_fail_timeout_s = (
+                1, max_fails, fail_timeout_s)
+            for option in options:
+                key, _, value = option.partition('=')
+                if key == 'weight':
+                    weight = int(value)
+                elif key == 'max_fails':
+                    server_max_fails = int(value)
+                elif key == 'fail_timeout':
+                    server_fail_timeout_s = float(value.rstrip('s'))
+                else:
+                    raise ValueError(f"Unknown upstream option: {option}")
+            upstreams.append(Upstream(address, weight, server_max_fails,
+                                      server_fail_timeout_s))
+        groups.append(UpstreamGroup(name.strip(), upstreams))
+    return groups
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """Parse `market: group, ...` into market -> group name"""
+    routes = {}
+    for route_spec in filter(None, map(str.strip, spec.split(','))):
+        market, separator, group_name = route_spec.partition(':')
+        if not separator:
+            raise ValueError(f"Route has no upstream group: {route_spec}")
+        routes[market.strip()] = group_name.strip()
+    return routes
@@ -0,0 +1,91 @@
+"""Benchmark of vectorized batch arbitrage detection
+
+Feeds random ticks of 10k asset and market pairs (1000 assets on 10
+markets by default) to `BatchArbitrageDetector` in batches given as
+arrays, and to `ArbitrageDetector` one tick at a time for reference.
+Arbitrage messages are formatted in both cases but not logged.
+
+Usage (from `prices_analyzer` folder):
+    python -m benchmarks.bench_batch_detector [assets] [markets] [ticks]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+import numpy as np
+
+from app.core.batch_detector import BatchArbitrageDetector
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+
+
+BATCH_SIZES = [1_000, 10_000, 100_000]
+
+
+def run_batches(detector: BatchArbitrageDetector, n_ticks: int,
+                batch_size: int, rng: np.random.Generator) -> float:
+    """Feed `n_ticks` in batches of `batch_size`. Returns ticks per
+    second"""
+    n_assets = len(detector.assets_list)
+    n_markets = len(detector.markets_list)
+    batches = [(rng.integers(0, n_assets, batch_size),
+                rng.integers(0, n_markets, batch_size),
+                rng.uniform(990, 1010, batch_size),
+                rng.uniform(0.1, 1, batch_size))
+               for _ in range(n_ticks // batch_size)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        detector.add_ticks_arrays(*batch)
+        detector.detect()
+    return len(batches) * batch_size / (time.perf_counter() - started)
+
+
+async def run_per_tick(n_assets: int, n_markets: int, n_ticks: int,
+                       rng: np.random.Generator) -> float:
+    """Feed ticks one by one to `ArbitrageDetector`. Returns ticks per
+    second"""
+    detector = ArbitrageDetector()
+    detector.assets_list = [f"Asset{idx}" for idx in range(n_assets)]
+    detector.markets_list = [f"Market{idx}" for idx in range(n_markets)]
+    detector._initialize_prices()  # pylint: disable=W0212
+    ticks = [schemas.AssetPriceFromApi(
+                name=f"Asset{asset}", market=f"Market{market}",
+                price=price, spread=spread)
+             for asset, market, price, spread in zip(
+                 rng.integers(0, n_assets, n_ticks).tolist(),
+                 rng.integers(0, n_markets, n_ticks).tolist(),
+                 rng.uniform(990, 1010, n_ticks).tolist(),
+                 rng.uniform(0.1, 1, n_ticks).tolist())]
+
+    started = time.perf_counter()
+    for tick in ticks:
+        await detector.check_for_arbitrage(tick)
+        await detector.price_update(tick)
+    return n_ticks / (time.perf_counter() - started)
+
+
+def main(n_assets: int, n_markets: int, n_ticks: int) -> None:
+    """Runs vectorized detection with several batch sizes"""
+    for name in ('app.core.detector', 'app.core.batch_detector'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    rng = np.random.default_rng(42)
+
+    print(f"{n_assets * n_markets} pairs, {n_ticks} ticks")
+    print(f"{'detector':<28}{'ticks/s':>12}")
+    rate = asyncio.run(run_per_tick(n_assets, n_markets, n_ticks // 10,
+                                    rng))
+    print(f"{'per tick':<28}{rate:>12.0f}")
+    for batch_size in BATCH_SIZES:
+        detector = BatchArbitrageDetector(
+            [f"Asset{idx}" for idx in range(n_assets)],
+            [f"Market{idx}" for idx in range(n_markets)])
+        rate = run_batches(detector, n_ticks, batch_size, rng)
+        print(f"{f'vectorized, batch {batch_size}':<28}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main(n_assets=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         n_markets=int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+         n_ticks=int(sys.argv[3]) if len(sys.argv) > 3 else 2_000_000)
@@ -0,0 +1,105 @@
+"""Benchmark of `ArbitrageDetector` under a synthetic load
+
+Feeds random ticks of 10k asset and market pairs (1000 assets on 10
+markets by default) from concurrent producers, the way `app.main` does:
+each tick is checked for arbitrage, then stored by a separate task.
+Compares a single lock shared by all assets, with and without a timeout
+task per update as before, with per asset locks, and reports throughput
+and lock wait.
+
+Critical sections don't await anything, so on a single event loop locks
+are expected to be uncontended in either scheme.
+
+Usage (from `prices_analyzer` folder):
+    python -m benchmarks.bench_detector [assets] [markets] [ticks]
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+from typing import List
+
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+
+
+class GlobalLockDetector(ArbitrageDetector):
+    """Detector with all assets sharing one lock, as it was before per
+    asset locks"""
+
+    def _initialize_prices(self) -> None:
+        super()._initialize_prices()
+        lock = asyncio.Lock()
+        self.locks = dict.fromkeys(self.locks, lock)
+
+
+class PreviousDetector(GlobalLockDetector):
+    """Global lock detector always wrapping price update into a timeout,
+    i.e. into a separate task"""
+
+    async def price_update(self, asset_data: schemas.AssetPriceFromApi
+                           ) -> None:
+        await asyncio.wait_for(self._price_update_internal(asset_data),
+                               timeout=2.0)
+
+
+def make_ticks(assets: List[str], markets: List[str], n_ticks: int
+               ) -> List[schemas.AssetPriceFromApi]:
+    """Random ticks around the same price, so opportunities happen"""
+    rng = random.Random(42)
+    return [schemas.AssetPriceFromApi(
+                name=rng.choice(assets), market=rng.choice(markets),
+                price=rng.uniform(990, 1010), spread=rng.uniform(0.1, 1))
+            for _ in range(n_ticks)]
+
+
+async def run_load(detector: ArbitrageDetector,
+                   ticks: List[schemas.AssetPriceFromApi],
+                   concurrency: int) -> float:
+    """Feed ticks from `concurrency` producers. Returns ticks per second"""
+    async def producer(producer_idx: int) -> None:
+        updates = []
+        for tick in ticks[producer_idx::concurrency]:
+            await detector.check_for_arbitrage(tick)
+            updates.append(asyncio.create_task(detector.price_update(tick)))
+            # let other producers run, as a network request would
+            await asyncio.sleep(0)
+        await asyncio.gather(*updates)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(producer(idx) for idx in range(concurrency)))
+    return len(ticks) / (time.perf_counter() - started)
+
+
+async def main(n_assets: int, n_markets: int, n_ticks: int) -> None:
+    """Runs the same ticks against both locking schemes"""
+    # arbitrage messages would dominate the measurement
+    logging.getLogger('app.core.detector').setLevel(logging.WARNING)
+    assets = [f"Asset{idx}" for idx in range(n_assets)]
+    markets = [f"Market{idx}" for idx in range(n_markets)]
+    ticks = make_ticks(assets, markets, n_ticks)
+
+    print(f"{n_assets * n_markets} pairs, {n_ticks} ticks,"
+          f" {n_assets * n_markets // 10} producers")
+    print(f"{'locking':<12}{'ticks/s':>10}{'contended':>11}"
+          f"{'mean wait, us':>15}{'max wait, ms':>14}")
+    for name, detector_class in [("previous", PreviousDetector),
+                                 ("global", GlobalLockDetector),
+                                 ("per asset", ArbitrageDetector)]:
+        detector = detector_class()
+        detector.assets_list, detector.markets_list = assets, markets
+        detector._initialize_prices()  # pylint: disable=W0212
+        rate = await run_load(detector, ticks, n_assets * n_markets // 10)
+        lock_wait = detector.lock_wait
+        print(f"{name:<12}{rate:>10.0f}"
+              f"{lock_wait.contended_count / lock_wait.count:>11.2%}"
+              f"{lock_wait.mean_s * 1e6:>15.2f}"
+              f"{lock_wait.max_s * 1e3:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        n_assets=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        n_markets=int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        n_ticks=int(sys.argv[3]) if len(sys.argv) > 3 else 200_000))
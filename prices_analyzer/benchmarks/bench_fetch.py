@@ -0,0 +1,109 @@
+"""Benchmark of `PriceFetcher` throughput
+
+Compares a new HTTP client per request, as `PriceFetcher` did before,
+with the long-lived shared client. By default requests go over TCP to a
+local stub server returning a fixed price quote, so numbers reflect
+client side connection handling only; pass `source` to query the
+generator configured in .env (`PRICES_SOURCE_*`) instead.
+
+Usage (from `prices_analyzer` folder):
+    python -m benchmarks.bench_fetch [requests] [concurrency] [source]
+"""
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+import httpx
+import uvicorn
+
+from app.utils import schemas
+from app.utils.fetch_requests import PriceFetcher
+
+
+QUOTE = json.dumps({
+    "name": "Oil", "market": "UK", "price": 1000.0, "spread": 1.0,
+    "price_quote_id": "00000000-0000-0000-0000-000000000000"}).encode()
+
+
+async def stub_app(scope, receive, send) -> None:
+    """Minimal ASGI app answering every request with the same quote"""
+    if scope['type'] != 'http':
+        return
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': QUOTE})
+
+
+def start_stub_server() -> int:
+    """Start stub server in a background thread. Returns its port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(
+        stub_app, host="127.0.0.1", port=port, log_level="warning",
+        backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+async def fetch_price_per_request(
+        price_fetcher: PriceFetcher, asset: str, market: str
+        ) -> Optional[schemas.AssetPriceFromApi]:
+    """Replicates `PriceFetcher.fetch_price` as it was before the shared
+    client: a new client, and so a new connection, for each request."""
+    async with (httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+                as client):
+        response = await client.get(price_fetcher.get_api(asset, market))
+        response.raise_for_status()
+        return schemas.AssetPriceFromApi(**response.json())
+
+
+async def run_load(
+        fetch: Callable[[str, str], Awaitable[object]],
+        n_requests: int, concurrency: int
+        ) -> float:
+    """Send `n_requests` spread over `concurrency` concurrent workers.
+    Returns requests per second."""
+    async def worker(worker_idx: int) -> None:
+        for _ in range(worker_idx, n_requests, concurrency):
+            assert await fetch("Oil", "UK") is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(idx) for idx in range(concurrency)))
+    return n_requests / (time.perf_counter() - started)
+
+
+async def main(n_requests: int, concurrency: int, use_source: bool) -> None:
+    """Runs the same load with a client per request and a shared one"""
+    if use_source:
+        price_fetcher = PriceFetcher()
+    else:
+        price_fetcher = PriceFetcher(host="127.0.0.1",
+                                     port=str(start_stub_server()))
+
+    async def fetch_per_request(asset: str, market: str):
+        return await fetch_price_per_request(price_fetcher, asset, market)
+
+    print(f"{n_requests} requests, concurrency {concurrency},"
+          f" {price_fetcher.get_api('Oil', 'UK')}")
+    print(f"{'client':<22}{'req/s':>10}")
+    async with price_fetcher:
+        for name, fetch in [("client per request", fetch_per_request),
+                            ("shared client", price_fetcher.fetch_price)]:
+            await run_load(fetch, n_requests // 10, concurrency)
+            rps = await run_load(fetch, n_requests, concurrency)
+            print(f"{name:<22}{rps:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        n_requests=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        concurrency=int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        use_source=len(sys.argv) > 3 and sys.argv[3] == 'source'))
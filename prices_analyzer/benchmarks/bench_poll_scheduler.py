@@ -0,0 +1,126 @@
+"""Benchmark of adaptive polling against fixed interval polling
+
+Simulates (in virtual time, without network) pairs whose prices change
+every 1-3 s, as the generator updates them, and polls them either every
+`interval` seconds, as `pair` fetch mode does, or as the adaptive poll
+scheduler decides. Reports requests per second, share of price changes
+seen and mean age of a change once it is seen.
+
+Usage (from `prices_analyzer` folder):
+    python -m benchmarks.bench_poll_scheduler [pairs] [interval] [seconds]
+"""
+import random
+import sys
+from typing import Dict, List, Tuple
+
+from app.core.poll_scheduler import AdaptivePollScheduler
+from app.utils import schemas
+
+
+STEP_S = 0.01
+
+
+class SimulatedPrices:
+    """Prices of pairs changing every 1-3 s"""
+
+    def __init__(self, pairs: List[Tuple[str, str]]) -> None:
+        self.versions = dict.fromkeys(pairs, 0)
+        self.changed_at = dict.fromkeys(pairs, 0.0)
+        self.next_change_at = {pair: random.uniform(1, 3) for pair in pairs}
+        self.changes_count = 0
+
+    def advance(self, now: float) -> None:
+        """Apply changes due by the moment"""
+        for pair, change_at in self.next_change_at.items():
+            if change_at <= now:
+                self.versions[pair] += 1
+                self.changed_at[pair] = change_at
+                self.next_change_at[pair] = change_at + random.uniform(1, 3)
+                self.changes_count += 1
+
+
+class PollStats:
+    """Changes seen by polls and their age"""
+
+    def __init__(self, pairs: List[Tuple[str, str]]) -> None:
+        self.seen_versions: Dict[Tuple[str, str], int] = dict.fromkeys(
+            pairs, 0)
+        self.requests = 0
+        self.seen = 0
+        self.age_s = 0.0
+        self.changes_count = 0
+
+    def poll(self, prices: SimulatedPrices, pair: Tuple[str, str],
+             now: float) -> int:
+        """Poll a pair, returning its price version"""
+        self.requests += 1
+        version = prices.versions[pair]
+        if version != self.seen_versions[pair]:
+            self.seen += 1
+            self.age_s += now - prices.changed_at[pair]
+            self.seen_versions[pair] = version
+        return version
+
+
+def run_fixed(pairs: List[Tuple[str, str]], interval_s: float,
+              duration_s: float) -> PollStats:
+    """Poll every pair every `interval_s`"""
+    prices = SimulatedPrices(pairs)
+    stats = PollStats(pairs)
+    next_poll_at = {pair: random.uniform(0, interval_s) for pair in pairs}
+    now = 0.0
+    while now < duration_s:
+        prices.advance(now)
+        for pair, poll_at in next_poll_at.items():
+            if poll_at <= now:
+                stats.poll(prices, pair, now)
+                next_poll_at[pair] = poll_at + interval_s
+        now += STEP_S
+    stats.changes_count = prices.changes_count
+    return stats
+
+
+def run_adaptive(pairs: List[Tuple[str, str]], interval_s: float,
+                 duration_s: float) -> PollStats:
+    """Poll pairs as the adaptive scheduler decides, within half of the
+    fixed polling rate"""
+    prices = SimulatedPrices(pairs)
+    stats = PollStats(pairs)
+    scheduler = AdaptivePollScheduler(
+        pairs, rate_limit=len(pairs) / interval_s / 2,
+        initial_interval_s=interval_s, now=0)
+    now = 0.0
+    while now < duration_s:
+        prices.advance(now)
+        while True:
+            pair, _ = scheduler.get_due(now)
+            if pair is None:
+                break
+            version = stats.poll(prices, pair, now)
+            scheduler.observe(pair, schemas.AssetPriceFromApi(
+                name=pair[0], market=pair[1], price=1 + version, spread=1),
+                now=now)
+        now += STEP_S
+    stats.changes_count = prices.changes_count
+    return stats
+
+
+def main(n_pairs: int, interval_s: float, duration_s: float) -> None:
+    """Compare fixed and adaptive polling of the same load"""
+    random.seed(42)
+    pairs = [(f"Asset{idx}", "US") for idx in range(n_pairs)]
+    print(f"{n_pairs} pairs, {duration_s} s")
+    print(f"{'polling':<18}{'req/s':>10}{'changes seen':>14}"
+          f"{'mean age, s':>13}")
+    for name, run in ((f"fixed {interval_s} s", run_fixed),
+                      ("adaptive", run_adaptive)):
+        stats = run(pairs, interval_s, duration_s)
+        print(f"{name:<18}{stats.requests / duration_s:>10.1f}"
+              f"{stats.seen / stats.changes_count:>14.1%}"
+              f"{stats.age_s / max(stats.seen, 1):>13.3f}")
+
+
+if __name__ == "__main__":
+    main(n_pairs=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         interval_s=float(sys.argv[2]) if len(sys.argv) > 2 else 0.5,
+         duration_s=float(sys.argv[3]) if len(sys.argv) > 3 else 60)
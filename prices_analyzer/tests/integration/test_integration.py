@@ -56,6 +56,8 @@ def check_method_called_with_args(
 
 
 mock_price_fetcher = AsyncMock(spec=PriceFetcher)
+# no catalog: the detector keeps its configured assets and markets
+mock_price_fetcher.fetch_catalog.return_value = None
 mock_arbitrage_detector = AsyncMock(spec=ArbitrageDetector)
 
 
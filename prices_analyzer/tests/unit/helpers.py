@@ -0,0 +1,62 @@
+"""Factories and stand-ins shared by unit tests suites"""
+import asyncio
+from typing import Callable, Coroutine, Optional
+
+import httpx
+
+from app.utils import schemas
+from app.utils.fetch_requests import PriceFetcher
+
+
+def make_price(market: str, price: float, name: str = "Oil",
+               spread: float = 1, **trace) -> schemas.AssetPriceFromApi:
+    """Asset price, Oil with 1% spread by default, with provided trace
+    fields"""
+    return schemas.AssetPriceFromApi(name=name, market=market, price=price,
+                                     spread=spread, **trace)
+
+
+def make_quote(asset: str, market: str) -> dict:
+    """Price quote as returned by the generator"""
+    return {"name": asset, "market": market, "price": 100.0, "spread": 1.0,
+            "price_quote_id": "00000000-0000-0000-0000-000000000000"}
+
+
+def get_price_fetcher(
+        handler: Callable[[httpx.Request],
+                          Coroutine[None, None, httpx.Response]],
+        **kwargs) -> PriceFetcher:
+    """Get price fetcher sending requests to a mocked generator, with
+    short backoffs"""
+    price_fetcher = PriceFetcher(host="generator", port="8000", **kwargs)
+    price_fetcher.client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler))
+    price_fetcher.retry_backoff_s = 0.001
+    return price_fetcher
+
+
+class FakeFetcher:
+    """Price fetcher returning a given catalog, and a higher price on
+    every request while tracking concurrent requests"""
+
+    def __init__(self, catalog: Optional[schemas.Catalog] = None,
+                 delay_s: float = 0) -> None:
+        self.catalog = catalog
+        self.delay_s = delay_s
+        self.price = 100.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch_catalog(self) -> Optional[schemas.Catalog]:
+        """Return the catalog"""
+        return self.catalog
+
+    async def fetch_price(self, asset: str, market: str
+                          ) -> schemas.AssetPriceFromApi:
+        """Return next price of a pair"""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay_s)
+        self.in_flight -= 1
+        self.price += 1
+        return make_price(market, self.price, name=asset)
@@ -0,0 +1,85 @@
+"""Batch arbitrage detector tests suite"""
+import numpy as np
+import pytest
+
+from app.core.batch_detector import BatchArbitrageDetector
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+from app.utils.event_sink import ArbitrageEventSink
+
+from helpers import make_price
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_messages_match_per_tick_detector():
+    """Opportunity of a batch is expected to be reported with the same
+    message as the per tick detector reports it"""
+    ticks = [make_price("US", 1000), make_price("UK", 970)]
+
+    detector = ArbitrageDetector()
+    await detector.price_update(ticks[0])
+    response = await detector.check_for_arbitrage(ticks[1])
+
+    batch_detector = BatchArbitrageDetector(["Copper", "Oil"], ["US", "UK"])
+    batch_detector.add_ticks(ticks)
+    responses = batch_detector.detect()
+
+    assert list(responses) == ["Oil"]
+    assert responses["Oil"] == response
+    # nothing new since the previous batch
+    assert batch_detector.detect() == {}
+
+
+def test_matches_full_scan():
+    """Each reported asset is expected to have its best buying and
+    selling prices on different markets, with the expected margin"""
+    rng = np.random.default_rng(42)
+    batch_detector = BatchArbitrageDetector(
+        [f"Asset{idx}" for idx in range(50)],
+        [f"Market{idx}" for idx in range(5)])
+    asset_ids = rng.integers(0, 50, 300)
+    batch_detector.add_ticks_arrays(
+        asset_ids, rng.integers(0, 5, 300),
+        rng.uniform(990, 1010, 300), rng.uniform(0.1, 1, 300))
+
+    responses = batch_detector.detect()
+
+    for asset_id in np.unique(asset_ids).tolist():
+        asset = f"Asset{asset_id}"
+        margin = (batch_detector.prices_sell[asset_id].max()
+                  - batch_detector.prices_buy[asset_id].min())
+        assert (asset in responses) == (margin > 0)
+        if margin > 0:
+            assert responses[asset].details[0]["message"].endswith(
+                f"margin: {round(float(margin), 4)}")
+
+
+def test_unknown_pairs_are_ignored():
+    """Prices of untracked assets or markets are expected to be skipped"""
+    batch_detector = BatchArbitrageDetector(["Oil"], ["US", "UK"])
+    batch_detector.add_ticks([make_price("Asia", 900),
+                              make_price("US", 900, name="Gold"),
+                              make_price("US", 1000)])
+    assert batch_detector.detect() == {}
+    assert np.isinf(batch_detector.prices_buy[0, 1])
+
+
+def test_ongoing_opportunity_is_reported_on_changes():
+    """Seen versions are expected to be skipped, and an opportunity to be
+    put into the sink once it opens and once it closes"""
+    sink = ArbitrageEventSink([])
+    batch_detector = BatchArbitrageDetector(["Oil"], ["US", "UK"],
+                                            event_sink=sink,
+                                            alert_margin_change=0.1)
+    us_price = schemas.AssetPriceFromApi(name="Oil", market="US",
+                                         price=1000, spread=1, version=1)
+    batch_detector.add_ticks([us_price, make_price("UK", 970)])
+    assert "Oil" in batch_detector.detect()
+    batch_detector.add_ticks([us_price, make_price("UK", 970)])
+    assert "Oil" in batch_detector.detect()
+    assert batch_detector.skipped_count == 1
+    batch_detector.add_tick(make_price("UK", 990))
+    assert batch_detector.detect() == {}
+
+    assert [(event.status, event.market_buy) for event in sink._events] == [
+        ("open", "UK"), ("close", "UK")]
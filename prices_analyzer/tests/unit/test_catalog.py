@@ -0,0 +1,67 @@
+"""Catalog tracker tests suite"""
+import numpy as np
+import pytest
+
+from app.core.batch_detector import BatchArbitrageDetector
+from app.core.catalog import CatalogTracker
+from app.core.detector import ArbitrageDetector
+from app.core.poll_scheduler import PollScheduler
+from app.utils import schemas
+
+from helpers import FakeFetcher, make_price
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_pairs_follow_catalog():
+    """Pairs are expected to be added and removed as the catalog changes,
+    keeping prices and schedule of pairs still tracked"""
+    detector = ArbitrageDetector()
+    fetcher = FakeFetcher(schemas.Catalog(assets=["Oil", "Gold"],
+                                          markets=["US", "UK"], version="1"))
+    catalog = CatalogTracker(fetcher, detector)
+    pairs = catalog.pairs
+    catalog.scheduler = PollScheduler(list(pairs), now=0)
+
+    assert await catalog.refresh()
+    assert pairs == [("Oil", "US"), ("Oil", "UK"),
+                     ("Gold", "US"), ("Gold", "UK")]
+    assert set(catalog.scheduler.states) == set(pairs)
+    await detector.price_update(make_price("US", 1000))
+    await detector.price_update(make_price("UK", 1000))
+    # same version is not applied again
+    assert not await catalog.refresh()
+
+    fetcher.catalog = schemas.Catalog(assets=["Oil", "Corn"],
+                                      markets=["US"], version="2")
+    assert await catalog.refresh()
+    assert pairs == [("Oil", "US"), ("Corn", "US")]
+    assert set(detector.order_books) == {"Oil", "Corn"}
+    assert dict(detector.order_books["Oil"].prices_buy) == {"US": 1010.0}
+    assert {pair for _, pair in catalog.scheduler.deadlines} == set(pairs)
+    assert detector.catalog_version == "2"
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_missing_catalog_keeps_detector_pairs():
+    """Pairs of the detector lists are expected to stay tracked if the
+    fetcher provides no catalog"""
+    detector = ArbitrageDetector()
+    catalog = CatalogTracker(FakeFetcher(None), detector,
+                             asset_filter=lambda asset: asset == "Oil")
+    assert not await catalog.refresh()
+    assert catalog.pairs == [("Copper", "US"), ("Copper", "UK"),
+                             ("Oil", "US"), ("Oil", "UK")]
+
+
+def test_batch_detector_keeps_tracked_prices():
+    """Rebuilt matrices are expected to keep prices of pairs still
+    tracked"""
+    batch_detector = BatchArbitrageDetector(["Copper", "Oil"], ["US", "UK"])
+    batch_detector.add_ticks([make_price("UK", 1000),
+                              make_price("US", 10, name="Copper")])
+    batch_detector.set_catalog(["Gold", "Oil"], ["Asia", "UK"])
+
+    np.testing.assert_array_equal(batch_detector.prices_buy,
+                                  [[np.inf, np.inf], [np.inf, 1010.0]])
+    batch_detector.add_tick(make_price("Asia", 970))
+    assert list(batch_detector.detect()) == ["Oil"]
@@ -0,0 +1,118 @@
+"""Arbitrage detector tests suite"""
+import asyncio
+
+import pytest
+
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+from app.utils.event_sink import ArbitrageEventSink
+
+from helpers import make_price
+
+
+async def feed(detector: ArbitrageDetector,
+               asset_price: schemas.AssetPriceFromApi
+               ) -> schemas.ArbitrageDetectorResponse:
+    """Check price for arbitrage and store it, as the analyzer does"""
+    response = await detector.check_for_arbitrage(asset_price)
+    await detector.price_update(asset_price)
+    return response
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_second_best_market_is_not_forgotten():
+    """Once the best market gets worse, the next best market is expected
+    to be used for detection"""
+    detector = ArbitrageDetector()
+    detector.markets_list = ["US", "UK", "Asia"]
+    await feed(detector, make_price("US", 1000))
+    await feed(detector, make_price("UK", 990))
+    await feed(detector, make_price("US", 900))
+
+    # UK (selling at 980.1) remains the best selling market
+    prices = detector.prices_dict["Oil"]
+    assert (prices.price_sell, prices.location_sell) == (980.1, "UK")
+    assert (prices.price_buy, prices.location_buy) == (909.0, "US")
+
+    response = await feed(detector, make_price("Asia", 960))
+    assert response.arbitrage_found
+    assert response.details == [
+        {"message": (
+            "Arbitrage possibility detected: Buy Oil from Asia for 969.6,"
+            " sell at UK for 980.1, margin: 10.5")},
+        {"message": (
+            "Arbitrage possibility detected: Buy Oil from US for 909.0,"
+            " sell at Asia for 950.4, margin: 41.4")}]
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_same_market_is_never_an_opportunity():
+    """A market is expected to be compared with other markets only"""
+    detector = ArbitrageDetector()
+    await feed(detector, make_price("US", 1000))
+    response = await feed(detector, make_price("US", 800))
+    assert not response.arbitrage_found
+
+    assert not (await detector.check_for_arbitrage(
+        schemas.AssetPriceFromApi(name="Gold", market="US", price=1,
+                                  spread=1))).arbitrage_found
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_unrelated_assets_do_not_wait():
+    """Update of an asset is expected to wait only for its own lock, and
+    the wait to be recorded"""
+    detector = ArbitrageDetector()
+    copper_price = schemas.AssetPriceFromApi(name="Copper", market="US",
+                                             price=10, spread=1)
+
+    async with detector.locks["Oil"]:
+        await asyncio.wait_for(detector.price_update(copper_price),
+                               timeout=0.1)
+        oil_update = asyncio.create_task(
+            detector.price_update(make_price("US", 1000)))
+        await asyncio.sleep(0.05)
+        assert not oil_update.done()
+
+    await oil_update
+    assert detector.prices_dict["Oil"].location_buy == "US"
+    assert detector.lock_wait.count == 2
+    assert detector.lock_wait.contended_count == 1
+    assert detector.lock_wait.max_s >= 0.05
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_seen_version_is_skipped():
+    """A price with the version already stored is expected to be skipped,
+    while prices without a version are always checked"""
+    detector = ArbitrageDetector()
+    await feed(detector, make_price("US", 1000))
+    uk_price = schemas.AssetPriceFromApi(name="Oil", market="UK", price=970,
+                                         spread=1, version=3)
+
+    assert (await feed(detector, uk_price)).arbitrage_found
+    assert not (await feed(detector, uk_price)).arbitrage_found
+    assert detector.skipped_count == 1
+    assert (await feed(detector, make_price("UK", 970))).arbitrage_found
+    assert detector.checks_count == 3
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_ongoing_opportunity_is_reported_on_changes(caplog):
+    """An opportunity is expected to be logged once it opens, closes or
+    its margin moves materially, while each check still reports it"""
+    sink = ArbitrageEventSink([])
+    detector = ArbitrageDetector(event_sink=sink, alert_margin_change=0.1)
+    await feed(detector, make_price("US", 1000))
+
+    # margins 10.3, 10.3, 10.8 and 20.4
+    for price in (970, 970, 969.5, 960):
+        assert (await feed(detector, make_price("UK", price))
+                ).arbitrage_found
+    assert not (await feed(detector, make_price("UK", 990))).arbitrage_found
+
+    assert [(event.status, event.margin) for event in sink._events] == [
+        ("open", 10.3), ("update", 20.4), ("close", -9.9)]
+    assert detector.tracker.suppressed_count == 2
+    assert detector.tracker.opportunities == {}
+    assert caplog.text.count("Arbitrage possibility closed") == 1
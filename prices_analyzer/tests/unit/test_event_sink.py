@@ -0,0 +1,135 @@
+"""Arbitrage event sink tests suite"""
+import asyncio
+import json
+import sqlite3
+from typing import List
+
+import pytest
+
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+from app.utils.event_sink import ArbitrageEventSink, create_event_sink
+
+
+class RecordingWriter:
+    """Writer keeping written batches"""
+
+    def __init__(self) -> None:
+        self.batches: List[List[schemas.ArbitrageEvent]] = []
+        self.closed = False
+
+    def write(self, events):
+        """Keep a batch"""
+        self.batches.append(list(events))
+
+    def close(self):
+        """Mark closed"""
+        self.closed = True
+
+
+def make_event(margin: float = 1.0) -> schemas.ArbitrageEvent:
+    """Arbitrage event of Oil"""
+    return schemas.ArbitrageEvent("Oil", "UK", "US", 100.0, 100.0 + margin,
+                                  margin, 1700000000.0)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_detector_puts_events():
+    """Detected opportunities are expected to be put into the sink as
+    records matching the logged messages"""
+    sink = ArbitrageEventSink([RecordingWriter()])
+    detector = ArbitrageDetector(event_sink=sink)
+    us_price = schemas.AssetPriceFromApi(name="Oil", market="US",
+                                         price=1000, spread=1)
+    uk_price = schemas.AssetPriceFromApi(name="Oil", market="UK",
+                                         price=970, spread=1)
+    await detector.price_update(us_price)
+    response = await detector.check_for_arbitrage(uk_price)
+
+    events = list(sink._events)
+    assert len(events) == 1
+    event = events[0]
+    assert (event.asset, event.market_buy, event.market_sell) == (
+        "Oil", "UK", "US")
+    assert (event.price_buy, event.price_sell, event.margin) == (
+        979.7, 990.0, 10.3)
+    assert response.details == [{"message": event.get_message()}]
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_events_are_written_in_batches():
+    """Events are expected to be written in batches of at most flush size,
+    the remaining ones once the sink context is left"""
+    writer = RecordingWriter()
+    sink = ArbitrageEventSink([writer], flush_size=2, flush_interval_s=10)
+    async with sink:
+        for _ in range(5):
+            sink.put(make_event())
+        await asyncio.sleep(0.1)
+        assert [len(batch) for batch in writer.batches] == [2, 2, 1]
+        sink.put(make_event())
+    assert [len(batch) for batch in writer.batches] == [2, 2, 1, 1]
+    assert writer.closed
+    assert sink.written_count == 6
+
+
+class FailingWriter(RecordingWriter):
+    """Writer failing on every batch"""
+
+    def write(self, events):
+        """Fail as a writer bug would"""
+        raise TypeError("Object of type Event is not JSON serializable")
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_failing_writer_does_not_stop_sink():
+    """Batches failed by a writer are expected to be counted as failed
+    only, and the sink to keep writing to the other writers"""
+    writer = RecordingWriter()
+    sink = ArbitrageEventSink([FailingWriter(), writer], flush_size=2,
+                              flush_interval_s=10)
+    async with sink:
+        for _ in range(2):
+            sink.put(make_event())
+        await asyncio.sleep(0.1)
+        sink.put(make_event())
+        await asyncio.sleep(0.1)
+        assert not sink._task.done()
+    assert [len(batch) for batch in writer.batches] == [2, 1]
+    assert (sink.written_count, sink.failed_count) == (3, 3)
+
+
+@pytest.mark.parametrize("policy, margins", [
+    ("drop_oldest", [2.0, 3.0]),
+    ("drop_new", [1.0, 2.0]),
+])
+def test_queue_full_policy(policy, margins):
+    """Full queue is expected to drop events as the policy says"""
+    sink = ArbitrageEventSink([RecordingWriter()], queue_size=2,
+                              queue_full_policy=policy)
+    for margin in (1.0, 2.0, 3.0):
+        sink.put(make_event(margin))
+    assert [event.margin for event in sink._events] == margins
+    assert sink.dropped_count == 1
+
+    with pytest.raises(ValueError):
+        ArbitrageEventSink([], queue_full_policy='block')
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_jsonl_and_sqlite_destinations(tmp_path):
+    """Events are expected to be written to each configured destination"""
+    assert create_event_sink() is None
+    sink = create_event_sink(jsonl_path=str(tmp_path / "events.jsonl"),
+                             sqlite_path=str(tmp_path / "events.db"),
+                             path_suffix=".shard1")
+    async with sink:
+        sink.put(make_event(1.5))
+
+    lines = (tmp_path / "events.shard1.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        make_event(1.5)._asdict()]
+    with sqlite3.connect(tmp_path / "events.shard1.db") as connection:
+        rows = connection.execute(
+            "SELECT * FROM arbitrage_events").fetchall()
+    assert rows == [tuple(make_event(1.5))]
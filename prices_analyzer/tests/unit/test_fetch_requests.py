@@ -0,0 +1,150 @@
+"""Price fetcher tests suite"""
+import asyncio
+import json
+from typing import Callable, Coroutine, List
+
+import httpx
+import pytest
+
+from app.utils.fetch_requests import PriceFetcher
+
+from helpers import get_price_fetcher, make_quote
+
+
+SERVER_ID = {"x-server-id": "generator-1"}
+
+
+def record_requests(requests: List[httpx.Request], batch_supported=True
+                    ) -> Callable[[httpx.Request],
+                                  Coroutine[None, None, httpx.Response]]:
+    """Mocked generator handler answering price requests, recording each
+    request"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        params = request.url.params
+        if request.url.path == "/price":
+            return httpx.Response(200, json=make_quote(
+                params["asset_name"], params["market"]), headers=SERVER_ID)
+        if request.url.path == "/prices" and batch_supported:
+            return httpx.Response(200, json={"prices": [
+                make_quote(asset, market)
+                for asset in params.get_list("asset_name")
+                for market in params.get_list("market")]}, headers=SERVER_ID)
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+    return handler
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_pairs_fetched_in_batches():
+    """Pairs are expected to be grouped into batch requests of at most
+    `batch_size` pairs covering exactly the requested pairs"""
+    requests: List[httpx.Request] = []
+    price_fetcher = get_price_fetcher(record_requests(requests),
+                                      batch_size=4)
+    pairs = [(f"Asset{idx}", market)
+             for idx in range(5) for market in ("US", "UK")]
+    pairs.append(("Oil", "Asia"))
+
+    prices = await price_fetcher.fetch_prices(pairs)
+
+    assert set(prices) == set(pairs)
+    assert all(request.url.path == "/prices" for request in requests)
+    assert len(requests) == 4
+    await price_fetcher.close()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_falls_back_to_single_requests():
+    """Without batch endpoint pairs are expected to be fetched one by
+    one, and batch endpoint is not tried again"""
+    requests: List[httpx.Request] = []
+    price_fetcher = get_price_fetcher(
+        record_requests(requests, batch_supported=False))
+    pairs = [("Oil", "US"), ("Oil", "UK")]
+
+    assert set(await price_fetcher.fetch_prices(pairs)) == set(pairs)
+    assert not price_fetcher.batch_supported
+
+    requests.clear()
+    assert set(await price_fetcher.fetch_prices(pairs)) == set(pairs)
+    assert [request.url.path for request in requests] == ["/price"] * 2
+    await price_fetcher.close()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_prices_are_stamped_for_tracing():
+    """Prices are expected to carry the replica that served them and the
+    request and response times, in batch and single requests alike"""
+    for batch_supported in (True, False):
+        price_fetcher = get_price_fetcher(
+            record_requests([], batch_supported))
+        prices = await price_fetcher.fetch_prices([("Oil", "US")])
+
+        asset_price = prices[("Oil", "US")]
+        assert asset_price.server_id == "generator-1"
+        assert (asset_price.received_at - asset_price.requested_at
+                >= 0.01)
+        assert price_fetcher.prices_count == 1
+        await price_fetcher.close()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_concurrent_callers_share_request():
+    """Concurrent requests of the same pair are expected to share a single
+    request in flight"""
+    requests: List[httpx.Request] = []
+    price_fetcher = get_price_fetcher(record_requests(requests))
+
+    results = await asyncio.gather(
+        price_fetcher.fetch_price("Oil", "US"),
+        price_fetcher.fetch_price("Oil", "US"),
+        price_fetcher.fetch_prices([("Oil", "US"), ("Oil", "UK")]))
+
+    assert results[0] == results[1] == results[2][("Oil", "US")]
+    assert ("Oil", "UK") in results[2]
+    assert len(requests) == 2
+    assert not price_fetcher._in_flight  # pylint: disable=W0212
+
+    await price_fetcher.fetch_price("Oil", "US")
+    assert len(requests) == 3
+    await price_fetcher.close()
+
+
+async def sse_body(quotes: List[dict]):
+    """Server-Sent Events stream of provided quotes, as the generator
+    sends it"""
+    yield b": keepalive\n\n"
+    for quote in quotes:
+        yield f"event: price\ndata: {json.dumps(quote)}\n\n".encode()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_stream_prices_parses_events():
+    """Price events of the stream are expected to be parsed in order,
+    stamped with the replica and the receive time, and keepalive comments
+    skipped"""
+    requests: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream", **SERVER_ID},
+            content=sse_body([make_quote("Oil", "US"),
+                              make_quote("Oil", "UK")]))
+
+    price_fetcher = PriceFetcher(host="generator", port="8000")
+    price_fetcher.client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler))
+
+    prices = [price async for price in price_fetcher.stream_prices(
+        ["Oil"], ["US", "UK"])]
+
+    assert [(price.name, price.market) for price in prices] == [
+        ("Oil", "US"), ("Oil", "UK")]
+    assert all(price.server_id == "generator-1" and price.received_at
+               and price.requested_at is None for price in prices)
+    assert requests[0].url.path == "/prices/stream"
+    assert requests[0].url.params.get_list("market") == ["US", "UK"]
+    await price_fetcher.close()
@@ -0,0 +1,93 @@
+"""Latency histogram and tracing tests suite"""
+import time
+
+import pytest
+
+from app.core.batch_detector import BatchArbitrageDetector
+from app.core.detector import ArbitrageDetector
+from app.utils.histogram import LatencyHistogram
+from app.utils.latency import LatencyTracker
+
+from helpers import make_price
+
+
+def test_percentiles_keep_relative_precision():
+    """Percentiles are expected to be within bucket precision of the exact
+    ones, from microseconds to seconds, and never above the maximum"""
+    histogram = LatencyHistogram()
+    values = [idx * 1e-5 for idx in range(1, 100001)]
+    for value in values:
+        histogram.record(value)
+
+    for percentile, (value,) in ((50, histogram.get_percentiles([50])),
+                                 (99, histogram.get_percentiles([99])),
+                                 (99.9, histogram.get_percentiles([99.9]))):
+        exact = values[int(len(values) * percentile / 100) - 1]
+        assert value == pytest.approx(exact, rel=1 / 64)
+    assert histogram.get_percentiles([100]) == [histogram.max_s]
+    assert histogram.count == len(values)
+    # log-linear buckets: a few hundred cover five orders of magnitude
+    assert len(histogram.counts) < 1000
+    assert sum(count for _, count in histogram.get_buckets()) == len(values)
+
+
+def test_small_and_negative_values():
+    """Values below the linear range are expected to be exact, negative
+    ones counted as zero, and an empty histogram to report zeros"""
+    histogram = LatencyHistogram()
+    assert histogram.get_percentiles([50, 99]) == [0.0, 0.0]
+    assert histogram.format() == "p50 0.0 p99 0.0 p99.9 0.0 ms (n=0)"
+
+    histogram.record(-0.5)
+    histogram.record(42e-6)
+    assert histogram.get_percentiles([50, 100]) == [0.0, pytest.approx(42e-6)]
+
+
+def test_tick_stages_recorded_per_asset_and_server():
+    """Stages with timestamps are expected to be recorded over all ticks,
+    per asset and per server, and the ones missing them skipped"""
+    latency = LatencyTracker()
+    latency.record_tick(
+        make_price("US", 1000, updated_at=100.0, server_id="replica-1",
+                   requested_at=100.5, received_at=100.6),
+        started_at=100.7, checked_at=100.75)
+    # streamed price: no request time, no server
+    latency.record_tick(make_price("UK", 1000, received_at=101.0),
+                        started_at=101.0, checked_at=101.0)
+
+    assert latency.get('fetch').count == 1
+    assert latency.get('fetch').max_s == pytest.approx(0.1)
+    assert latency.get('queue').count == 2
+    assert latency.get('tick_to_detection', 'server',
+                       'replica-1').max_s == pytest.approx(0.75)
+    assert latency.get('detect', 'asset', 'Oil').count == 2
+    assert latency.get('fetch', 'server', 'replica-2') is None
+    assert [line.split(':')[0] for line in latency.get_report('server')] == [
+        "fetch replica-1", "queue replica-1", "detect replica-1",
+        "tick_to_detection replica-1"]
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_detectors_trace_checked_prices():
+    """Checked prices are expected to be traced by both detectors, and
+    skipped ones not"""
+    now = time.time()
+    latency = LatencyTracker()
+    detector = ArbitrageDetector(latency=latency)
+    asset_price = make_price("US", 1000, version=1, updated_at=now - 1,
+                             received_at=now)
+    await detector.check_for_arbitrage(asset_price)
+    await detector.price_update(asset_price)
+    await detector.check_for_arbitrage(asset_price)
+    assert latency.get('tick_to_detection').count == 1
+    assert latency.get('tick_to_detection').max_s >= 1
+
+    batch_latency = LatencyTracker()
+    batch_detector = BatchArbitrageDetector(["Oil"], ["US", "UK"],
+                                            latency=batch_latency)
+    batch_detector.add_ticks([make_price("US", 1000, received_at=now),
+                              make_price("UK", 900, received_at=now)])
+    batch_detector.detect()
+    assert batch_latency.get('queue').count == 2
+    batch_detector.detect()
+    assert batch_latency.get('detect').count == 2
@@ -0,0 +1,83 @@
+"""Metrics registry and server tests suite"""
+import httpx
+import pytest
+
+from app.app import add_analyzer_metrics
+from app.core.detector import ArbitrageDetector
+from app.utils import schemas
+from app.utils.fetch_requests import PriceFetcher
+from app.utils.histogram import LatencyHistogram
+from app.utils.latency import LatencyTracker
+from app.utils.metrics import (LoopLagMonitor, MetricsRegistry, format_value,
+                               serve_metrics)
+
+
+def test_metrics_rendered_in_text_format():
+    """Metrics are expected to be rendered with help, type, escaped labels
+    and summary quantiles, reading current values on each render"""
+    counts = {'requests': 0}
+    histogram = LatencyHistogram()
+    histogram.record(0.002)
+    registry = MetricsRegistry()
+    registry.add_value('requests_total', 'counter', 'Requests',
+                       lambda: counts['requests'])
+    registry.add('errors_total', 'counter', 'Errors',
+                 lambda: [({'type': 'say "hi"\n'}, 1.5)])
+    registry.add('wait_seconds', 'summary', 'Wait',
+                 lambda: [({'stage': 'fetch'}, histogram)])
+    counts['requests'] = 3
+
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total 3',
+        '# HELP errors_total Errors',
+        '# TYPE errors_total counter',
+        'errors_total{type="say \\"hi\\"\\n"} 1.5',
+        '# HELP wait_seconds Wait',
+        '# TYPE wait_seconds summary',
+        'wait_seconds{stage="fetch",quantile="0.5"} 0.002',
+        'wait_seconds{stage="fetch",quantile="0.99"} 0.002',
+        'wait_seconds{stage="fetch",quantile="0.999"} 0.002',
+        'wait_seconds_sum{stage="fetch"} 0.002',
+        'wait_seconds_count{stage="fetch"} 1']
+    with pytest.raises(ValueError):
+        registry.add('histogram', 'histogram', 'Unsupported', list)
+
+
+def test_values_formatted_for_prometheus():
+    """Booleans are expected to be rendered as integers, and special
+    floats the way Prometheus spells them"""
+    assert [format_value(value) for value in (
+        True, 7, 0.1 + 0.2, float('nan'), float('inf'), float('-inf'))
+    ] == ['1', '7', '0.3', 'NaN', '+Inf', '-Inf']
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_analyzer_metrics_served_over_http():
+    """Analyzer metrics are expected to be served at `/metrics` and
+    follow the detector and fetcher counters"""
+    detector = ArbitrageDetector(latency=LatencyTracker())
+    price_fetcher = PriceFetcher(host="generator", port="8000")
+    price_fetcher.errors["ConnectError"] = 2
+    registry = MetricsRegistry()
+    add_analyzer_metrics(registry, price_fetcher, detector, LoopLagMonitor())
+    server = await serve_metrics(registry, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    await detector.check_for_arbitrage(schemas.AssetPriceFromApi(
+        name="Oil", market="US", price=1000, spread=1, updated_at=1.0))
+    async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}") as client:
+        response = await client.get("/metrics")
+        assert (await client.get("/")).status_code == 404
+    server.close()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert "analyzer_checks_total 1" in lines
+    assert 'analyzer_fetch_errors_total{type="ConnectError"} 2' in lines
+    assert "analyzer_lock_acquisitions_total 1" in lines
+    assert 'analyzer_tick_latency_seconds_count{stage="detect"} 1' in lines
+    assert 'analyzer_fetch_resilience_total{outcome="retried"} 0' in lines
@@ -0,0 +1,53 @@
+"""Order book tests suite"""
+import random
+
+from app.core.order_book import AssetOrderBook
+
+
+def test_best_prices_follow_updates():
+    """Best prices are expected to be exact after any sequence of updates,
+    including the best market getting worse"""
+    order_book = AssetOrderBook()
+    order_book.update("US", price_buy=101, price_sell=99)
+    order_book.update("UK", price_buy=103, price_sell=97)
+    order_book.update("Asia", price_buy=105, price_sell=95)
+    assert order_book.best_buy() == (101, "US")
+    assert order_book.best_sell() == (99, "US")
+
+    order_book.update("US", price_buy=110, price_sell=90)
+    assert order_book.best_buy() == (103, "UK")
+    assert order_book.best_sell() == (97, "UK")
+
+    assert order_book.best_buy(exclude_market="UK") == (105, "Asia")
+    assert order_book.best_sell(exclude_market="UK") == (95, "Asia")
+    # excluded market stays in the book
+    assert order_book.best_buy() == (103, "UK")
+
+
+def test_matches_full_scan_under_random_updates():
+    """Heaps with lazy invalidation are expected to agree with a full scan
+    of latest quotes, and stay bounded"""
+    rng = random.Random(42)
+    markets = [f"Market{idx}" for idx in range(50)]
+    order_book = AssetOrderBook()
+    quotes = {}
+
+    for _ in range(5000):
+        market = rng.choice(markets)
+        mid = rng.choice([99, 100, 101, rng.uniform(90, 110)])
+        quotes[market] = (mid + 1, mid - 1)
+        order_book.update(market, *quotes[market])
+
+        exclude_market = rng.choice(markets)
+        others = {m: q for m, q in quotes.items() if m != exclude_market}
+        best_buy = order_book.best_buy(exclude_market=exclude_market)
+        best_sell = order_book.best_sell(exclude_market=exclude_market)
+        if others:
+            assert best_buy[0] == min(q[0] for q in others.values())
+            assert best_sell[0] == max(q[1] for q in others.values())
+            assert best_buy[1] != exclude_market
+        else:
+            assert best_buy is None and best_sell is None
+
+    # pylint: disable=W0212
+    assert len(order_book._buy_heap) <= 4 * len(markets) + 17
@@ -0,0 +1,91 @@
+"""Prices pipeline tests suite"""
+import asyncio
+from typing import List
+
+import pytest
+
+from app.core.detector import ArbitrageDetector
+from app.core.pipeline import ConflatingQueue, PricesPipeline
+from app.core.poll_scheduler import PollScheduler
+
+from helpers import FakeFetcher
+
+
+class SlowDetector(ArbitrageDetector):
+    """Detector taking a while to check each price"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # prices checked, in order
+        self.checked: List[float] = []
+
+    async def check_for_arbitrage(self, asset_price):
+        await asyncio.sleep(0.05)
+        self.checked.append(asset_price.price)
+        return await super().check_for_arbitrage(asset_price)
+
+
+async def run_for(pipeline: PricesPipeline, duration_s: float) -> None:
+    """Run pipeline for a while"""
+    try:
+        await asyncio.wait_for(pipeline.run(), duration_s)
+    except asyncio.TimeoutError:
+        pass
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_queue_keeps_latest_value_of_pair():
+    """Newer value of a waiting pair is expected to replace the older one
+    in place, and other pairs to wait for room once the queue is full"""
+    queue = ConflatingQueue(maxsize=2)
+    await queue.put(("Oil", "US"), 1)
+    await queue.put(("Oil", "UK"), 2)
+    await queue.put(("Oil", "US"), 3)
+    assert queue.qsize() == 2
+    assert queue.dropped_count == 1
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(queue.put(("Copper", "US"), 4), 0.05)
+
+    assert await queue.get() == (("Oil", "US"), 3)
+    assert await queue.get() == (("Oil", "UK"), 2)
+    assert queue.max_depth == 2
+
+    # the cancelled put left no value behind, so the pair is queued
+    await queue.put(("Copper", "US"), 5)
+    assert await queue.get() == (("Copper", "US"), 5)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_lagging_detection_is_conflated():
+    """Detection slower than fetching is expected to hold at most one
+    price per pair, the latest one, instead of queuing all of them"""
+    fetcher = FakeFetcher()
+    detector = SlowDetector()
+    scheduler = PollScheduler([("Oil", "US")], interval_s=0.01)
+    pipeline = PricesPipeline(fetcher, detector, scheduler)
+
+    await run_for(pipeline, 0.5)
+
+    assert pipeline.detect_queue.max_depth == 1
+    assert pipeline.detect_queue.dropped_count > 0
+    # prices are checked in order, skipping outdated ones
+    assert detector.checked == sorted(detector.checked)
+    assert len(detector.checked) < scheduler.polls_count
+    assert detector.order_books["Oil"].prices_buy["US"] > 0
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_fetch_concurrency_is_bounded_by_workers():
+    """Concurrent requests are expected to be bounded by the number of
+    fetch workers, each pair being requested once at a time"""
+    fetcher = FakeFetcher(delay_s=0.05)
+    pairs = [(f"Asset{idx}", "US") for idx in range(10)]
+    pipeline = PricesPipeline(fetcher, ArbitrageDetector(),
+                              PollScheduler(pairs, interval_s=0),
+                              fetch_workers=3)
+
+    await run_for(pipeline, 0.3)
+
+    assert fetcher.max_in_flight == 3
+    assert pipeline.scheduler.polls_count >= 3 * 5
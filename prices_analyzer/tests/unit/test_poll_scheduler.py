@@ -0,0 +1,103 @@
+"""Adaptive poll scheduler tests suite"""
+from typing import List, Tuple
+
+import pytest
+
+from app.core.detector import ArbitrageDetector
+from app.core.poll_scheduler import (
+    AdaptivePollScheduler, PairPollState, TokenBucket)
+from app.utils import schemas
+
+from helpers import make_price
+
+
+def poll(scheduler: AdaptivePollScheduler, now: float, prices: dict
+         ) -> list:
+    """Poll all due pairs at a moment, returning them"""
+    polled: List[Tuple[str, str]] = []
+    while True:
+        pair, _ = scheduler.get_due(now)
+        if pair is None:
+            return polled
+        scheduler.observe(
+            pair, make_price(pair[1], prices[pair], name=pair[0]), now=now)
+        polled.append(pair)
+
+
+def test_token_bucket_limits_rate():
+    """Requests are expected to be let through at the bucket rate once the
+    burst is spent"""
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated_at
+    assert bucket.try_acquire(now) == 0
+    assert bucket.try_acquire(now) == 0
+    assert bucket.try_acquire(now) == pytest.approx(0.1)
+    assert bucket.try_acquire(now + 0.11) == 0
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_polls_follow_change_rate():
+    """Pair changing on every poll is expected to be polled more often
+    than a pair which never changes"""
+    fast, slow = ("Oil", "US"), ("Copper", "US")
+    scheduler = AdaptivePollScheduler([fast, slow], now=0,
+                                      min_interval_s=0.1, max_interval_s=5)
+    polls = {fast: 0, slow: 0}
+    prices = {fast: 100.0, slow: 50.0}
+    now = 0.0
+    while now < 30:
+        prices[fast] += 1
+        for pair in poll(scheduler, now, prices):
+            polls[pair] += 1
+        now += 0.05
+
+    assert polls[fast] > 10 * polls[slow]
+    assert scheduler.get_interval(slow) == 5
+    assert scheduler.get_interval(fast) < 0.5
+    assert scheduler.polls_count == sum(polls.values())
+
+
+def test_polls_share_rate_limit():
+    """Polls of all pairs are expected to stay within the rate limit"""
+    pairs = [(f"Asset{idx}", "US") for idx in range(100)]
+    scheduler = AdaptivePollScheduler(pairs, now=0, rate_limit=20,
+                                      min_interval_s=0.1)
+    prices = dict.fromkeys(pairs, 10.0)
+    polled = 0
+    now = 0.0
+    while now < 10:
+        polled += len(poll(scheduler, now, prices))
+        now += 0.01
+    # initial burst of a second worth of requests
+    assert polled <= 20 * 10 + 20 + 1
+
+
+def test_near_crossing_asset_is_polled_first():
+    """Asset whose best buying and selling prices across markets nearly
+    cross is expected to be polled at the shortest interval"""
+    detector = ArbitrageDetector()
+    near, far = ("Oil", "US"), ("Copper", "US")
+    scheduler = AdaptivePollScheduler([near, far], detector, now=0,
+                                      initial_interval_s=1,
+                                      min_interval_s=0.1, near_crossing=0.02)
+    assert scheduler.get_interval(near) == 1
+
+    # best buying 1010, best selling 1009.8 (UK)
+    detector.order_books["Oil"].update("US", 1010, 990)
+    detector.order_books["Oil"].update("UK", 1030.4, 1009.8)
+    # 2% gap: 1010 and 990
+    detector.order_books["Copper"].update("US", 1010, 990)
+
+    assert scheduler.get_interval(near) == 0.1
+    assert scheduler.get_interval(far) == 1
+
+
+def test_version_tells_price_change():
+    """Provided versions are expected to tell whether a price changed,
+    even if the price itself is the same"""
+    state = PairPollState()
+    for version, changed in ((1, True), (1, False), (2, True)):
+        assert state.observe(schemas.AssetPriceFromApi(
+            name="Oil", market="US", price=100, spread=1, version=version),
+            now=0) == changed
@@ -0,0 +1,143 @@
+"""Retries, circuit breaker and hedged requests tests suite"""
+import asyncio
+import time
+from typing import List
+
+import httpx
+import pytest
+
+from app.utils.resilience import (CircuitBreaker, HedgeDelay, RetryBudget,
+                                  get_backoff_s)
+
+from helpers import get_price_fetcher, make_quote
+
+
+QUOTE = make_quote("Oil", "US")
+
+
+def test_retry_budget_and_backoff():
+    """Retries are expected to be allowed in bursts up to the budget and
+    then as a share of requests, after doubling capped backoffs"""
+    budget = RetryBudget(ratio=0.1, max_tokens=10)
+    assert sum(budget.withdraw() for _ in range(20)) == 10
+    for _ in range(10):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    assert [get_backoff_s(attempt, 0.1, 0.5, uniform=lambda _, high: high)
+            for attempt in range(1, 5)] == pytest.approx([0.1, 0.2, 0.4, 0.5])
+    assert 0 <= get_backoff_s(3, 0.1, 0.5) <= 0.4
+
+
+def test_circuit_breaker_states():
+    """The circuit is expected to open after consecutive failures, let a
+    single probe through after the reset timeout and close once the
+    probe succeeds"""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=5)
+    breaker.record_failure(0)
+    breaker.record_failure(0)
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow_request(1)
+        breaker.record_failure(1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request(5)
+
+    assert breaker.allow_request(6)
+    assert not breaker.allow_request(6)
+    breaker.record_failure(6)
+    assert not breaker.allow_request(10)
+    assert breaker.opened_count == 2
+
+    assert breaker.allow_request(11)
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request(11) and breaker.allow_request(11)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_failures_retried_within_budget():
+    """Failed requests are expected to be retried until one succeeds,
+    and not retried once the budget is spent"""
+    statuses = [503, 503, 200]
+    requests: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        status = statuses.pop(0) if statuses else 503
+        return httpx.Response(status, json=QUOTE if status == 200 else {})
+
+    price_fetcher = get_price_fetcher(handler)
+    assert (await price_fetcher.fetch_price("Oil", "US")) is not None
+    assert len(requests) == 3
+    assert price_fetcher.outcomes["retried"] == 2
+    assert price_fetcher.outcomes["retry_succeeded"] == 1
+    assert price_fetcher.errors == {"http_503": 2}
+
+    requests.clear()
+    price_fetcher.retry_budget.tokens = 0
+    assert (await price_fetcher.fetch_price("Oil", "US")) is None
+    assert len(requests) == 1
+    assert price_fetcher.outcomes["retry_budget_exhausted"] == 1
+
+    # answered, but not with a price: not a successful retry
+    statuses[:] = [503, 404]
+    price_fetcher.retry_budget.tokens = 1
+    assert (await price_fetcher.fetch_price("Oil", "US")) is None
+    assert price_fetcher.outcomes["retry_succeeded"] == 1
+    assert price_fetcher.outcomes["retry_failed"] == 1
+    await price_fetcher.close()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_open_circuit_fails_fast():
+    """Once the circuit of the generator opens, requests are expected to
+    fail without being sent"""
+    requests: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    price_fetcher = get_price_fetcher(handler)
+    price_fetcher.max_retries = 0
+    price_fetcher.breaker_failures = 2
+    for _ in range(4):
+        assert (await price_fetcher.fetch_price("Oil", "US")) is None
+
+    assert len(requests) == 2
+    assert price_fetcher.outcomes["circuit_rejected"] == 2
+    assert price_fetcher.errors == {"ConnectError": 2, "CircuitOpenError": 2}
+    breaker = price_fetcher.breakers[price_fetcher.api_base_url]
+    assert breaker.state == CircuitBreaker.OPEN
+    await price_fetcher.close()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_slow_request_hedged():
+    """A request slower than the hedge delay is expected to be sent
+    again, and the faster response to be used"""
+    requests: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json=QUOTE)
+
+    price_fetcher = get_price_fetcher(handler)
+    price_fetcher.hedge_delay = HedgeDelay(percentile=95, min_samples=1)
+    price_fetcher.hedge_delay.record(0.01)
+
+    started = time.perf_counter()
+    assert (await price_fetcher.fetch_price("Oil", "US")) is not None
+    assert time.perf_counter() - started < 0.5
+    assert len(requests) == 2
+    assert price_fetcher.outcomes["hedged"] == 1
+    assert price_fetcher.outcomes["hedge_won"] == 1
+
+    # fast enough: no hedge
+    assert (await price_fetcher.fetch_price("Oil", "US")) is not None
+    assert len(requests) == 3
+    await price_fetcher.close()
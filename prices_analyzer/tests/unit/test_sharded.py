@@ -0,0 +1,76 @@
+"""Sharded analyzer launcher tests suite"""
+import asyncio
+import queue
+
+import pytest
+
+from app.core.detector import ArbitrageDetector
+from app.sharded import (ShardStats, format_throughput, get_asset_filter,
+                         partition_assets, report_throughput)
+from app.utils import schemas
+
+
+def test_assets_are_partitioned_without_overlap():
+    """Every asset is expected to belong to exactly one shard, shards
+    being balanced and never empty"""
+    assets_list = [f"Asset{idx}" for idx in range(10)]
+    shards = partition_assets(assets_list, 3)
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    assert sorted(sum(shards, [])) == sorted(assets_list)
+
+    assert partition_assets(["Copper", "Oil"], 4) == [["Copper"], ["Oil"]]
+    with pytest.raises(ValueError):
+        partition_assets(assets_list, 0)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_shard_reports_throughput():
+    """Shard is expected to report prices checked and opportunities
+    detected since its previous report"""
+    detector = ArbitrageDetector(assets_list=["Oil"])
+    stats_queue = queue.Queue()
+    reporter = asyncio.create_task(
+        report_throughput(1, detector, stats_queue, 0.05))
+    await asyncio.sleep(0)  # reporter takes its baseline
+
+    for market, price in (("US", 1000), ("UK", 970)):
+        asset_price = schemas.AssetPriceFromApi(
+            name="Oil", market=market, price=price, spread=1)
+        await detector.check_for_arbitrage(asset_price)
+        await detector.price_update(asset_price)
+    # not tracked by the shard
+    await detector.check_for_arbitrage(schemas.AssetPriceFromApi(
+        name="Copper", market="US", price=10, spread=1))
+
+    stats = await asyncio.to_thread(stats_queue.get, timeout=1)
+    assert stats.shard_id == 1
+    assert stats.prices_per_s > 0
+    assert stats.detections == 1
+    assert detector.checks_count == 2
+
+    stats = await asyncio.to_thread(stats_queue.get, timeout=1)
+    assert stats == ShardStats(1, 0.0, 0)
+    reporter.cancel()
+
+
+def test_throughput_report_sums_shards():
+    """Report is expected to total shards that reported and show the
+    missing ones"""
+    report = format_throughput({0: ShardStats(0, 10.0, 1),
+                                2: ShardStats(2, 5.5, 2)}, 3)
+    assert report == ("Throughput: 15.5 prices/s, 3 detections"
+                      " (shard 0: 10.0/1, shard 1: -, shard 2: 5.5/2)")
+
+
+def test_every_asset_belongs_to_one_shard():
+    """Assets of the launch catalog are expected to stay in their shard
+    and each later added asset to belong to exactly one shard"""
+    launch_assets = [f"Asset{idx}" for idx in range(10)]
+    shards = partition_assets(launch_assets, 3)
+    filters = [get_asset_filter(shard_id, 3, shard, launch_assets)
+               for shard_id, shard in enumerate(shards)]
+
+    for shard, belongs in zip(shards, filters):
+        assert [asset for asset in launch_assets if belongs(asset)] == shard
+    for asset in [f"New{idx}" for idx in range(20)]:
+        assert sum(belongs(asset) for belongs in filters) == 1
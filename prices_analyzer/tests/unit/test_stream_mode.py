@@ -0,0 +1,96 @@
+"""Streaming consumer mode tests suite"""
+import asyncio
+import json
+from typing import List
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+import app.app as app_
+from app.core.detector import ArbitrageDetector
+from app.utils.fetch_requests import PriceFetcher
+
+from helpers import make_quote
+
+
+PAIRS = [("Oil", "US"), ("Oil", "UK")]
+
+
+async def sse_body():
+    """Stream of current prices of all pairs, as the generator starts
+    each stream"""
+    for asset, market in PAIRS:
+        quote = json.dumps(make_quote(asset, market))
+        yield f"event: price\ndata: {quote}\n\n".encode()
+
+
+@pytest.fixture(name="fast_reconnect")
+def fixture_fast_reconnect(monkeypatch):
+    """Make reconnection and fallback quick enough for tests"""
+    monkeypatch.setattr(app_, "STREAM_RECONNECT_DELAY_S", 0.01)
+    monkeypatch.setattr(app_, "stream_reconnect_attempts", 2)
+    monkeypatch.setattr(app_, "stream_fallback_s", 0.2)
+    monkeypatch.setattr(app_, "prices_request_interval_s", 0.05)
+
+
+async def run_stream_mode(handler, duration_s: float) -> AsyncMock:
+    """Run streaming consumer against a stand-in generator for a while.
+    Returns the mocked detector."""
+    detector = AsyncMock(spec=ArbitrageDetector)
+    price_fetcher = PriceFetcher(host="generator", port="8000")
+    price_fetcher.client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler))
+    try:
+        await asyncio.wait_for(
+            app_.stream_and_process_prices(price_fetcher, detector, PAIRS),
+            timeout=duration_s)
+    except asyncio.TimeoutError:
+        pass
+    await price_fetcher.close()
+    return detector
+
+
+@pytest.mark.asyncio(loop_scope='function')
+@pytest.mark.usefixtures("fast_reconnect")
+async def test_stream_reconnects_after_errors():
+    """Lost stream is expected to be reconnected, with every received
+    price passed to the detector"""
+    paths: List[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if len(paths) == 1:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, content=sse_body())
+
+    detector = await run_stream_mode(handler, duration_s=0.1)
+
+    assert paths[:3] == ["/prices/stream"] * 3
+    checked = [call.args[0] for call
+               in detector.check_for_arbitrage.call_args_list]
+    assert [(price.name, price.market) for price in checked[:4]] == (
+        PAIRS * 2)
+    assert detector.price_update.call_count == len(checked)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+@pytest.mark.usefixtures("fast_reconnect")
+async def test_falls_back_to_polling_without_stream():
+    """Prices are expected to be polled while the stream is not available
+    and the stream to be tried again afterwards"""
+    paths: List[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path == "/prices":
+            return httpx.Response(200, json={"prices": [
+                make_quote(asset, market) for asset, market in PAIRS]})
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+    detector = await run_stream_mode(handler, duration_s=0.3)
+
+    assert paths[0] == "/prices/stream"
+    assert "/prices" in paths
+    assert paths.count("/prices/stream") >= 2
+    assert detector.check_for_arbitrage.call_count >= len(PAIRS)
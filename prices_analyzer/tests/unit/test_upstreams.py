@@ -0,0 +1,220 @@
+"""Upstreams load balancing and failover tests suite"""
+import asyncio
+from collections import Counter
+import json
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.utils.fetch_requests import PriceFetcher, merge_streams
+from app.utils.upstreams import (Upstream, UpstreamGroup, UpstreamRouter,
+                                 parse_routes, parse_upstream_groups)
+
+
+class StandInGenerator:
+    """Local HTTP server answering price requests like a generator
+    replica, with `x-server-id` of its name. Responds with 500 while
+    `failing`."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.failing = False
+        self.paths: List[str] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def address(self) -> str:
+        """host:port the server listens at"""
+        host, port = self.server.sockets[0].getsockname()[:2]  # type: ignore
+        return f"{host}:{port}"
+
+    async def start(self) -> None:
+        """Listen at a free local port"""
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+
+    async def stop(self) -> None:
+        """Stop listening, so connections are refused"""
+        self.server.close()  # type: ignore
+        await self.server.wait_closed()  # type: ignore
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        url = urlsplit(request_line.split()[1].decode())
+        self.paths.append(url.path)
+        params = parse_qs(url.query)
+        quotes = [{"name": asset, "market": market, "price": 100.0,
+                   "spread": 1.0} for asset in params.get('asset_name', [])
+                  for market in params.get('market', [])]
+        if self.failing:
+            status, body = "500 Internal Server Error", {}
+        elif url.path == '/price':
+            status, body = "200 OK", quotes[0]
+        else:
+            status, body = "200 OK", {"prices": quotes}
+        content = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\ncontent-type: application/json\r\n"
+            f"content-length: {len(content)}\r\nx-server-id: {self.name}\r\n"
+            "connection: close\r\n\r\n".encode() + content)
+        await writer.drain()
+        writer.close()
+
+
+def test_weighted_least_outstanding_selection():
+    """Idle upstreams are expected to be selected in proportion to their
+    weights, and busy ones to be avoided"""
+    weak, strong = Upstream("http://weak", weight=1), Upstream(
+        "http://strong", weight=3)
+    group = UpstreamGroup("general", [weak, strong])
+
+    selected = Counter(group.select().base_url for _ in range(400))
+    assert selected == {"http://weak": 100, "http://strong": 300}
+    # smooth: the weak one is not starved between its turns
+    assert "http://weak" in {group.select().base_url for _ in range(4)}
+
+    strong.outstanding = 4
+    assert group.select() is weak
+    assert group.select(exclude=[weak]) is strong
+    assert group.select(exclude=[weak, strong]) is None
+
+
+def test_ejection_and_recovery():
+    """An upstream is expected to be ejected after `max_fails` failures
+    within `fail_timeout_s`, to get requests again after it, and to be
+    ejected again by a single failure until a request succeeds"""
+    upstream = Upstream("http://generator", max_fails=3, fail_timeout_s=30)
+    other = Upstream("http://other")
+    group = UpstreamGroup("general", [upstream, other])
+
+    # failures too far apart are forgotten
+    for now in (0, 40, 80):
+        upstream.record_failure(now)
+    assert upstream.is_available(80)
+
+    upstream.record_failure(81)
+    upstream.record_failure(82)
+    assert not upstream.is_available(83)
+    assert group.select(now=83) is other
+    assert upstream.ejections_count == 1
+    # all ejected: the one recovering first is tried anyway
+    other.ejected_until = 200
+    assert group.select(now=83) is upstream
+
+    assert upstream.is_available(112)
+    upstream.record_failure(112)
+    assert not upstream.is_available(113)
+
+    upstream.record_success()
+    upstream.record_failure(150)
+    assert upstream.is_available(150)
+    assert upstream.fails_count == 7
+
+
+def test_nginx_like_configuration():
+    """Groups and routes are expected to be parsed from Nginx-like
+    notation, with markets without a route going to the first group"""
+    groups = parse_upstream_groups(
+        "general: gen_1_1:8000 weight=1, gen_1_2:8000 weight=3;"
+        " dedicated: https://gen_2_1:8000 max_fails=1 fail_timeout=10s",
+        max_fails=3, fail_timeout_s=30)
+    router = UpstreamRouter(groups,
+                            parse_routes("UK: dedicated, US: dedicated"))
+
+    general = router.get_group("DE")
+    assert general.name == "general"
+    assert [(upstream.base_url, upstream.weight, upstream.max_fails)
+            for upstream in general.upstreams] == [
+                ("http://gen_1_1:8000", 1, 3), ("http://gen_1_2:8000", 3, 3)]
+    dedicated = router.get_group("UK")
+    assert dedicated.upstreams[0].base_url == "https://gen_2_1:8000"
+    assert dedicated.upstreams[0].fail_timeout_s == 10
+    assert len(router.upstreams) == 3
+
+    with pytest.raises(ValueError):
+        UpstreamRouter(groups, {"UK": "missing"})
+    with pytest.raises(ValueError):
+        parse_upstream_groups("general: gen_1_1:8000 backup")
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_fetcher_routes_balances_and_fails_over():
+    """Prices are expected to be requested from the group of their
+    market in proportion to weights, batches to be split by group, and
+    requests to a stopped replica to fail over to the other one until it
+    is ejected"""
+    weak, strong, dedicated = (StandInGenerator(name)
+                               for name in ("weak", "strong", "dedicated"))
+    for generator in (weak, strong, dedicated):
+        await generator.start()
+    router = UpstreamRouter(
+        parse_upstream_groups(
+            f"general: {weak.address} weight=1, {strong.address} weight=3;"
+            f" dedicated: {dedicated.address}"),
+        parse_routes("UK: dedicated, US: dedicated"))
+    price_fetcher = PriceFetcher(host="unused", port="8000", upstreams=router)
+    # failover only, retries are tested with the resilience suite
+    price_fetcher.max_retries = 0
+
+    served_by = Counter()
+    for _ in range(8):
+        for market in ("DE", "UK"):
+            price = await price_fetcher.fetch_price("Oil", market)
+            served_by[market, price.server_id] += 1
+    assert served_by == {("DE", "weak"): 2, ("DE", "strong"): 6,
+                         ("UK", "dedicated"): 8}
+
+    prices = await price_fetcher.fetch_prices(
+        [("Oil", "DE"), ("Oil", "UK"), ("Oil", "US")])
+    assert {market: price.server_id in ("weak", "strong")
+            for (_, market), price in prices.items()} == {
+                "DE": True, "UK": False, "US": False}
+    assert dedicated.paths.count("/prices") == 1
+
+    await strong.stop()
+    weak.paths.clear()
+    for _ in range(8):
+        assert (await price_fetcher.fetch_price("Oil", "DE")) is not None
+    strong_upstream = router.get_group("DE").upstreams[1]
+    assert not strong_upstream.is_available()
+    assert strong_upstream.fails_count == 3
+    assert price_fetcher.failovers_count == 3
+    assert len(weak.paths) == 8
+
+    # a failing replica alone in its group: its error response is kept
+    dedicated.failing = True
+    assert (await price_fetcher.fetch_price("Oil", "UK")) is None
+    assert price_fetcher.errors["http_500"] == 1
+
+    await price_fetcher.close()
+    for generator in (weak, dedicated):
+        await generator.stop()
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_merged_streams_end_with_first():
+    """Merged streams are expected to yield items of all streams and to
+    end, closing the others, once one of them fails"""
+    closed = []
+
+    async def stream(name: str, count: int, error: bool = False):
+        try:
+            for idx in range(count):
+                await asyncio.sleep(0.01)
+                yield name, idx
+            if error:
+                raise ConnectionError(name)
+            await asyncio.sleep(10)
+        finally:
+            closed.append(name)
+
+    items = []
+    with pytest.raises(ConnectionError):
+        async for item in merge_streams([stream("a", 5),
+                                         stream("b", 2, error=True)]):
+            items.append(item)
+    assert {("b", 0), ("b", 1), ("a", 0)} <= set(items)
+    assert sorted(closed) == ["a", "b"]
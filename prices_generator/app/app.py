@@ -4,20 +4,49 @@ Contains business logic and high level functions.
 
 """
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-import random
+import logging
+import socket
+import time
+from typing import AsyncIterator, List, Optional, Union
 
-from fastapi import FastAPI, HTTPException, status
+from decouple import config
+from fastapi import FastAPI, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
 
-from .core import assets_manager
+from .core import (assets_manager, broadcaster, deterministic_assets_manager,
+                   scheduler, shared_price_book, vectorized_assets_manager)
 from .utils import schemas
+from .utils.fast_path import PriceFastPathMiddleware
 from .utils.logger import get_logger
+from .utils.metrics import CONTENT_TYPE, LoopLagMonitor, MetricsRegistry
+from .utils.request_metrics import RequestMetricsMiddleware, RequestStats
+from .utils.server_id import ServerIdMiddleware
 from .utils.utils import get_config_filepath
 
 
 logger = get_logger(__name__)
-thread_pool = ThreadPoolExecutor(max_workers=10)
+
+# `default` keeps a price model per asset and market, `vectorized` keeps
+# prices in NumPy arrays and updates all due pairs with one random draw,
+# `deterministic` derives prices from seed and time only, so replicas
+# agree, `shared` reads prices published by a writer process (see
+# `multiworker`)
+PRICE_ENGINES = {
+    'default': assets_manager.AssetsManager,
+    'vectorized': vectorized_assets_manager.VectorizedAssetsManager,
+    'deterministic': deterministic_assets_manager.DeterministicAssetsManager,
+    'shared': shared_price_book.SharedBookAssetsManager,
+}
+price_engine = config('PRICE_ENGINE', default='default')
+price_engine_tick_s = float(config('PRICE_ENGINE_TICK_S', default=0.1))
+stream_buffer_size = int(config('STREAM_BUFFER_SIZE', default=1000))
+stream_keepalive_s = float(config('STREAM_KEEPALIVE_S', default=15))
+# sent in `X-Server-Id` header of every response, host name if empty
+server_id = config('SERVER_ID', default='') or socket.gethostname()
+# requests of other paths are counted together
+request_stats = RequestStats(
+    ('/price', '/prices', '/prices/stream', '/catalog', '/metrics'))
 
 
 @asynccontextmanager
@@ -26,44 +55,97 @@ async def lifespan(app: FastAPI):
     in the background.
     """
     config_filepath = get_config_filepath()
-    app.state.assets_manager = assets_manager.AssetsManager(config_filepath)
-    logger.debug(
-        "Assets manager initialized with prices: \n%s",
-        app.state.assets_manager.prices_dict)
+    started = time.perf_counter()
+    app.state.assets_manager = get_assets_manager(config_filepath)
+    app.state.broadcaster = broadcaster.PriceBroadcaster(stream_buffer_size)
+    logger.info(
+        f"Assets manager ({price_engine}) initialized with"
+        f" {len(app.state.assets_manager.pairs)} assets in"
+        f" {time.perf_counter() - started:.3f} s")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Assets manager initialized with prices: \n%s",
+            app.state.assets_manager.prices_dict)
 
     app.add_event_handler("startup", start_background_tasks(app))
     yield
 
 
-def start_background_tasks(app: FastAPI):
-    """Starts separate background tasks for updating the prices of each
-    asset independently.
+def get_assets_manager(
+        config_filepath: str
+        ) -> Union[assets_manager.AssetsManager,
+                   vectorized_assets_manager.VectorizedAssetsManager,
+                   shared_price_book.SharedBookAssetsManager]:
+    """Instantiates assets manager of the engine selected by
+    `PRICE_ENGINE` environment variable.
     """
-    assets_manager = app.state.assets_manager
+    if price_engine not in PRICE_ENGINES:
+        raise ValueError(
+            f"Unknown price engine: {price_engine}."
+            f" Expected one of: {list(PRICE_ENGINES)}")
+    return PRICE_ENGINES[price_engine](config_filepath)
 
-    for asset_and_market in assets_manager.prices_dict.keys():
-        # Create and start a separate task for each asset
-        asset = assets_manager.prices_dict[asset_and_market]
-        asyncio.create_task(update_asset_price_loop(app, asset))
-        logger.debug(f"Update price loop created for asset {asset}")
 
-
-async def update_asset_price_loop(app: FastAPI, asset: schemas.Asset):
-    """Independent infinite background task for updating a specific
-    asset's price.
+def start_background_tasks(app: FastAPI):
+    """Starts a single background task updating prices of all assets:
+    each asset keeps its own irregular update cadence, due assets are
+    updated in batches by the scheduler.
     """
-    assets_manager = app.state.assets_manager
-    while True:
-        assets_manager.update_asset_price(asset)
+    app.state.scheduler = scheduler.PriceUpdateScheduler(
+        app.state.assets_manager, app.state.broadcaster,
+        tick_s=price_engine_tick_s)
+    app.state.scheduler_task = asyncio.create_task(app.state.scheduler.run())
+    app.state.loop_lag = LoopLagMonitor()
+    app.state.loop_lag_task = asyncio.create_task(app.state.loop_lag.run())
+    app.state.metrics = create_metrics_registry(app)
+    logger.debug("Prices update scheduler created with"
+                 f" {price_engine_tick_s} s tick")
+
 
-        # simulate different waiting time update
-        sleep_duration = round(random.uniform(1, 3), 1)
-        logger.debug((f"Asset's {asset} price is updated."
-                      f" Sleep duration: {sleep_duration} s"))
-        await asyncio.sleep(sleep_duration)
+def create_metrics_registry(app: FastAPI) -> MetricsRegistry:
+    """Metrics of the scheduler, requests and event loop, read from the
+    app state on scrape"""
+    state = app.state
+    registry = MetricsRegistry()
+    registry.add_value(
+        'generator_scheduler_ticks_total', 'counter',
+        'Scheduler wakeups', lambda: state.scheduler.ticks_count)
+    registry.add_value(
+        'generator_price_updates_total', 'counter',
+        'Price updates of all pairs', lambda: state.scheduler.updates_count)
+    registry.add(
+        'generator_scheduling_lag_seconds', 'summary',
+        'Delay of price update batches past their earliest deadline',
+        lambda: [({}, state.scheduler.lag.histogram)])
+    registry.add(
+        'generator_http_requests_total', 'counter',
+        'HTTP requests by path and response status',
+        lambda: [({'path': path, 'status': str(status)}, count)
+                 for path, counts in request_stats.counts.items()
+                 for status, count in sorted(counts.items())])
+    registry.add(
+        'generator_http_request_duration_seconds', 'summary',
+        'Time from an HTTP request till its response start, by path',
+        lambda: [({'path': path}, histogram)
+                 for path, histogram in request_stats.durations.items()
+                 if histogram.count])
+    registry.add(
+        'generator_event_loop_lag_seconds', 'summary',
+        'Delay of event loop wakeups, i.e. of work waiting for the loop',
+        lambda: [({}, state.loop_lag.histogram)])
+    registry.add_value(
+        'generator_stream_subscribers', 'gauge',
+        'Prices stream subscribers',
+        lambda: len(state.broadcaster.subscribers))
+    return registry
 
 
 app = FastAPI(lifespan=lifespan)
+# known pairs are answered before reaching `get_price`
+app.add_middleware(PriceFastPathMiddleware, path='/price')
+# added last, so they wrap the fast path as well
+app.add_middleware(ServerIdMiddleware, server_id=server_id)
+app.add_middleware(RequestMetricsMiddleware, stats=request_stats)
 
 
 @app.get('/price')
@@ -79,10 +161,99 @@ async def get_price(asset_name, market) -> schemas.PriceQuoteOut:
 
     assets_manager = app.state.assets_manager
 
-    price_data = await asyncio.get_event_loop().run_in_executor(
-            thread_pool, assets_manager.get_curr_asset_price, asset)
+    # a plain dict lookup of an immutable price, served on the event loop
+    price_data = assets_manager.get_curr_asset_price(asset)
     if price_data is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail='Asset and market pair not found')
 
-    return price_data
\ No newline at end of file
+    return price_data
+
+
+@app.get('/prices')
+async def get_prices(
+        asset_name: Optional[List[str]] = Query(default=None),
+        market: Optional[List[str]] = Query(default=None)
+        ) -> schemas.PricesOut:
+    """
+    API to provide current prices of several assets and markets at once.
+    Both parameters can be repeated to request a list of values; all
+    assets or markets are returned if corresponding parameter is omitted.
+    Unknown assets and markets are skipped.
+    """
+    assets_manager = app.state.assets_manager
+
+    prices = assets_manager.get_prices_snapshot(asset_names=asset_name,
+                                                markets=market)
+
+    return schemas.PricesOut(
+        prices=[price.model_dump() for price in prices])
+
+
+@app.get('/catalog')
+async def get_catalog() -> schemas.CatalogOut:
+    """
+    API to provide assets and markets prices are served for, with a
+    catalog version changing only when the catalog does
+    """
+    return app.state.assets_manager.catalog
+
+
+@app.get('/metrics')
+async def get_metrics() -> Response:
+    """
+    API to provide runtime metrics in Prometheus text format
+    """
+    return Response(app.state.metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get('/prices/stream')
+async def stream_prices(
+        asset_name: Optional[List[str]] = Query(default=None),
+        market: Optional[List[str]] = Query(default=None)
+        ) -> StreamingResponse:
+    """
+    API to stream price updates as Server-Sent Events. Accepts the same
+    filters as `/prices`. Current prices of requested pairs are sent
+    first, followed by each update as it happens.
+    """
+    prices_broadcaster = app.state.broadcaster
+    # subscribe before taking snapshot, so no update is missed in between
+    subscription = prices_broadcaster.subscribe(asset_names=asset_name,
+                                                markets=market)
+    snapshot = app.state.assets_manager.get_prices_snapshot(
+        asset_names=asset_name, markets=market)
+
+    return StreamingResponse(
+        price_events(prices_broadcaster, subscription, snapshot),
+        media_type='text/event-stream',
+        # disable Nginx response buffering for this stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def price_events(
+        prices_broadcaster: broadcaster.PriceBroadcaster,
+        subscription: broadcaster.Subscription,
+        snapshot: List[schemas.AssetPrice]
+        ) -> AsyncIterator[str]:
+    """Formats snapshot and subscription updates as Server-Sent Events.
+    Sends a comment line as keepalive if there were no updates for
+    `STREAM_KEEPALIVE_S`. Unsubscribes once client is gone.
+    """
+    try:
+        for price in snapshot:
+            yield format_price_event(price)
+        while True:
+            prices = await subscription.get(timeout=stream_keepalive_s)
+            if not prices:
+                yield ': keepalive\n\n'
+            for price in prices:
+                yield format_price_event(price)
+    finally:
+        prices_broadcaster.unsubscribe(subscription)
+
+
+def format_price_event(price: schemas.AssetPrice) -> str:
+    """Serializes price quote as a Server-Sent Event"""
+    quote = schemas.PriceQuoteOut(**price.model_dump())
+    return f"event: price\ndata: {quote.model_dump_json()}\n\n"
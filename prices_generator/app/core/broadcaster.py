@@ -0,0 +1,111 @@
+"""Prices broadcaster
+
+Fans out price updates to stream subscribers. Publishing never blocks:
+each subscriber owns a bounded buffer, so a slow consumer only loses its
+own updates and can't stall prices update loops.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+from ..utils import schemas
+from ..utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class Subscription:
+    """
+    Bounded buffer of price updates of a single subscriber.
+
+    Buffer keeps at most one pending update per asset and market pair:
+    a newer update of a pair replaces the pending one in place
+    (conflation). When buffer is full, an update of a new pair evicts the
+    oldest pending update (drop).
+    """
+
+    def __init__(
+            self,
+            asset_names: Optional[Iterable[str]] = None,
+            markets: Optional[Iterable[str]] = None,
+            max_buffer_size: int = 1000
+            ) -> None:
+        self.asset_names: Optional[Set[str]] = (
+            set(asset_names) if asset_names else None)
+        self.markets: Optional[Set[str]] = set(markets) if markets else None
+        self.max_buffer_size = max_buffer_size
+        self.conflated_count = 0
+        self.dropped_count = 0
+        self._buffer: OrderedDict[Tuple[str, str], schemas.AssetPrice] = (
+            OrderedDict())
+        self._has_updates = asyncio.Event()
+
+    def matches(self, asset_name: str, market: str) -> bool:
+        """Check if subscriber is interested in the asset and market"""
+        return ((self.asset_names is None or asset_name in self.asset_names)
+                and (self.markets is None or market in self.markets))
+
+    def put(self, asset_price: schemas.AssetPrice) -> None:
+        """Add update to the buffer without blocking"""
+        key = (asset_price.name, asset_price.market)
+        if key in self._buffer:
+            self.conflated_count += 1
+        elif len(self._buffer) >= self.max_buffer_size:
+            self._buffer.popitem(last=False)
+            self.dropped_count += 1
+        self._buffer[key] = asset_price
+        self._has_updates.set()
+
+    async def get(self, timeout: Optional[float] = None
+                  ) -> List[schemas.AssetPrice]:
+        """Wait for updates and return all pending ones. Returns an empty
+        list if no update arrived within timeout.
+        """
+        try:
+            await asyncio.wait_for(self._has_updates.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        updates = list(self._buffer.values())
+        self._buffer.clear()
+        self._has_updates.clear()
+        return updates
+
+
+class PriceBroadcaster:
+    """
+    Keeps track of stream subscribers and delivers price updates to
+    every subscriber interested in the updated asset and market.
+    """
+
+    def __init__(self, max_buffer_size: int = 1000) -> None:
+        self.max_buffer_size = max_buffer_size
+        self.subscribers: Set[Subscription] = set()
+
+    def subscribe(
+            self,
+            asset_names: Optional[Iterable[str]] = None,
+            markets: Optional[Iterable[str]] = None
+            ) -> Subscription:
+        """Register a new subscriber"""
+        subscription = Subscription(asset_names, markets,
+                                    self.max_buffer_size)
+        self.subscribers.add(subscription)
+        logger.debug(
+            f"Stream subscriber added. Total: {len(self.subscribers)}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove subscriber"""
+        self.subscribers.discard(subscription)
+        logger.debug(
+            f"Stream subscriber removed. Total: {len(self.subscribers)}"
+            f", conflated updates: {subscription.conflated_count}"
+            f", dropped updates: {subscription.dropped_count}")
+
+    def publish(self, asset_price: schemas.AssetPrice) -> None:
+        """Deliver price update to interested subscribers"""
+        for subscription in self.subscribers:
+            if subscription.matches(asset_price.name, asset_price.market):
+                subscription.put(asset_price)
@@ -0,0 +1,279 @@
+"""Deterministic assets manager
+
+Price of an (asset, market) pair at a given moment is a pure function of
+(seed, asset, market, time), so any number of generator replicas return
+identical prices without coordination.
+
+Randomness comes from a counter based generator: every random value is a
+hash of a pair key and a counter, rather than the next value of a shared
+stateful generator.
+
+Time is split into sessions of `2 ** levels` windows, 2 s each
+(`PRICE_SESSION_S` rounded up, about an hour by default). Within a
+session:
+- every window holds exactly one update of a pair, at a pair specific
+  offset within the first second of the window, so intervals between
+  updates of a pair vary from 1 to 3 s
+- price after `n` updates is the open price multiplied by `exp(S_n)`,
+  where `S_n` is the sum of `n` normally distributed log returns. `S_n`
+  is evaluated in O(log n) by Levy (Brownian bridge) construction: the
+  sum over the whole session is split in halves recursively, so there is
+  no need to replay previous updates.
+
+The sum over the whole session is pinned to 0: prices wander during a
+session and return to the open price by its end, so there is no jump
+between sessions and prices stay in a sane range however long replicas
+run.
+"""
+import hashlib
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from decouple import config
+import numpy as np
+
+from .assets_manager import EncodedPrice, RANDOM
+from .vectorized_assets_manager import (
+    MARKET_PRICE_MAX_DIFF, UPDATE_INTERVAL_MAX_S, UPDATE_INTERVAL_MIN_S,
+    VectorizedAssetsManager)
+from ..utils.logger import get_logger
+from ..utils import schemas
+
+
+logger = get_logger(__name__)
+
+
+U64 = np.uint64
+GOLDEN_GAMMA = U64(0x9E3779B97F4A7C15)
+
+UPDATE_WINDOW_S = (UPDATE_INTERVAL_MIN_S + UPDATE_INTERVAL_MAX_S) / 2
+UPDATE_OFFSET_MAX_S = (UPDATE_INTERVAL_MAX_S - UPDATE_INTERVAL_MIN_S) / 2
+MIN_PRICE = 0.0001
+
+# independent random streams of the counter based generator
+STREAM_BASE_PRICE = 1
+STREAM_MARKET_COEF = 2
+STREAM_UPDATE_OFFSET = 3
+STREAM_SPREAD = 4
+STREAM_BRIDGE = 5  # takes two streams: 5 and 6
+
+
+def get_stable_key(*parts) -> int:
+    """64 bit key of provided values, same in every process (unlike
+    built-in `hash` of strings)"""
+    digest = hashlib.blake2b('\x1f'.join(map(str, parts)).encode(),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: bijective avalanche mixing of 64 bit values"""
+    values = (values ^ (values >> U64(30))) * U64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> U64(27))) * U64(0x94D049BB133111EB)
+    return values ^ (values >> U64(31))
+
+
+def counter_uniform(keys: np.ndarray, counters: np.ndarray,
+                    stream: int) -> np.ndarray:
+    """Uniform values in [0, 1): pure function of key, counter and
+    stream"""
+    counters = np.asarray(counters, dtype=U64)
+    values = mix64(keys ^ mix64(counters * GOLDEN_GAMMA + U64(stream)))
+    return (values >> U64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def counter_normal(keys: np.ndarray, counters: np.ndarray,
+                   stream: int) -> np.ndarray:
+    """Standard normal values (Box-Muller), uses streams `stream` and
+    `stream + 1`"""
+    radius = np.sqrt(-2 * np.log1p(-counter_uniform(keys, counters, stream)))
+    angle = 2 * np.pi * counter_uniform(keys, counters, stream + 1)
+    return radius * np.cos(angle)
+
+
+class DeterministicAssetsManager(VectorizedAssetsManager):
+    """
+    Manages assets with prices being a pure function of time.
+
+    Functionality:
+    - Reads price config (shared with `AssetsManager`)
+    - Derives open prices, update moments, prices and spreads of each pair
+      from `PRICE_SEED`, asset and market names and wall clock time only
+    - Updates all pairs whose update moment passed (`update_due`)
+    - Returns prices in the same format as `AssetsManager`
+
+    Replicas with the same config, seed and synchronized clocks return the
+    same price of a pair at the same moment, whatever their start time.
+    """
+
+    # wall clock is shared by replicas, unlike monotonic clock
+    clock = staticmethod(time.time)
+
+    def __init__(self, price_config_file: str, now: Optional[float] = None,
+                 seed: Optional[int] = None):
+        # pylint: disable=W0231
+        self.price_config = self._get_price_config(price_config_file)
+        self.seed = (int(config('PRICE_SEED', default=RANDOM))
+                     if seed is None else seed)
+        # session holds `2 ** levels` updates of each pair
+        self.levels = max(1, math.ceil(math.log2(
+            float(config('PRICE_SESSION_S', default=3600))
+            / UPDATE_WINDOW_S)))
+        self.session_s = UPDATE_WINDOW_S * 2 ** self.levels
+        self.sigma = self.price_config.price_change_max / math.sqrt(3)
+
+        config_ = self.price_config
+        self.pairs = [(asset, market) for asset in sorted(config_.assets)
+                      for market in sorted(config_.markets)]
+        self.pair_ids = {pair: idx for idx, pair in enumerate(self.pairs)}
+        self._encoded_prices: Dict[int, Tuple[int, EncodedPrice]] = {}
+
+        self.pair_keys = np.array(
+            [get_stable_key(self.seed, asset, market)
+             for asset, market in self.pairs], dtype=U64)
+        self.open_prices = self._get_open_prices()
+
+        n_pairs = len(self.pairs)
+        # no session evaluated yet, sessions count from 0
+        self.session = -1
+        self.session_keys = self.pair_keys
+        self.ticks = np.zeros(n_pairs, dtype=np.int64)
+        self.prices = np.zeros(n_pairs, dtype=np.float64)
+        self.spreads = np.zeros(n_pairs, dtype=np.float64)
+        self.versions = np.zeros(n_pairs, dtype=np.int64)
+        self.updated_ats = np.zeros(n_pairs, dtype=np.float64)
+        self.update_due(self.clock() if now is None else now)
+
+
+    def _get_open_prices(self) -> np.ndarray:
+        """Base price of an asset modified by market coefficient, same as
+        `AssetsManager._set_asset_initial_prices` does, but derived from
+        names instead of drawn."""
+        config_ = self.price_config
+        asset_keys = np.array([get_stable_key(self.seed, asset)
+                               for asset, _ in self.pairs], dtype=U64)
+        zeros = np.zeros(len(self.pairs), dtype=U64)
+
+        base_prices = np.round(
+            config_.price_min + (config_.price_max - config_.price_min)
+            * counter_uniform(asset_keys, zeros, STREAM_BASE_PRICE),
+            4)
+        market_coefs = MARKET_PRICE_MAX_DIFF * (
+            2 * counter_uniform(self.pair_keys, zeros, STREAM_MARKET_COEF) - 1)
+        return base_prices * (1 + market_coefs)
+
+
+    def _get_ticks(self, now: float) -> Tuple[int, np.ndarray]:
+        """Return session and number of updates done within the session
+        by each pair at the moment `now`."""
+        session = int(now // self.session_s)
+        if session != self.session:
+            self.session_keys = mix64(
+                self.pair_keys ^ mix64(np.array([session], dtype=U64)))
+
+        time_in_session = now - session * self.session_s
+        window = int(time_in_session // UPDATE_WINDOW_S)
+        offsets = UPDATE_OFFSET_MAX_S * counter_uniform(
+            self.session_keys, np.full(len(self.pairs), window, dtype=U64),
+            STREAM_UPDATE_OFFSET)
+        ticks = window + (time_in_session >= window * UPDATE_WINDOW_S
+                          + offsets)
+        return session, ticks.astype(np.int64)
+
+
+    def _get_log_returns_sum(self, keys: np.ndarray, ticks: np.ndarray
+                             ) -> np.ndarray:
+        """Sum of the first `ticks` log returns of each pair.
+
+        Session is a binary tree of `2 ** levels` updates; every node holds
+        the sum of log returns of its updates, the root is pinned to 0.
+        Descending from the root to update `ticks`, each node is split into
+        halves with a bridge variable, and sums of left halves passed by
+        are accumulated. Session end (`ticks == 2 ** levels`) gets the
+        root sum, 0.
+        """
+        ticks = ticks.astype(U64)
+        node_ids = np.zeros_like(ticks)
+        node_sums = np.zeros(len(ticks), dtype=np.float64)
+        sums = np.zeros(len(ticks), dtype=np.float64)
+
+        for level in range(self.levels, 0, -1):
+            node_counters = node_ids * U64(64) + U64(level)
+            left_sums = (node_sums / 2
+                         + self.sigma * math.sqrt(2.0 ** level) / 2
+                         * counter_normal(keys, node_counters, STREAM_BRIDGE))
+            go_right = ((ticks >> U64(level - 1)) & U64(1)).astype(bool)
+            sums += np.where(go_right, left_sums, 0.0)
+            node_sums = np.where(go_right, node_sums - left_sums, left_sums)
+            node_ids = node_ids * U64(2) + go_right.astype(U64)
+
+        return sums
+
+
+    def _set_prices(self, pair_ids: np.ndarray, ticks: np.ndarray) -> None:
+        """Evaluate prices and spreads of provided pairs at given ticks"""
+        config_ = self.price_config
+        keys = self.session_keys[pair_ids]
+
+        prices = np.round(self.open_prices[pair_ids]
+                          * np.exp(self._get_log_returns_sum(keys, ticks)),
+                          4)
+        prices[prices <= 0] = MIN_PRICE
+        spreads = np.round(
+            config_.spread_min + (config_.spread_max - config_.spread_min)
+            * counter_uniform(keys, ticks, STREAM_SPREAD),
+            1)
+
+        self.prices[pair_ids] = prices
+        self.spreads[pair_ids] = spreads
+        self.ticks[pair_ids] = ticks
+        # same on every replica: session and number of updates within it.
+        # Ticks range over 0..2 ** levels, so session end does not share
+        # the version of the next session start
+        self.versions[pair_ids] = (
+            (self.session << (self.levels + 1)) + ticks)
+        self.updated_ats[pair_ids] = self._get_updated_ats(keys, ticks)
+
+
+    def _get_updated_ats(self, keys: np.ndarray, ticks: np.ndarray
+                         ) -> np.ndarray:
+        """Moments of the latest update of pairs at given ticks: update
+        `ticks` is done in window `ticks - 1` at the pair offset, none
+        done yet means the session start. Same on every replica."""
+        windows = np.maximum(ticks - 1, 0)
+        offsets = UPDATE_OFFSET_MAX_S * counter_uniform(
+            keys, windows, STREAM_UPDATE_OFFSET)
+        return (self.session * self.session_s + windows * UPDATE_WINDOW_S
+                + np.where(ticks > 0, offsets, 0.0))
+
+
+    def update_due(self, now: float) -> np.ndarray:
+        """High level method to update all pairs whose update moment has
+        passed. Returns ids of updated pairs.
+        """
+        session, ticks = self._get_ticks(now)
+        if session != self.session:
+            self.session = session
+            due_ids = np.arange(len(self.pairs))
+        else:
+            due_ids = np.flatnonzero(ticks != self.ticks)
+
+        if due_ids.size:
+            self._set_prices(due_ids, ticks[due_ids])
+        return due_ids
+
+
+    def get_next_update_at(self) -> Optional[float]:
+        """Update moments are derived from time on each call rather than
+        tracked, so there is no deadline to report: the scheduler polls
+        `update_due` every tick."""
+        return None
+
+
+    def update_asset_price(self, asset: schemas.AssetPrice
+                           ) -> schemas.AssetPrice:
+        """Prices can't be advanced arbitrarily: brings all pairs to the
+        current moment and returns current price of the asset."""
+        self.update_due(self.clock())
+        return self._get_asset_price(self.pair_ids[(asset.name, asset.market)])
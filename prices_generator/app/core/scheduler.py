@@ -0,0 +1,135 @@
+"""Price update scheduler
+
+A single background task drives price updates of all pairs, instead of a
+never ending task per pair. Update deadlines are kept by the assets
+manager (a heap in `AssetsManager`, an array in
+`VectorizedAssetsManager`); the scheduler wakes up once the earliest
+deadline is reached, rounded up to the tick granularity, has all due
+pairs updated in one batch and publishes them to stream subscribers.
+"""
+import asyncio
+import math
+from typing import Any, List, Optional, Protocol, Sized
+
+from .broadcaster import PriceBroadcaster
+from ..utils.histogram import LatencyHistogram
+from ..utils.logger import get_logger
+from ..utils import schemas
+
+
+logger = get_logger(__name__)
+
+
+class PriceSource(Protocol):
+    """What the scheduler needs of an assets manager. Updated pairs are
+    ids of the engine: pairs or indices of pairs."""
+
+    def clock(self) -> float: ...
+
+    def update_due(self, now: float) -> Sized: ...
+
+    def get_next_update_at(self) -> Optional[float]: ...
+
+    def get_asset_prices(self, updated: Any
+                         ) -> List[schemas.AssetPrice]: ...
+
+
+class SchedulingLag:
+    """
+    Scheduling lag statistics.
+
+    Lag of a batch is the delay between the earliest deadline of the
+    batch and the moment the batch was updated, i.e. how late the most
+    overdue pair was updated. Lags are counted in a histogram as well,
+    for percentiles.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.last_s = 0.0
+        self.histogram = LatencyHistogram()
+
+    @property
+    def mean_s(self) -> float:
+        return self.total_s / self.count if self.count else 0.0
+
+    def observe(self, lag_s: float) -> None:
+        self.count += 1
+        self.total_s += lag_s
+        self.max_s = max(self.max_s, lag_s)
+        self.last_s = lag_s
+        self.histogram.record(lag_s)
+
+
+class PriceUpdateScheduler:
+    """
+    Updates prices of all due pairs in batches.
+
+    Wakeups are aligned to `tick_s` granularity: pairs due within the same
+    tick are updated together, and the scheduler never wakes up more than
+    once per tick. Engines not tracking deadlines (deterministic, shared)
+    are polled every tick.
+    """
+
+    def __init__(self, assets_manager: PriceSource,
+                 broadcaster: Optional[PriceBroadcaster] = None,
+                 tick_s: float = 0.1,
+                 report_interval_s: float = 60) -> None:
+        self.assets_manager = assets_manager
+        self.broadcaster = broadcaster
+        self.tick_s = tick_s
+        self.report_interval_s = report_interval_s
+        self.lag = SchedulingLag()
+        self.ticks_count = 0
+        self.updates_count = 0
+
+    def run_once(self, now: float) -> int:
+        """Update all pairs due at the moment `now` and publish them.
+        Returns number of updated pairs.
+        """
+        self.ticks_count += 1
+        next_update_at = self.assets_manager.get_next_update_at()
+        updated = self.assets_manager.update_due(now)
+        if not len(updated):
+            return 0
+
+        if next_update_at is not None:
+            self.lag.observe(max(0.0, now - next_update_at))
+        self.updates_count += len(updated)
+
+        if self.broadcaster is not None and self.broadcaster.subscribers:
+            for price in self.assets_manager.get_asset_prices(updated):
+                self.broadcaster.publish(price)
+        return len(updated)
+
+    def get_delay(self, now: float) -> float:
+        """Return time till the next wakeup: till the earliest deadline
+        rounded up to the tick granularity, one tick at least.
+        """
+        next_update_at = self.assets_manager.get_next_update_at()
+        if next_update_at is None:
+            return self.tick_s
+        ticks = math.ceil((next_update_at - now) / self.tick_s)
+        return max(1, ticks) * self.tick_s
+
+    async def run(self) -> None:
+        """Infinite background task updating prices"""
+        clock = self.assets_manager.clock
+        report_at = clock() + self.report_interval_s
+        while True:
+            now = clock()
+            updated_count = self.run_once(now)
+            logger.debug(f"Prices update: {updated_count} assets updated,"
+                         f" scheduling lag {self.lag.last_s:.3f} s")
+
+            if now >= report_at:
+                report_at = now + self.report_interval_s
+                logger.info(
+                    f"Scheduler: {self.updates_count} updates,"
+                    f" scheduling lag mean {self.lag.mean_s:.3f} s,"
+                    f" max {self.lag.max_s:.3f} s,"
+                    f" {self.lag.histogram.format()}")
+
+            await asyncio.sleep(self.get_delay(clock()))
@@ -0,0 +1,304 @@
+"""Shared memory price book
+
+Lets several generator worker processes serve the same prices. A single
+writer process owns prices updates and publishes them into a fixed
+layout table in shared memory; worker processes read from it.
+
+Table layout:
+    header: magic (8 bytes), pairs count (uint64), catalog size (uint64)
+    catalog: JSON list of [asset, market] pairs, padded to 8 bytes
+    seqs: uint64 per pair, seqlock sequence
+    prices: float64 per pair
+    spreads: float64 per pair
+    updated_ats: float64 per pair, Unix time of the latest update
+
+Each row is guarded by a seqlock: the writer makes row sequence odd
+before writing and even after, readers retry until they read the same
+even sequence before and after copying the row.
+"""
+import json
+from multiprocessing import shared_memory
+import signal
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from decouple import config
+import numpy as np
+
+from .assets_manager import EncodedPrice, PricesReader
+from .vectorized_assets_manager import VectorizedAssetsManager
+from ..utils.logger import get_logger
+from ..utils import schemas
+
+
+logger = get_logger(__name__)
+
+
+MAGIC = b'PRBOOK02'
+HEADER_SIZE = 24
+ALIGNMENT = 8
+
+
+class SharedPriceBook:
+    """
+    Fixed layout price table in shared memory.
+
+    Use `create` in the writer process and `attach` in reader processes.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory,
+                 pairs: List[Tuple[str, str]], catalog_size: int) -> None:
+        self.shm = shm
+        self.pairs = pairs
+        n_pairs = len(pairs)
+        offset = HEADER_SIZE + catalog_size
+        self.seqs = np.ndarray((n_pairs,), dtype=np.uint64,
+                               buffer=shm.buf, offset=offset)
+        offset += self.seqs.nbytes
+        self.prices = np.ndarray((n_pairs,), dtype=np.float64,
+                                 buffer=shm.buf, offset=offset)
+        offset += self.prices.nbytes
+        self.spreads = np.ndarray((n_pairs,), dtype=np.float64,
+                                  buffer=shm.buf, offset=offset)
+        offset += self.spreads.nbytes
+        self.updated_ats = np.ndarray((n_pairs,), dtype=np.float64,
+                                      buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, name: str, pairs: List[Tuple[str, str]]
+               ) -> 'SharedPriceBook':
+        """Allocate and initialize a new table for provided pairs"""
+        catalog = json.dumps(pairs).encode()
+        catalog_size = -(-len(catalog) // ALIGNMENT) * ALIGNMENT
+        size = HEADER_SIZE + catalog_size + 4 * 8 * len(pairs)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((2,), dtype=np.uint64, buffer=shm.buf, offset=8)
+        header[:] = (len(pairs), catalog_size)
+        shm.buf[HEADER_SIZE:HEADER_SIZE + len(catalog)] = catalog
+        # magic goes last, so a table is never attached half initialized
+        shm.buf[:8] = MAGIC
+
+        return cls(shm, pairs, catalog_size)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedPriceBook':
+        """Attach to a table created by the writer process.
+        Readers are expected to be started by the same parent as the
+        writer (see `app.multiworker`), so they share its resource
+        tracker and the segment outlives any single reader.
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        if bytes(shm.buf[:8]) != MAGIC:
+            shm.close()
+            raise ValueError(f"Shared memory {name} is not a price book")
+
+        n_pairs, catalog_size = np.ndarray((2,), dtype=np.uint64,
+                                           buffer=shm.buf, offset=8).tolist()
+        catalog = bytes(shm.buf[HEADER_SIZE:HEADER_SIZE + catalog_size])
+        pairs = [tuple(pair) for pair in json.loads(catalog.rstrip(b'\0'))]
+        if len(pairs) != n_pairs:
+            shm.close()
+            raise ValueError(f"Price book {name} catalog is corrupted")
+
+        return cls(shm, pairs, catalog_size)
+
+    def write(self, pair_ids: np.ndarray, prices: np.ndarray,
+              spreads: np.ndarray, updated_at: Optional[float] = None
+              ) -> None:
+        """Publish new prices and spreads of provided pairs, updated at
+        `updated_at` (now by default)"""
+        if updated_at is None:
+            updated_at = time.time()
+        self.seqs[pair_ids] += 1  # odd: rows are being written
+        self.prices[pair_ids] = prices
+        self.spreads[pair_ids] = spreads
+        self.updated_ats[pair_ids] = updated_at
+        self.seqs[pair_ids] += 1  # even: rows are consistent
+
+    def read(self, idx: int) -> Tuple[float, float, int, float]:
+        """Consistent read of a single pair. Returns price, spread,
+        version, i.e. number of updates of the pair, and update time.
+        """
+        while True:
+            seq = int(self.seqs[idx])
+            if not seq % 2:
+                price = float(self.prices[idx])
+                spread = float(self.spreads[idx])
+                updated_at = float(self.updated_ats[idx])
+                if int(self.seqs[idx]) == seq:
+                    return price, spread, seq // 2, updated_at
+            # the writer is in the middle of an update, let it finish
+            time.sleep(0)
+
+    def read_many(self, pair_ids: List[int]
+                  ) -> Tuple[List[float], List[float], List[int],
+                             List[float]]:
+        """Consistent read of several pairs. Rows are copied in bulk and
+        only rows changed meanwhile are read once again one by one.
+        Returns prices, spreads, versions and update times.
+        """
+        seqs = self.seqs[pair_ids]
+        prices = self.prices[pair_ids].tolist()
+        spreads = self.spreads[pair_ids].tolist()
+        updated_ats = self.updated_ats[pair_ids].tolist()
+        torn = np.flatnonzero((seqs % 2 == 1) | (self.seqs[pair_ids] != seqs))
+        versions = (seqs // 2).tolist()
+        for position in torn.tolist():
+            (prices[position], spreads[position], versions[position],
+             updated_ats[position]) = self.read(pair_ids[position])
+        return prices, spreads, versions, updated_ats
+
+    def close(self) -> None:
+        """Detach from the table"""
+        # drop views to the buffer, otherwise it can't be released
+        del self.seqs, self.prices, self.spreads, self.updated_ats
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """Destroy the table. Done by the writer on exit"""
+        self.shm.unlink()
+
+
+class SharedBookAssetsManager(PricesReader):
+    """
+    Read only assets manager of a generator worker process.
+
+    Serves prices published to the shared memory price book by the
+    writer process (see `run_price_book_writer`), so all workers return
+    the same prices. Reads prices with the same API as
+    `VectorizedAssetsManager`, but has no API to update them:
+    `update_due` reports pairs updated by the writer since the previous
+    call instead.
+    """
+
+    def __init__(self, price_config_file: str,
+                 book_name: Optional[str] = None):
+        self.price_config = self._get_price_config(price_config_file)
+        self.book = SharedPriceBook.attach(
+            book_name or config('PRICE_BOOK_NAME'))
+        self.pairs = self.book.pairs
+        self.pair_ids = {pair: idx for idx, pair in enumerate(self.pairs)}
+        # pair id -> (version, payload), see `get_encoded_price`
+        self._encoded_prices: Dict[int, Tuple[int, EncodedPrice]] = {}
+        self._seen_seqs = self.book.seqs.copy()
+
+
+    @property
+    def prices_dict(self) -> Dict[Tuple[str, str], schemas.AssetPrice]:
+        """Materialize current prices in `AssetsManager.prices_dict`
+        format. Intended for inspection, not for the hot path.
+        """
+        return {pair: self._get_asset_price(idx)
+                for pair, idx in self.pair_ids.items()}
+
+
+    def _get_asset_price(self, idx: int) -> schemas.AssetPrice:
+        asset_name, market = self.pairs[idx]
+        price, spread, version, updated_at = self.book.read(idx)
+        return schemas.AssetPrice(name=asset_name, market=market,
+                                  price=price, spread=spread,
+                                  version=version, updated_at=updated_at)
+
+
+    def update_due(self, now: float) -> np.ndarray:
+        """Return ids of pairs updated by the writer since previous call"""
+        seqs = self.book.seqs.copy()
+        updated_ids = np.flatnonzero(seqs != self._seen_seqs)
+        self._seen_seqs = seqs
+        return updated_ids
+
+
+    def get_next_update_at(self) -> Optional[float]:
+        """Deadlines are tracked by the writer process, so the scheduler
+        polls `update_due` every tick."""
+        return None
+
+
+    def get_asset_prices(self, pair_ids: np.ndarray
+                         ) -> List[schemas.AssetPrice]:
+        """Return current prices of provided pairs"""
+        return [self._get_asset_price(idx) for idx in pair_ids.tolist()]
+
+
+    def get_curr_asset_price(
+            self, asset: schemas.Asset) -> Optional[schemas.AssetPrice]:
+        idx = self.pair_ids.get((asset.name, asset.market), None)
+        if idx is None:
+            return None
+        return self._get_asset_price(idx)
+
+
+    def get_encoded_price(self, asset_name: str, market: str
+                          ) -> Optional[bytes]:
+        """Return pre-serialized price quote, re-encoded on the first read
+        after the writer updated the pair.
+        """
+        idx = self.pair_ids.get((asset_name, market), None)
+        if idx is None:
+            return None
+
+        price, spread, version, updated_at = self.book.read(idx)
+        cached = self._encoded_prices.get(idx, None)
+        if cached is None or cached[0] != version:
+            cached = (version, self._encode_price(schemas.AssetPrice(
+                name=asset_name, market=market, price=price, spread=spread,
+                version=version, updated_at=updated_at)))
+            self._encoded_prices[idx] = cached
+        return self._with_quote_id(cached[1])
+
+
+    def get_prices_snapshot(
+            self,
+            asset_names: Optional[Iterable[str]] = None,
+            markets: Optional[Iterable[str]] = None
+            ) -> List[schemas.AssetPrice]:
+        """Return current prices of requested assets and markets, all pairs
+        if no filter provided. Each price is read consistently, but pairs
+        may come from different writer ticks.
+        """
+        pairs = [pair for pair in self._select_pairs(asset_names, markets)
+                 if pair in self.pair_ids]
+        prices, spreads, versions, updated_ats = self.book.read_many(
+            [self.pair_ids[pair] for pair in pairs])
+
+        return [schemas.AssetPrice(name=asset_name, market=market,
+                                   price=price, spread=spread,
+                                   version=version, updated_at=updated_at)
+                for (asset_name, market), price, spread, version, updated_at
+                in zip(pairs, prices, spreads, versions, updated_ats)]
+
+
+def run_price_book_writer(price_config_file: str, book_name: str,
+                          tick_s: float, ready=None) -> None:
+    """Entry point of the writer process. Creates the price book, then
+    updates prices with the vectorized engine and publishes every batch
+    until terminated. `ready` event is set once the book can be attached.
+    """
+    # exit via SystemExit on termination, so the book gets unlinked
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    assets_manager = VectorizedAssetsManager(price_config_file)
+    book = SharedPriceBook.create(book_name, assets_manager.pairs)
+    book.prices[:] = assets_manager.prices
+    book.spreads[:] = assets_manager.spreads
+    book.updated_ats[:] = assets_manager.updated_ats
+    logger.info(f"Price book {book_name} created for"
+                f" {len(assets_manager.pairs)} assets")
+    if ready is not None:
+        ready.set()
+
+    try:
+        while True:
+            updated_ids = assets_manager.update_due(assets_manager.clock())
+            if updated_ids.size:
+                book.write(updated_ids,
+                           assets_manager.prices[updated_ids],
+                           assets_manager.spreads[updated_ids],
+                           float(assets_manager.updated_ats[updated_ids[0]]))
+            time.sleep(tick_s)
+    finally:
+        book.close()
+        book.unlink()
+        logger.info(f"Price book {book_name} removed")
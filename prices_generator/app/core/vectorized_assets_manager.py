@@ -0,0 +1,219 @@
+"""Vectorized assets manager
+
+Keeps prices and spreads of every (asset, market) pair in contiguous
+NumPy arrays (struct-of-arrays indexed by pair id) and advances all pairs
+that are due in a tick with a single batched random draw.
+"""
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .assets_manager import EncodedPrice, PricesReader, RANDOM
+from ..utils.logger import get_logger
+from ..utils import schemas
+
+
+logger = get_logger(__name__)
+
+
+MARKET_PRICE_MAX_DIFF = 0.03
+UPDATE_INTERVAL_MIN_S = 1
+UPDATE_INTERVAL_MAX_S = 3
+
+
+class VectorizedAssetsManager(PricesReader):
+    """
+    Manages assets using NumPy arrays instead of a model per pair.
+
+    Functionality:
+    - Reads price config (shared with `AssetsManager`, see `PricesReader`)
+    - Initializes prices of all pairs in bulk
+    - Tracks next update deadline of each pair, so every pair keeps its
+      own irregular 1-3 s update cadence
+    - Updates all pairs due at a given moment in one batch
+    - Returns prices in the same format as `AssetsManager`
+    """
+
+    def __init__(self, price_config_file: str, now: Optional[float] = None):
+        self.price_config = self._get_price_config(price_config_file)
+        self.rng = np.random.default_rng(RANDOM)
+        self.pairs: List[Tuple[str, str]] = []
+        self.pair_ids: Dict[Tuple[str, str], int] = {}
+        # pair id -> (version, payload), see `get_encoded_price`
+        self._encoded_prices: Dict[int, Tuple[int, EncodedPrice]] = {}
+        self._construct_price_arrays(self.clock() if now is None else now)
+
+
+    def _construct_price_arrays(self, now: float) -> None:
+        """Generate price for each asset for each market in bulk.
+        Base price is generated per asset and then modified by a market
+        coefficient, same as `AssetsManager._set_asset_initial_prices`.
+        """
+        config = self.price_config
+        assets = list(config.assets)
+        markets = list(config.markets)
+
+        self.pairs = [(asset, market)
+                      for asset in assets for market in markets]
+        self.pair_ids = {pair: idx for idx, pair in enumerate(self.pairs)}
+
+        base_prices = np.round(
+            config.price_min
+            + (config.price_max - config.price_min)
+            * self.rng.random(len(assets)),
+            4)
+        market_coefs = self.rng.uniform(
+            -MARKET_PRICE_MAX_DIFF, MARKET_PRICE_MAX_DIFF,
+            size=(len(assets), len(markets)))
+
+        self.prices = (base_prices[:, None] * (1 + market_coefs)).ravel()
+        self.spreads = np.round(
+            self.rng.uniform(config.spread_min, config.spread_max,
+                             size=len(self.pairs)),
+            1)
+        # every pair is due right away, as the per pair update loop does
+        # an update before its first sleep
+        self.next_update_at = np.full(len(self.pairs), now, dtype=np.float64)
+        # incremented on each update of a pair
+        self.versions = np.zeros(len(self.pairs), dtype=np.int64)
+        # Unix time of the latest update of each pair
+        self.updated_ats = np.full(len(self.pairs), time.time(),
+                                   dtype=np.float64)
+
+
+    @property
+    def prices_dict(self) -> Dict[Tuple[str, str], schemas.AssetPrice]:
+        """Materialize current prices in `AssetsManager.prices_dict`
+        format. Intended for inspection, not for the hot path.
+        """
+        return {pair: self._get_asset_price(idx)
+                for pair, idx in self.pair_ids.items()}
+
+
+    def _get_asset_price(self, idx: int) -> schemas.AssetPrice:
+        asset_name, market = self.pairs[idx]
+        return schemas.AssetPrice(
+            name=asset_name,
+            market=market,
+            price=float(self.prices[idx]),
+            spread=float(self.spreads[idx]),
+            version=int(self.versions[idx]),
+            updated_at=float(self.updated_ats[idx]))
+
+
+    def _advance(self, pair_ids: np.ndarray, now: float) -> None:
+        """Update prices, spreads and next update deadlines of provided
+        pairs with a single random draw.
+        If a resulting price is less or equal to 0, it is recalculated
+        applying maximum allowed positive coefficient instead, same as
+        `AssetsManager._get_new_price`.
+        """
+        config = self.price_config
+        price_change_max = config.price_change_max
+        draws = self.rng.random((3, pair_ids.size))
+
+        curr_prices = self.prices[pair_ids]
+        price_coefs = price_change_max * (2 * draws[0] - 1)
+        new_prices = np.round(curr_prices * (1 + price_coefs), 4)
+        clamped = new_prices <= 0
+        new_prices[clamped] = curr_prices[clamped] * (1 + price_change_max)
+
+        new_spreads = np.round(
+            config.spread_min
+            + (config.spread_max - config.spread_min) * draws[1],
+            1)
+        sleep_durations = np.round(
+            UPDATE_INTERVAL_MIN_S
+            + (UPDATE_INTERVAL_MAX_S - UPDATE_INTERVAL_MIN_S) * draws[2],
+            1)
+
+        self.prices[pair_ids] = new_prices
+        self.spreads[pair_ids] = new_spreads
+        self.next_update_at[pair_ids] = now + sleep_durations
+        self.versions[pair_ids] += 1
+        self.updated_ats[pair_ids] = time.time()
+
+
+    def update_due(self, now: float) -> np.ndarray:
+        """High level method to update all pairs whose update deadline has
+        passed. Returns ids of updated pairs.
+        """
+        due_ids = np.flatnonzero(self.next_update_at <= now)
+        if due_ids.size:
+            self._advance(due_ids, now)
+        return due_ids
+
+
+    def get_next_update_at(self) -> Optional[float]:
+        """Return the earliest update deadline, None if there are no
+        pairs"""
+        if not self.pairs:
+            return None
+        return float(self.next_update_at.min())
+
+
+    def update_asset_price(self, asset: schemas.AssetPrice
+                           ) -> schemas.AssetPrice:
+        """Update a single pair. Kept for compatibility with
+        `AssetsManager`; batch updates are done with `update_due`.
+        """
+        idx = self.pair_ids[(asset.name, asset.market)]
+        self._advance(np.array([idx]), float(self.next_update_at[idx]))
+        return self._get_asset_price(idx)
+
+
+    def get_asset_prices(self, pair_ids: np.ndarray
+                         ) -> List[schemas.AssetPrice]:
+        """Return current prices of provided pairs"""
+        return [self._get_asset_price(idx) for idx in pair_ids.tolist()]
+
+
+    def get_curr_asset_price(
+            self, asset: schemas.Asset) -> Optional[schemas.AssetPrice]:
+        idx = self.pair_ids.get((asset.name, asset.market), None)
+        if idx is None:
+            return None
+        return self._get_asset_price(idx)
+
+
+    def get_encoded_price(self, asset_name: str, market: str
+                          ) -> Optional[bytes]:
+        """Return pre-serialized price quote. Payloads are encoded on the
+        first read after an update rather than on every update, so pairs
+        nobody requests cost nothing per tick.
+        """
+        idx = self.pair_ids.get((asset_name, market), None)
+        if idx is None:
+            return None
+
+        version = int(self.versions[idx])
+        cached = self._encoded_prices.get(idx, None)
+        if cached is None or cached[0] != version:
+            cached = (version, self._encode_price(self._get_asset_price(idx)))
+            self._encoded_prices[idx] = cached
+        return self._with_quote_id(cached[1])
+
+
+    def get_prices_snapshot(
+            self,
+            asset_names: Optional[Iterable[str]] = None,
+            markets: Optional[Iterable[str]] = None
+            ) -> List[schemas.AssetPrice]:
+        """Return current prices of requested assets and markets, all pairs
+        if no filter provided. Prices are copied out of the arrays in bulk
+        before any model is constructed.
+        """
+        pairs = [pair for pair in self._select_pairs(asset_names, markets)
+                 if pair in self.pair_ids]
+        pair_ids = [self.pair_ids[pair] for pair in pairs]
+        prices = self.prices[pair_ids].tolist()
+        spreads = self.spreads[pair_ids].tolist()
+        versions = self.versions[pair_ids].tolist()
+        updated_ats = self.updated_ats[pair_ids].tolist()
+
+        return [schemas.AssetPrice(name=asset_name, market=market,
+                                   price=price, spread=spread,
+                                   version=version, updated_at=updated_at)
+                for (asset_name, market), price, spread, version, updated_at
+                in zip(pairs, prices, spreads, versions, updated_ats)]
@@ -0,0 +1,63 @@
+"""Multi-worker prices generator launcher
+
+Runs the generator on all cores of a host while keeping prices
+consistent across worker processes:
+- a single writer process updates prices and publishes them into a
+  shared memory price book
+- `GENERATOR_WORKERS` uvicorn worker processes serve API requests reading
+  prices from the book (`PRICE_ENGINE=shared`)
+
+Usage (from `prices_generator` folder):
+    python -m app.multiworker
+"""
+import multiprocessing
+import os
+
+from decouple import config
+import uvicorn
+
+from .core.shared_price_book import run_price_book_writer
+from .utils.logger import get_logger
+from .utils.utils import get_config_filepath
+
+
+logger = get_logger(__name__)
+
+WRITER_STARTUP_TIMEOUT_S = 30
+
+
+def main() -> None:
+    """Starts price book writer process, then uvicorn workers attached
+    to the book. The writer is terminated once uvicorn exits.
+    """
+    workers = int(config('GENERATOR_WORKERS', default=os.cpu_count() or 1))
+    host = config('GENERATOR_HOST', default='0.0.0.0')
+    port = int(config('GENERATOR_PORT', default=8000))
+    tick_s = float(config('PRICE_ENGINE_TICK_S', default=0.1))
+    book_name = config('PRICE_BOOK_NAME', default=f"prices_book_{os.getpid()}")
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    writer = context.Process(
+        target=run_price_book_writer,
+        args=(get_config_filepath(), book_name, tick_s, ready),
+        name='price_book_writer',
+        daemon=True)
+    writer.start()
+    if not ready.wait(timeout=WRITER_STARTUP_TIMEOUT_S):
+        writer.terminate()
+        raise RuntimeError("Price book writer failed to start")
+
+    # inherited by uvicorn worker processes
+    os.environ['PRICE_ENGINE'] = 'shared'
+    os.environ['PRICE_BOOK_NAME'] = book_name
+    logger.info(f"Starting {workers} workers reading price book {book_name}")
+    try:
+        uvicorn.run('app.app:app', host=host, port=port, workers=workers)
+    finally:
+        writer.terminate()
+        writer.join()
+
+
+if __name__ == '__main__':
+    main()
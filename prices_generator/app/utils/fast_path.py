@@ -0,0 +1,56 @@
+"""Raw ASGI fast path for price requests"""
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class PriceFastPathMiddleware:
+    """
+    Serves `GET /price` of a known asset and market pair with the
+    pre-encoded price quote of assets manager, bypassing routing, input
+    validation and response serialization.
+
+    Any other request, including ones with missing parameters or unknown
+    pairs, is passed to the application, so error responses stay exactly
+    the same.
+    """
+
+    def __init__(self, app: ASGIApp, path: str = '/price') -> None:
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send
+                       ) -> None:
+        if (scope['type'] == 'http'
+                and scope['path'] == self.path
+                and scope['method'] == 'GET'):
+            payload = self._get_payload(scope)
+            if payload is not None:
+                await send({
+                    'type': 'http.response.start',
+                    'status': 200,
+                    'headers': [
+                        (b'content-type', b'application/json'),
+                        (b'content-length', str(len(payload)).encode()),
+                    ],
+                })
+                await send({'type': 'http.response.body', 'body': payload})
+                return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _get_payload(scope: Scope) -> Optional[bytes]:
+        """Look up pre-encoded price quote of requested asset and market.
+        Query string is parsed the same way as Starlette does it.
+        """
+        query_params = dict(parse_qsl(scope['query_string'].decode('latin-1'),
+                                      keep_blank_values=True))
+        asset_name = query_params.get('asset_name', None)
+        market = query_params.get('market', None)
+        if asset_name is None or market is None:
+            return None
+
+        assets_manager = scope['app'].state.assets_manager
+        return assets_manager.get_encoded_price(asset_name, market)
@@ -0,0 +1,111 @@
+"""
+Latency Histogram Module
+
+HDR style histogram: values are counted in log-linear buckets, linear
+within each power of two, so percentiles keep the same relative
+precision from microseconds to minutes with a few hundred buckets at
+most, and recording is O(1).
+
+Deliberate copy of `prices_analyzer/app/utils/histogram.py`: each Docker
+image ships only its own `app` package, so the apps share no code.
+Keep both copies in sync.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+
+DEFAULT_PERCENTILES = (50, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations in seconds.
+
+    Values are recorded in `unit_s` units; each power of two range is
+    split into `2 ** (precision_bits - 1)` buckets, so reported values
+    are within `2 ** -(precision_bits - 1)` of recorded ones (below 2%
+    by default). Buckets are kept sparse, only the ones hit take memory.
+    """
+
+    def __init__(self, unit_s: float = 1e-6, precision_bits: int = 7
+                 ) -> None:
+        self.unit_s = unit_s
+        self.precision_bits = precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def _get_index(self, value: int) -> int:
+        """Bucket of a value in units"""
+        shift = value.bit_length() - self.precision_bits
+        if shift <= 0:
+            return value
+        return (shift << (self.precision_bits - 1)) + (value >> shift)
+
+    def _get_value(self, index: int) -> int:
+        """Middle of a bucket in units"""
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return ((index - shift * self._half) << shift) + (1 << shift) // 2
+
+    def record(self, value_s: float) -> None:
+        """Count a duration. Negative ones, e.g. due to clock skew, are
+        counted as zero."""
+        value_s = max(value_s, 0.0)
+        index = self._get_index(int(value_s / self.unit_s))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_s += value_s
+        if value_s > self.max_s:
+            self.max_s = value_s
+
+    @property
+    def mean_s(self) -> float:
+        """Mean of recorded durations"""
+        return self.total_s / self.count if self.count else 0.0
+
+    def get_percentiles(
+            self, percentiles: Iterable[float] = DEFAULT_PERCENTILES
+            ) -> List[float]:
+        """Durations below which the given percent of values fall, 0 if
+        nothing was recorded"""
+        percentiles = list(percentiles)
+        if not self.count:
+            return [0.0] * len(percentiles)
+
+        buckets = sorted(self.counts.items())
+        values = []
+        for percentile in percentiles:
+            rank = max(1, percentile / 100 * self.count)
+            seen = 0
+            for index, count in buckets:
+                seen += count
+                if seen >= rank:
+                    break
+            values.append(min(self._get_value(index) * self.unit_s,
+                              self.max_s))
+        return values
+
+    def get_buckets(self) -> List[Tuple[float, int]]:
+        """Upper bound in seconds and count of each non-empty bucket,
+        ascending"""
+        buckets = []
+        for index, count in sorted(self.counts.items()):
+            if index < 2 * self._half:
+                upper = index + 1
+            else:
+                shift = index // self._half - 1
+                upper = (index - shift * self._half + 1) << shift
+            buckets.append((upper * self.unit_s, count))
+        return buckets
+
+    def format(self, percentiles: Iterable[float] = DEFAULT_PERCENTILES
+               ) -> str:
+        """Percentiles in milliseconds, e.g. `p50 1.2 p99 8.0 ms (n=10)`"""
+        percentiles = list(percentiles)
+        values = self.get_percentiles(percentiles)
+        return (" ".join(f"p{percentile:g} {value * 1000:.1f}"
+                         for percentile, value in zip(percentiles, values))
+                + f" ms (n={self.count})")
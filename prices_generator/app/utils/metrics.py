@@ -0,0 +1,136 @@
+"""
+Metrics Module
+
+Exposes runtime statistics in Prometheus text format. Components keep
+their statistics in plain counters updated in place (e.g. `count += 1`),
+the registry only knows how to read them: samples are collected and
+formatted on scrape, so the hot path never touches the registry.
+
+Deliberate copy of `prices_analyzer/app/utils/metrics.py`, less its
+`serve_metrics`: each Docker image ships only its own `app` package, so
+the apps share no code. Keep the common part of both copies in sync.
+"""
+import asyncio
+import math
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .histogram import LatencyHistogram
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SUMMARY_QUANTILES = (0.5, 0.99, 0.999)
+
+Labels = Dict[str, str]
+# label values and value of each sample of a metric; a `LatencyHistogram`
+# for summaries
+Samples = Iterable[Tuple[Labels, Any]]
+
+
+def format_value(value: Any) -> str:
+    """Sample value as Prometheus expects it"""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    # enough for durations in microseconds, without float noise
+    return f"{value:.9g}"
+
+
+def format_labels(labels: Labels) -> str:
+    """`{name="value",...}` with values escaped, empty if there are no
+    labels"""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{escape_label_value(str(value))}"'
+        for name, value in labels.items()) + '}'
+
+
+def escape_label_value(value: str) -> str:
+    """Escape backslashes, quotes and line breaks"""
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class MetricsRegistry:
+    """
+    Metrics read from components on scrape.
+
+    `add` registers a metric with a callable returning its samples,
+    `add_value` a metric with a single unlabelled sample. Kinds are
+    `counter`, `gauge` and `summary`; summaries are read from
+    `LatencyHistogram`s and reported with `SUMMARY_QUANTILES`, sum and
+    count.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Tuple[str, str, Callable[[], Samples]]] = {}
+
+    def add(self, name: str, kind: str, documentation: str,
+            collect: Callable[[], Samples]) -> None:
+        """Register a metric, replacing one with the same name"""
+        if kind not in ('counter', 'gauge', 'summary'):
+            raise ValueError(f"Unknown metric kind: {kind}")
+        self._metrics[name] = (kind, documentation, collect)
+
+    def add_value(self, name: str, kind: str, documentation: str,
+                  get_value: Callable[[], Any]) -> None:
+        """Register a metric with a single sample without labels"""
+        self.add(name, kind, documentation, lambda: [({}, get_value())])
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        lines: List[str] = []
+        for name, (kind, documentation, collect) in self._metrics.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in collect():
+                if kind == 'summary':
+                    lines.extend(self._render_summary(name, labels, value))
+                else:
+                    lines.append(f"{name}{format_labels(labels)}"
+                                 f" {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_summary(name: str, labels: Labels,
+                        histogram: LatencyHistogram) -> List[str]:
+        """Quantiles, sum and count samples of a histogram"""
+        values = histogram.get_percentiles(
+            quantile * 100 for quantile in SUMMARY_QUANTILES)
+        lines = [
+            f"{name}{format_labels({**labels, 'quantile': str(quantile)})}"
+            f" {format_value(value)}"
+            for quantile, value in zip(SUMMARY_QUANTILES, values)]
+        lines.append(f"{name}_sum{format_labels(labels)}"
+                     f" {format_value(histogram.total_s)}")
+        lines.append(f"{name}_count{format_labels(labels)}"
+                     f" {format_value(histogram.count)}")
+        return lines
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag: how late a periodic wakeup every `interval_s` is.
+    A lagging loop delays every request and update it serves, so this is
+    the queueing delay of work waiting for the loop.
+    """
+
+    def __init__(self, interval_s: float = 0.1) -> None:
+        self.interval_s = interval_s
+        self.histogram = LatencyHistogram()
+        self.last_s = 0.0
+
+    async def run(self) -> None:
+        """Measure lag until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval_s)
+            self.last_s = max(0.0, loop.time() - started - self.interval_s)
+            self.histogram.record(self.last_s)
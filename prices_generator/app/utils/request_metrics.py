@@ -0,0 +1,91 @@
+"""Raw ASGI middleware counting requests and their durations"""
+import time
+from typing import Dict, Iterable, List
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .histogram import LatencyHistogram
+
+
+OTHER_PATH = 'other'
+
+
+class RequestStats:
+    """
+    Requests by path and response status, and durations from the request
+    till the response start by path.
+
+    Only `paths` are tracked separately, the others are counted under
+    `other`, so unknown URLs can't grow the number of series.
+    """
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        self.paths = [*paths, OTHER_PATH]
+        # path -> status -> count
+        self.counts: Dict[str, Dict[int, int]] = {
+            path: {} for path in self.paths}
+        self.durations: Dict[str, LatencyHistogram] = {
+            path: LatencyHistogram() for path in self.paths}
+
+
+async def released_send(message: Message) -> None:
+    """`send` of an `ObservedSend` waiting in the pool for a request"""
+    raise RuntimeError('send of a finished request')
+
+
+class ObservedSend:
+    """
+    `send` of a request, counting the response status and duration into
+    counters of the request path once the response starts.
+
+    Kept for reuse by `RequestMetricsMiddleware` after the request is
+    done, so recording a request allocates no wrapper.
+    """
+    __slots__ = ('send', 'counts', 'durations', 'started')
+
+    def __init__(self) -> None:
+        self.send: Send = released_send
+        self.counts: Dict[int, int] = {}
+        self.durations = LatencyHistogram()
+        self.started = 0.0
+
+    async def __call__(self, message: Message) -> None:
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.durations.record(time.perf_counter() - self.started)
+        await self.send(message)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records every HTTP request into `RequestStats` once its response
+    starts. Wraps the raw ASGI fast path as well, if added after it.
+
+    `send` of each request is wrapped with an `ObservedSend` taken from
+    a pool, so there is no per request closure.
+    """
+
+    def __init__(self, app: ASGIApp, stats: RequestStats) -> None:
+        self.app = app
+        self.stats = stats
+        self._free: List[ObservedSend] = []
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send
+                       ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        observed = self._free.pop() if self._free else ObservedSend()
+        counts = self.stats.counts
+        path = scope['path'] if scope['path'] in counts else OTHER_PATH
+        observed.counts = counts[path]
+        observed.durations = self.stats.durations[path]
+        observed.send = send
+        observed.started = time.perf_counter()
+        try:
+            await self.app(scope, receive, observed)
+        finally:
+            observed.send = released_send
+            self._free.append(observed)
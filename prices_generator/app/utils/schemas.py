@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List
 from uuid import UUID, uuid4
 
@@ -13,13 +13,29 @@ class PriceBase(BaseModel):
 
 
 class AssetPrice(PriceBase, Asset):
-    pass
+    # immutable, updates replace the whole object
+    model_config = ConfigDict(frozen=True)
+    # number of updates of the pair, changes with the price only
+    version: int = 0
+    # Unix time of the latest update of the pair
+    updated_at: float = 0.0
 
 
 class PriceQuoteOut(AssetPrice):
     price_quote_id: UUID = Field(default_factory=uuid4)
 
 
+class PricesOut(BaseModel):
+    prices: List[PriceQuoteOut]
+
+
+class CatalogOut(BaseModel):
+    assets: List[str]
+    markets: List[str]
+    # changes only when the catalog does, same on every replica
+    version: str
+
+
 class PriceConfig(BaseModel):
     assets: List[str]
     markets: List[str]
@@ -0,0 +1,30 @@
+"""Raw ASGI middleware tagging responses with the serving replica"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class ServerIdMiddleware:
+    """
+    Adds `X-Server-Id` header to every HTTP response, so clients behind a
+    load balancer can tell which replica served them.
+
+    Headers are appended to the response start message as is, so it
+    also covers responses of the raw ASGI fast path.
+    """
+
+    def __init__(self, app: ASGIApp, server_id: str) -> None:
+        self.app = app
+        self.header = (b'x-server-id', server_id.encode())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send
+                       ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_server_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [
+                    *message.get('headers', []), self.header]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_server_id)
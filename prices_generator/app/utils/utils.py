@@ -1,15 +1,27 @@
+import hashlib
+import json
 import os
+from typing import Optional
+
+from decouple import config
 import yaml
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+# LibYAML based loader is several times faster, if PyYAML is built with it
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# compiled catalogs location, next to source catalogs by default
+catalog_cache_dir = config('CATALOG_CACHE_DIR', default='')
+
+
 def load_yaml_file(file_path: str) -> dict:
     """Reads yaml file."""
     try:
         with open(file_path, 'r') as file:
-            return yaml.safe_load(file)
+            return yaml.load(file, Loader=YAML_LOADER)
     except FileNotFoundError:
         logger.error(f"Config file not found: {file_path}")
         raise
@@ -21,15 +33,70 @@ def load_yaml_file(file_path: str) -> dict:
         raise
 
 
-def get_config_filepath():
-    """Helper function to get absolute price_config location."""
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    config_filepath = os.path.join(base_dir, 'config', 'price_config.yaml')
-    return config_filepath
+def load_catalog_file(file_path: str,
+                      cache_dir: Optional[str] = None) -> list:
+    """Reads yaml catalog (list of assets or markets) through a compiled
+    cache. Parsed catalog is stored as JSON named after the hash of the
+    source file content, so an edited catalog is parsed once again and
+    an unchanged one is just JSON decoded.
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        logger.error(f"Catalog file not found: {file_path}")
+        raise
 
+    cache_dir = (cache_dir or catalog_cache_dir
+                 or os.path.join(os.path.dirname(file_path), '.catalog_cache'))
+    file_name = os.path.basename(file_path)
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{file_name}.{digest}.json")
 
+    try:
+        with open(cache_path, 'rb') as file:
+            return json.loads(file.read())
+    except OSError:
+        # not compiled yet or cache location is unavailable
+        pass
+    except ValueError as e:
+        logger.warning(f"Corrupted catalog cache {cache_path}: {e}")
+
+    try:
+        catalog = yaml.load(content, Loader=YAML_LOADER)
+    except yaml.YAMLError as e:
+        logger.error(f"Failed to parse YAML file {file_path}: {e}")
+        raise
+
+    _write_catalog_cache(cache_path, catalog)
+    return catalog
 
 
+def _write_catalog_cache(cache_path: str, catalog: list) -> None:
+    """Store compiled catalog and remove outdated ones of the same source.
+    Cache is optional: a read only location only costs a slower start.
+    """
+    cache_dir, cache_name = os.path.split(cache_path)
+    file_name = cache_name.rsplit('.', 2)[0]
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'w') as file:
+            json.dump(catalog, file)
+        # atomic, so concurrently starting workers never read a partial file
+        os.replace(tmp_path, cache_path)
 
+        for outdated_name in os.listdir(cache_dir):
+            if (outdated_name.startswith(f"{file_name}.")
+                    and outdated_name.endswith('.json')
+                    and outdated_name != cache_name):
+                os.remove(os.path.join(cache_dir, outdated_name))
+    except OSError as e:
+        logger.warning(f"Catalog cache {cache_path} is not writable: {e}")
 
 
+def get_config_filepath():
+    """Helper function to get absolute price_config location."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    config_filepath = os.path.join(base_dir, 'config', 'price_config.yaml')
+    return config_filepath
@@ -0,0 +1,119 @@
+"""Benchmark of `/price` endpoint read path
+
+Compares the previous handler, dispatching every lookup to a 10 workers
+thread pool, the `get_price` route served directly on the event loop, and
+the raw ASGI fast path returning pre-encoded price quotes. Requests are
+sent in-process through ASGI transport while prices update loops are
+running, so numbers reflect application overhead only, without network
+and Nginx.
+
+Usage (from `prices_generator` folder):
+    python -m benchmarks.bench_price_endpoint [requests] [concurrency]
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import time
+from typing import List, Tuple
+
+from fastapi import FastAPI, HTTPException, status
+import httpx
+
+from app import app as generator
+from app.core import assets_manager, broadcaster
+from app.utils import schemas
+from app.utils.utils import get_config_filepath
+
+
+def build_executor_app(manager: assets_manager.AssetsManager) -> FastAPI:
+    """Replicates `/price` handler as it was before removal of the thread
+    pool hop."""
+    executor_app = FastAPI()
+    thread_pool = ThreadPoolExecutor(max_workers=10)
+
+    # the price is serialized into a quote, as the real route does it
+    @executor_app.get('/price', response_model=schemas.PriceQuoteOut)
+    async def get_price(asset_name, market) -> schemas.AssetPrice:
+        asset = schemas.Asset(name=asset_name, market=market)
+        price_data = await asyncio.get_event_loop().run_in_executor(
+            thread_pool, manager.get_curr_asset_price, asset)
+        if price_data is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail='Asset and market pair not found')
+        return price_data
+
+    return executor_app
+
+
+def build_route_app() -> FastAPI:
+    """Serves `/price` with `get_price` route only, without fast path."""
+    route_app = FastAPI()
+    route_app.add_api_route('/price', generator.get_price)
+    return route_app
+
+
+async def run_load(
+        asgi_app, pairs: List[Tuple[str, str]],
+        n_requests: int, concurrency: int
+        ) -> Tuple[float, List[float]]:
+    """Send `n_requests` spread over `concurrency` concurrent clients.
+    Returns requests per second and latencies of each request.
+    """
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=asgi_app)
+
+    async with httpx.AsyncClient(transport=transport,
+                                 base_url="http://bench") as client:
+        async def worker(worker_idx: int) -> None:
+            for request_idx in range(worker_idx, n_requests, concurrency):
+                asset_name, market = pairs[request_idx % len(pairs)]
+                started = time.perf_counter()
+                response = await client.get(
+                    "/price",
+                    params={"asset_name": asset_name, "market": market})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == status.HTTP_200_OK
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(idx) for idx in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return n_requests / elapsed, latencies
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+async def main(n_requests: int, concurrency: int) -> None:
+    """Runs the same load against both handlers sharing one assets
+    manager with running prices update loops."""
+    manager = assets_manager.AssetsManager(get_config_filepath())
+    generator.app.state.assets_manager = manager
+    generator.app.state.broadcaster = broadcaster.PriceBroadcaster()
+    generator.start_background_tasks(generator.app)
+    pairs = list(manager.prices_dict)
+
+    variants = [
+        ("thread pool", build_executor_app(manager)),
+        ("event loop route", build_route_app()),
+        ("ASGI fast path", generator.app),
+    ]
+    print(f"{n_requests} requests, concurrency {concurrency}")
+    print(f"{'variant':<22}{'req/s':>10}{'p50, ms':>10}{'p99, ms':>10}")
+    for name, asgi_app in variants:
+        await run_load(asgi_app, pairs, n_requests // 10, concurrency)
+        rps, latencies = await run_load(asgi_app, pairs, n_requests,
+                                        concurrency)
+        print(f"{name:<22}{rps:>10.0f}"
+              f"{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        n_requests=int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+        concurrency=int(sys.argv[2]) if len(sys.argv) > 2 else 100))
@@ -0,0 +1,71 @@
+"""Benchmark of assets manager startup on a large catalog
+
+Generates a synthetic catalog (1000 assets on 100 markets, 100k pairs by
+default) in a temporary folder and measures initialization of each price
+engine, with a cold catalog cache (first start after a catalog change)
+and a warm one (restart, e.g. failover recovery behind Nginx).
+
+Usage (from `prices_generator` folder):
+    python -m benchmarks.bench_startup [assets] [markets]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+from app.core import assets_manager, vectorized_assets_manager
+from app.utils.utils import load_yaml_file
+
+
+ENGINES = [
+    ("default", assets_manager.AssetsManager),
+    ("vectorized", vectorized_assets_manager.VectorizedAssetsManager),
+]
+
+
+def write_catalog(folder: str, n_assets: int, n_markets: int) -> str:
+    """Write price config with synthetic assets and markets catalogs.
+    Returns price config location."""
+    with open(os.path.join(folder, 'assets.yaml'), 'w') as file:
+        yaml.safe_dump([f"Asset{idx}" for idx in range(n_assets)], file)
+    with open(os.path.join(folder, 'markets.yaml'), 'w') as file:
+        yaml.safe_dump([f"Market{idx}" for idx in range(n_markets)], file)
+
+    config_filepath = os.path.join(folder, 'price_config.yaml')
+    with open(config_filepath, 'w') as file:
+        yaml.safe_dump({
+            'price_config': load_yaml_file(os.path.join(
+                os.path.dirname(assets_manager.__file__), '..', 'utils',
+                'config', 'price_config.yaml'))['price_config'],
+            'assets_file': 'assets.yaml',
+            'markets_file': 'markets.yaml',
+        }, file)
+    return config_filepath
+
+
+def main(n_assets: int, n_markets: int) -> None:
+    """Time initialization of each engine with cold and warm cache"""
+    folder = tempfile.mkdtemp()
+    try:
+        config_filepath = write_catalog(folder, n_assets, n_markets)
+        print(f"{n_assets * n_markets} pairs")
+        print(f"{'engine':<14}{'cold, s':>10}{'warm, s':>10}")
+        for name, engine in ENGINES:
+            timings = []
+            for _ in range(2):
+                started = time.perf_counter()
+                engine(config_filepath)
+                timings.append(time.perf_counter() - started)
+            print(f"{name:<14}{timings[0]:>10.3f}{timings[1]:>10.3f}")
+            shutil.rmtree(os.path.join(folder, '.catalog_cache'),
+                          ignore_errors=True)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(n_assets=int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         n_markets=int(sys.argv[2]) if len(sys.argv) > 2 else 100)
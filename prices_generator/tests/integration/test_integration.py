@@ -6,6 +6,7 @@ from fastapi import Response, status
 import pytest
 
 from app.app import app
+from app.utils import schemas
 
 
 BASE_URL = "/price"
@@ -159,3 +160,152 @@ def assert_dict_contains_keys(expected_keys: list[str], dict_obj: dict) -> set:
     missing_keys = set(expected_keys) - set(dict_obj.keys())
     assert not missing_keys, (
         f"Missing expected keys {missing_keys} in response: {dict_obj}")
+
+
+PRICES_URL = "/prices"
+
+
+@pytest.mark.parametrize(
+        "query_params, expected_pairs", [
+            # filter by both assets and markets
+            ("asset_name=Oil&market=US&market=UK",
+             {("Oil", "US"), ("Oil", "UK")}),
+            # filter by assets only returns all markets of the asset
+            ("asset_name=Copper",
+             {("Copper", market)
+              for market in ["US", "UK", "Europe", "Asia", "Africa"]}),
+            # unknown values are skipped
+            ("asset_name=Oil&asset_name=Unknown&market=US",
+             {("Oil", "US")}),
+            ("asset_name=Unknown", set()),
+        ]
+    )
+def test_bulk_prices_returns_requested_pairs(
+        query_params: str, expected_pairs: set, client: TestClient
+        ) -> None:
+    """Bulk prices request is expected to return exactly one price quote
+    for each requested known asset and market pair."""
+    response = client.get(f"{PRICES_URL}?{query_params}")
+    assert response.status_code == STATUS_OK
+
+    response_json = convert_to_json(response)
+    assert_dict_contains_keys(expected_keys=['prices'],
+                              dict_obj=response_json)
+
+    prices = response_json['prices']
+    returned_pairs = [(price["name"], price["market"]) for price in prices]
+    assert len(returned_pairs) == len(expected_pairs)
+    assert set(returned_pairs) == expected_pairs
+    for price in prices:
+        assert_dict_contains_keys(
+            expected_keys=['name', 'market', 'price', 'spread',
+                           'price_quote_id'],
+            dict_obj=price)
+        assert 0 < float(price["price"])
+
+
+def test_bulk_prices_without_filter_returns_whole_book(
+        client: TestClient) -> None:
+    """Bulk prices request without parameters is expected to return
+    every asset and market pair."""
+    response = client.get(PRICES_URL)
+    assert response.status_code == STATUS_OK
+
+    prices = convert_to_json(response)['prices']
+    assets_manager = client.app.state.assets_manager
+    assert ({(price["name"], price["market"]) for price in prices}
+            == set(assets_manager.prices_dict))
+
+
+def test_unknown_pair_price_quote_returns_not_found(client: TestClient
+                                                    ) -> None:
+    """Requests for unknown pairs are not served by the fast path and are
+    expected to keep regular 404 response."""
+    response = client.get(f"{BASE_URL}?market=US&asset_name=Unknown")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert convert_to_json(response) == {
+        'detail': 'Asset and market pair not found'}
+
+
+def test_price_quote_reflects_latest_update(client: TestClient) -> None:
+    """Pre-encoded price quote is expected to be refreshed once price of
+    the pair is updated."""
+    assets_manager = client.app.state.assets_manager
+    asset_price = assets_manager.get_curr_asset_price(
+        schemas.Asset(name="Oil", market="US"))
+
+    updated_price = assets_manager.update_asset_price(asset_price)
+    response_json = convert_to_json(
+        client.get(f"{BASE_URL}?market=US&asset_name=Oil"))
+
+    # background update loop may have updated the pair once more meanwhile
+    latest_price = assets_manager.get_curr_asset_price(
+        schemas.Asset(name="Oil", market="US"))
+    assert ((response_json["price"], response_json["spread"])
+            in [(updated_price.price, updated_price.spread),
+                (latest_price.price, latest_price.spread)])
+
+
+def test_price_quote_id_new_in_every_response(client: TestClient) -> None:
+    """Price quotes served from pre-encoded ones are expected to get a
+    new `price_quote_id` in every response, as other endpoints do."""
+    quote_ids = {convert_to_json(client.get(
+        f"{BASE_URL}?market=US&asset_name=Oil"))["price_quote_id"]
+                 for _ in range(3)}
+    assert len(quote_ids) == 3
+
+
+def test_catalog_lists_served_pairs(client: TestClient) -> None:
+    """Catalog is expected to list assets and markets of all served pairs
+    with a version that stays the same between requests."""
+    response = client.get("/catalog")
+    assert response.status_code == STATUS_OK
+
+    catalog = convert_to_json(response)
+    assets_manager = client.app.state.assets_manager
+    assert ({(asset, market) for asset in catalog["assets"]
+             for market in catalog["markets"]}
+            == set(assets_manager.pairs))
+    assert catalog["version"] == convert_to_json(
+        client.get("/catalog"))["version"]
+
+
+def test_responses_carry_server_id(client: TestClient) -> None:
+    """Every response, including fast path ones, is expected to name the
+    replica that served it, and quotes to carry their update time."""
+    response = client.get(f"{BASE_URL}?market=US&asset_name=Oil")
+    assert response.headers["x-server-id"]
+    assert convert_to_json(response)["updated_at"] > 0
+
+    response = client.get(f"{BASE_URL}?market=US&asset_name=Unknown")
+    assert response.headers["x-server-id"]
+
+
+def get_metrics_samples(client: TestClient) -> dict:
+    """Scrape metrics, checking the format, and return value of each
+    sample by its name and labels"""
+    response = client.get("/metrics")
+    assert response.status_code == STATUS_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    return {name: float(value) for name, value in (
+        line.rsplit(" ", 1) for line in response.text.splitlines()
+        if not line.startswith("#"))}
+
+
+def test_metrics_count_requests(client: TestClient) -> None:
+    """Metrics are expected to be served in Prometheus text format and to
+    count fast path and regular responses by path and status."""
+    before = get_metrics_samples(client)
+    client.get(f"{BASE_URL}?market=US&asset_name=Oil")
+    client.get(f"{BASE_URL}?market=US&asset_name=Unknown")
+    client.get(f"{BASE_URL}?market=US")
+    client.get("/unknown")
+    after = get_metrics_samples(client)
+
+    for path, status_code in (("/price", 200), ("/price", 404),
+                              ("/price", 422), ("other", 404)):
+        name = (f'generator_http_requests_total{{path="{path}",'
+                f'status="{status_code}"}}')
+        assert after[name] - before.get(name, 0) == 1
+    assert after["generator_scheduler_ticks_total"] >= 1
+    assert 'generator_event_loop_lag_seconds{quantile="0.99"}' in after
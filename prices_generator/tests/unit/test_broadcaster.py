@@ -0,0 +1,79 @@
+"""Prices broadcaster tests suite"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.app import price_events
+from app.core.broadcaster import PriceBroadcaster
+from app.utils import schemas
+
+
+def make_price(name: str, market: str, price: float) -> schemas.AssetPrice:
+    """Get asset price with a fixed spread"""
+    return schemas.AssetPrice(name=name, market=market, price=price,
+                              spread=1.0)
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_subscriber_receives_only_matching_updates():
+    """Updates are expected to be delivered according to subscription
+    filters."""
+    broadcaster = PriceBroadcaster()
+    oil_subscription = broadcaster.subscribe(asset_names=["Oil"])
+    us_subscription = broadcaster.subscribe(markets=["US"])
+
+    broadcaster.publish(make_price("Oil", "UK", 10))
+    broadcaster.publish(make_price("Copper", "US", 20))
+
+    assert [(p.name, p.market) for p in await oil_subscription.get()] == [
+        ("Oil", "UK")]
+    assert [(p.name, p.market) for p in await us_subscription.get()] == [
+        ("Copper", "US")]
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_slow_subscriber_gets_conflated_and_bounded_updates():
+    """Repeated updates of a pair are expected to be conflated to the
+    latest one, and the oldest pairs dropped once buffer is full."""
+    broadcaster = PriceBroadcaster(max_buffer_size=2)
+    subscription = broadcaster.subscribe()
+
+    broadcaster.publish(make_price("Oil", "US", 10))
+    broadcaster.publish(make_price("Oil", "US", 11))
+    broadcaster.publish(make_price("Oil", "UK", 12))
+    broadcaster.publish(make_price("Copper", "US", 13))
+
+    updates = await subscription.get()
+    assert [(p.name, p.market, p.price) for p in updates] == [
+        ("Oil", "UK", 12), ("Copper", "US", 13)]
+    assert subscription.conflated_count == 1
+    assert subscription.dropped_count == 1
+
+    # nothing pending anymore
+    assert await subscription.get(timeout=0.01) == []
+
+
+@pytest.mark.asyncio(loop_scope='function')
+async def test_price_events_stream_snapshot_then_updates():
+    """Stream is expected to start with snapshot, continue with updates
+    and unsubscribe once closed."""
+    broadcaster = PriceBroadcaster()
+    subscription = broadcaster.subscribe()
+    events = price_events(broadcaster, subscription,
+                          [make_price("Oil", "US", 10)])
+
+    first_event = await anext(events)
+    broadcaster.publish(make_price("Oil", "US", 11))
+    second_event = await asyncio.wait_for(anext(events), timeout=1)
+
+    for event, expected_price in [(first_event, 10), (second_event, 11)]:
+        event_type, data = event.strip().split("\n")
+        assert event_type == "event: price"
+        quote = json.loads(data.removeprefix("data: "))
+        assert quote["price"] == expected_price
+        assert "price_quote_id" in quote
+
+    await events.aclose()
+    assert not broadcaster.subscribers
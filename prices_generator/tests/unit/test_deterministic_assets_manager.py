@@ -0,0 +1,80 @@
+"""Deterministic assets manager tests suite"""
+
+import numpy as np
+
+from app.core.deterministic_assets_manager import (
+    DeterministicAssetsManager, UPDATE_WINDOW_S)
+from app.core.vectorized_assets_manager import (
+    UPDATE_INTERVAL_MAX_S, UPDATE_INTERVAL_MIN_S)
+from app.utils.utils import get_config_filepath
+
+
+START_TIME = 1_700_000_000.0
+
+
+def get_manager(now: float, seed: int = 42) -> DeterministicAssetsManager:
+    """Get deterministic assets manager initialized with default config"""
+    return DeterministicAssetsManager(get_config_filepath(), now=now,
+                                      seed=seed)
+
+
+def test_replicas_agree_regardless_of_history():
+    """A replica running for a while and a replica started just now are
+    expected to return identical prices, spreads and versions."""
+    running_replica = get_manager(START_TIME)
+    for step in range(1, 300):
+        running_replica.update_due(START_TIME + step * 0.1)
+
+    now = START_TIME + 299 * 0.1
+    new_replica = get_manager(now)
+
+    assert running_replica.pairs == new_replica.pairs
+    np.testing.assert_array_equal(running_replica.prices, new_replica.prices)
+    np.testing.assert_array_equal(running_replica.spreads,
+                                  new_replica.spreads)
+    np.testing.assert_array_equal(running_replica.versions,
+                                  new_replica.versions)
+    np.testing.assert_array_equal(running_replica.updated_ats,
+                                  new_replica.updated_ats)
+
+    other_seed_replica = get_manager(now, seed=7)
+    assert not np.array_equal(other_seed_replica.prices, new_replica.prices)
+
+
+def test_update_intervals_within_range():
+    """Each pair is expected to be updated every 1-3 s, and stamped with
+    the moment of the update"""
+    manager = get_manager(START_TIME)
+    updates = {idx: [] for idx in range(len(manager.pairs))}
+    for step in range(1, 2000):
+        now = START_TIME + step * 0.01
+        updated_ids = manager.update_due(now)
+        assert np.all(manager.updated_ats[updated_ids] <= now)
+        assert np.all(manager.updated_ats[updated_ids] > now - 0.02)
+        for idx in updated_ids.tolist():
+            updates[idx].append(now)
+
+    intervals = np.concatenate([np.diff(times) for times in updates.values()])
+    assert intervals.size
+    assert intervals.min() >= UPDATE_INTERVAL_MIN_S - 0.01
+    assert intervals.max() <= UPDATE_INTERVAL_MAX_S + 0.01
+
+
+def test_session_returns_to_open_price():
+    """Prices are expected to be back at open price at session end, so
+    there is no jump to the next session, and to wander in between."""
+    manager = get_manager(START_TIME)
+    session_start = (START_TIME // manager.session_s + 1) * manager.session_s
+
+    manager.update_due(session_start - UPDATE_WINDOW_S / 2)
+    np.testing.assert_allclose(manager.prices, manager.open_prices,
+                               atol=1e-4)
+    session_end_versions = manager.versions.copy()
+    # spreads are redrawn, so versions go on growing
+    manager.update_due(session_start)
+    assert (manager.versions > session_end_versions).all()
+
+    manager.update_due(session_start + UPDATE_WINDOW_S)
+    assert (manager.prices > 0).all()
+    manager.update_due(session_start + manager.session_s / 2)
+    assert not np.allclose(manager.prices, manager.open_prices)
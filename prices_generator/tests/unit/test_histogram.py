@@ -0,0 +1,38 @@
+"""Latency histogram tests suite"""
+
+import pytest
+
+from app.utils.histogram import LatencyHistogram
+
+
+def test_percentiles_keep_relative_precision():
+    """Percentiles are expected to be within bucket precision of the exact
+    ones, from microseconds to seconds, and never above the maximum"""
+    histogram = LatencyHistogram()
+    values = [idx * 1e-5 for idx in range(1, 100001)]
+    for value in values:
+        histogram.record(value)
+
+    for percentile, (value,) in ((50, histogram.get_percentiles([50])),
+                                 (99, histogram.get_percentiles([99])),
+                                 (99.9, histogram.get_percentiles([99.9]))):
+        exact = values[int(len(values) * percentile / 100) - 1]
+        assert value == pytest.approx(exact, rel=1 / 64)
+    assert histogram.get_percentiles([100]) == [histogram.max_s]
+    assert histogram.count == len(values)
+    # log-linear buckets: a few hundred cover five orders of magnitude
+    assert len(histogram.counts) < 1000
+    assert sum(count for _, count in histogram.get_buckets()) == len(values)
+
+
+def test_small_and_negative_values():
+    """Values below the linear range are expected to be exact, negative
+    ones counted as zero, and an empty histogram to report zeros"""
+    histogram = LatencyHistogram()
+    assert histogram.get_percentiles([50, 99]) == [0.0, 0.0]
+    assert histogram.format() == "p50 0.0 p99 0.0 p99.9 0.0 ms (n=0)"
+
+    histogram.record(-0.5)
+    histogram.record(42e-6)
+    assert histogram.get_percentiles([50, 100]) == [0.0, pytest.approx(42e-6)]
+    assert histogram.mean_s == pytest.approx(21e-6)
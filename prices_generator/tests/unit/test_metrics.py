@@ -0,0 +1,47 @@
+"""Metrics registry tests suite"""
+
+import pytest
+
+from app.utils.histogram import LatencyHistogram
+from app.utils.metrics import MetricsRegistry, format_value
+
+
+def test_metrics_rendered_in_text_format():
+    """Metrics are expected to be rendered with help, type, escaped labels
+    and summary quantiles, reading current values on each render"""
+    counts = {'requests': 0}
+    histogram = LatencyHistogram()
+    histogram.record(0.002)
+    registry = MetricsRegistry()
+    registry.add_value('requests_total', 'counter', 'Requests',
+                       lambda: counts['requests'])
+    registry.add('errors_total', 'counter', 'Errors',
+                 lambda: [({'type': 'say "hi"\n'}, 1.5)])
+    registry.add('wait_seconds', 'summary', 'Wait',
+                 lambda: [({'stage': 'fetch'}, histogram)])
+    counts['requests'] = 3
+
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total 3',
+        '# HELP errors_total Errors',
+        '# TYPE errors_total counter',
+        'errors_total{type="say \\"hi\\"\\n"} 1.5',
+        '# HELP wait_seconds Wait',
+        '# TYPE wait_seconds summary',
+        'wait_seconds{stage="fetch",quantile="0.5"} 0.002',
+        'wait_seconds{stage="fetch",quantile="0.99"} 0.002',
+        'wait_seconds{stage="fetch",quantile="0.999"} 0.002',
+        'wait_seconds_sum{stage="fetch"} 0.002',
+        'wait_seconds_count{stage="fetch"} 1']
+    with pytest.raises(ValueError):
+        registry.add('histogram', 'histogram', 'Unsupported', list)
+
+
+def test_values_formatted_for_prometheus():
+    """Booleans are expected to be rendered as integers, and special
+    floats the way Prometheus spells them"""
+    assert [format_value(value) for value in (
+        True, 7, 0.1 + 0.2, float('nan'), float('inf'), float('-inf'))
+    ] == ['1', '7', '0.3', 'NaN', '+Inf', '-Inf']
@@ -0,0 +1,84 @@
+"""Price update scheduler tests suite"""
+
+import pytest
+
+from app.core.assets_manager import AssetsManager
+from app.core.broadcaster import PriceBroadcaster
+from app.core.scheduler import PriceUpdateScheduler
+from app.core.vectorized_assets_manager import VectorizedAssetsManager
+from app.utils.utils import get_config_filepath
+
+
+START_TIME = 100.0
+
+
+@pytest.fixture(name="manager", scope="function")
+def manager_fixture():
+    """Get default assets manager initialized with the default config"""
+    return AssetsManager(get_config_filepath(), now=START_TIME)
+
+
+def test_heap_updates_only_due_pairs(manager: AssetsManager):
+    """Every pair is due right away, then gets its own 1-3 s deadline and
+    is not updated before it."""
+    updated_pairs = manager.update_due(START_TIME)
+    assert set(updated_pairs) == set(manager.prices_dict)
+
+    deadlines = {pair: deadline
+                 for deadline, pair in manager.update_deadlines}
+    assert all(START_TIME + 1 <= deadline <= START_TIME + 3
+               for deadline in deadlines.values())
+    assert manager.get_next_update_at() == min(deadlines.values())
+
+    assert manager.update_due(START_TIME + 0.5) == []
+    updated_pairs = manager.update_due(START_TIME + 2)
+    assert set(updated_pairs) == {
+        pair for pair, deadline in deadlines.items()
+        if deadline <= START_TIME + 2}
+
+
+def test_each_pair_updated_once_per_deadline(manager: AssetsManager):
+    """Pairs are expected to be updated on every deadline they reach,
+    exactly once."""
+    updates = {pair: 0 for pair in manager.prices_dict}
+    for step in range(0, 100):
+        for pair in manager.update_due(START_TIME + step * 0.1):
+            updates[pair] += 1
+
+    # 10 s with 1-3 s intervals: from 4 to 10 updates of each pair
+    assert all(4 <= count <= 10 for count in updates.values())
+
+
+@pytest.mark.asyncio(loop_scope='function')
+@pytest.mark.parametrize("manager_class",
+                         [AssetsManager, VectorizedAssetsManager])
+async def test_scheduler_tracks_lag_and_publishes(manager_class):
+    """Scheduler is expected to update due pairs in a batch, publish them
+    and record how late the batch was."""
+    manager = manager_class(get_config_filepath(), now=START_TIME)
+    broadcaster = PriceBroadcaster()
+    subscription = broadcaster.subscribe()
+    scheduler = PriceUpdateScheduler(manager, broadcaster, tick_s=0.1)
+
+    assert scheduler.run_once(START_TIME + 0.25) == len(manager.prices_dict)
+    assert scheduler.lag.last_s == pytest.approx(0.25)
+    assert scheduler.lag.histogram.get_percentiles([50]) == [
+        pytest.approx(0.25, rel=0.02)]
+    assert len(await subscription.get()) == len(manager.prices_dict)
+
+    assert scheduler.run_once(START_TIME + 0.5) == 0
+    assert scheduler.lag.count == 1
+
+
+def test_scheduler_wakes_up_at_tick_granularity(manager: AssetsManager):
+    """Delay till the next wakeup is expected to reach the earliest
+    deadline rounded up to whole ticks, one tick at least."""
+    scheduler = PriceUpdateScheduler(manager, tick_s=0.1)
+    assert scheduler.get_delay(START_TIME) == pytest.approx(0.1)
+
+    scheduler.run_once(START_TIME)
+    next_update_at = manager.get_next_update_at()
+    assert next_update_at is not None
+    delay = scheduler.get_delay(START_TIME)
+    assert next_update_at - START_TIME <= delay < (
+        next_update_at - START_TIME + 0.1)
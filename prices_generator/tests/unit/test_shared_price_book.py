@@ -0,0 +1,77 @@
+"""Shared memory price book tests suite"""
+
+import uuid
+
+import numpy as np
+import pytest
+
+from app.core.shared_price_book import SharedBookAssetsManager, SharedPriceBook
+from app.core.vectorized_assets_manager import VectorizedAssetsManager
+from app.utils import schemas
+from app.utils.utils import get_config_filepath
+
+
+@pytest.fixture(name="writer", scope="function")
+def writer_fixture():
+    """Get vectorized assets manager and a price book it publishes to"""
+    assets_manager = VectorizedAssetsManager(get_config_filepath(), now=0.0)
+    book = SharedPriceBook.create(f"test_book_{uuid.uuid4().hex[:8]}",
+                                  assets_manager.pairs)
+    book.prices[:] = assets_manager.prices
+    book.spreads[:] = assets_manager.spreads
+    yield assets_manager, book
+    book.close()
+    book.unlink()
+
+
+def test_reader_serves_writer_prices(writer):
+    """Reader attached to the book is expected to get the catalog and
+    prices published by the writer, including subsequent updates."""
+    assets_manager, book = writer
+    reader = SharedBookAssetsManager(get_config_filepath(),
+                                     book_name=book.shm.name)
+    assert reader.pairs == assets_manager.pairs
+
+    asset_name, market = assets_manager.pairs[0]
+    asset = schemas.Asset(name=asset_name, market=market)
+    assert (reader.get_curr_asset_price(asset).price
+            == assets_manager.prices[0])
+    assert reader.update_due(0.0).size == 0
+
+    updated_ids = assets_manager.update_due(0.0)
+    book.write(updated_ids, assets_manager.prices[updated_ids],
+               assets_manager.spreads[updated_ids], 1700000000.0)
+
+    np.testing.assert_array_equal(reader.update_due(0.0), updated_ids)
+    assert (reader.get_curr_asset_price(asset).price
+            == assets_manager.prices[0])
+    snapshot = reader.get_prices_snapshot()
+    assert ([price.price for price in snapshot]
+            == assets_manager.prices.tolist())
+    assert {price.version for price in snapshot} == {1}
+    assert {price.updated_at for price in snapshot} == {1700000000.0}
+
+    # sequence is even after each write, version counts updates
+    assert book.read(0)[2] == 1
+    reader.book.close()
+
+
+def test_encoded_price_follows_updates(writer):
+    """Pre-encoded quote of the reader is expected to be refreshed once
+    the writer publishes an update."""
+    assets_manager, book = writer
+    reader = SharedBookAssetsManager(get_config_filepath(),
+                                     book_name=book.shm.name)
+    asset_name, market = assets_manager.pairs[0]
+
+    quotes = [schemas.PriceQuoteOut.model_validate_json(
+        reader.get_encoded_price(asset_name, market)) for _ in range(2)]
+    assert quotes[0].version == quotes[1].version
+    assert quotes[0].price_quote_id != quotes[1].price_quote_id
+
+    book.write(np.array([0]), np.array([123.5]), np.array([2.0]))
+    quote = schemas.PriceQuoteOut.model_validate_json(
+        reader.get_encoded_price(asset_name, market))
+    assert (quote.price, quote.spread, quote.version) == (123.5, 2.0, 1)
+    assert reader.get_encoded_price("Unknown", market) is None
+    reader.book.close()
@@ -0,0 +1,50 @@
+"""Utils tests suite"""
+
+import os
+
+import pytest
+
+from app.utils.utils import load_catalog_file
+
+
+@pytest.fixture(name="catalog_file", scope="function")
+def catalog_file_fixture(tmp_path):
+    """Get assets catalog in a temporary folder"""
+    catalog_file = tmp_path / "assets.yaml"
+    catalog_file.write_text("- Copper\n# - Gold\n- Oil\n")
+    return catalog_file
+
+
+def test_catalog_is_compiled_once(catalog_file, tmp_path):
+    """Catalog is expected to be parsed on the first load only and served
+    from the compiled cache afterwards."""
+    cache_dir = tmp_path / ".catalog_cache"
+    assert load_catalog_file(str(catalog_file)) == ["Copper", "Oil"]
+    cache_files = os.listdir(cache_dir)
+    assert len(cache_files) == 1
+
+    # cache is used as long as the catalog content is the same
+    (cache_dir / cache_files[0]).write_text('["Cached"]')
+    assert load_catalog_file(str(catalog_file)) == ["Cached"]
+
+
+def test_changed_catalog_is_compiled_again(catalog_file, tmp_path):
+    """Edited catalog is expected to be parsed once again, replacing the
+    outdated compiled one."""
+    cache_dir = tmp_path / ".catalog_cache"
+    load_catalog_file(str(catalog_file))
+    outdated_files = os.listdir(cache_dir)
+
+    catalog_file.write_text("- Copper\n- Gold\n")
+    assert load_catalog_file(str(catalog_file)) == ["Copper", "Gold"]
+    cache_files = os.listdir(cache_dir)
+    assert len(cache_files) == 1
+    assert cache_files != outdated_files
+
+
+def test_catalog_loads_without_writable_cache(catalog_file, tmp_path):
+    """Unwritable cache location is expected to only skip caching"""
+    not_a_folder = tmp_path / "file"
+    not_a_folder.write_text("")
+    assert load_catalog_file(str(catalog_file),
+                             cache_dir=str(not_a_folder)) == ["Copper", "Oil"]
@@ -0,0 +1,101 @@
+"""Vectorized assets manager tests suite"""
+
+import numpy as np
+import pytest
+
+from app.core.vectorized_assets_manager import (
+    VectorizedAssetsManager, UPDATE_INTERVAL_MIN_S, UPDATE_INTERVAL_MAX_S)
+from app.utils import schemas
+from app.utils.utils import get_config_filepath
+
+
+START_TIME = 100.0
+
+
+@pytest.fixture(name="manager", scope="function")
+def manager_fixture():
+    """Get vectorized assets manager initialized with the default config"""
+    return VectorizedAssetsManager(get_config_filepath(), now=START_TIME)
+
+
+def test_all_pairs_initialized(manager: VectorizedAssetsManager):
+    """Every asset and market combination is expected to get a positive
+    price and be due for update right away."""
+    config = manager.price_config
+    expected_pairs = {(asset, market)
+                      for asset in config.assets for market in config.markets}
+
+    assert set(manager.prices_dict) == expected_pairs
+    assert (manager.prices > 0).all()
+    assert (manager.next_update_at == START_TIME).all()
+
+
+def test_only_due_pairs_are_updated(manager: VectorizedAssetsManager):
+    """After the first batch update each pair gets its own deadline
+    within the 1-3 s range, and pairs are not updated before it."""
+    updated_ids = manager.update_due(START_TIME)
+    assert updated_ids.size == len(manager.pairs)
+
+    intervals = manager.next_update_at - START_TIME
+    assert (intervals >= UPDATE_INTERVAL_MIN_S).all()
+    assert (intervals <= UPDATE_INTERVAL_MAX_S).all()
+
+    prices_before = manager.prices.copy()
+    assert manager.update_due(START_TIME + 0.5).size == 0
+    np.testing.assert_array_equal(manager.prices, prices_before)
+
+    next_deadline = manager.next_update_at.min()
+    updated_ids = manager.update_due(next_deadline)
+    assert updated_ids.size >= 1
+    assert (manager.next_update_at[updated_ids] > next_deadline).all()
+
+
+def test_non_positive_price_is_clamped(manager: VectorizedAssetsManager):
+    """A price change making price non-positive is expected to be replaced
+    by maximum allowed positive change."""
+    manager.price_config.price_change_max = 2
+    manager.prices[:] = 1.0
+    manager.rng = np.random.default_rng(0)
+
+    for tick in range(20):
+        manager.update_due(START_TIME + tick * UPDATE_INTERVAL_MAX_S)
+        assert (manager.prices > 0).all()
+
+
+def test_get_curr_asset_price(manager: VectorizedAssetsManager):
+    """Returns an `AssetPrice` for a known pair and None otherwise"""
+    asset_name, market = manager.pairs[0]
+    asset_price = manager.get_curr_asset_price(
+        schemas.Asset(name=asset_name, market=market))
+    assert asset_price is not None
+    assert asset_price.price == manager.prices[0]
+    assert asset_price.spread == manager.spreads[0]
+
+    assert manager.get_curr_asset_price(
+        schemas.Asset(name="Unknown", market=market)) is None
+
+
+def test_version_changes_with_price_only(manager: VectorizedAssetsManager):
+    """Quotes of a pair are expected to keep their version until the pair
+    is updated"""
+    asset_name, market = manager.pairs[0]
+    asset = schemas.Asset(name=asset_name, market=market)
+
+    def get_version() -> int:
+        asset_price = manager.get_curr_asset_price(asset)
+        assert asset_price is not None
+        return asset_price.version
+
+    assert get_version() == 0
+
+    manager.update_due(START_TIME)
+    assert get_version() == 1
+    assert manager.update_due(START_TIME + 0.5).size == 0
+    assert get_version() == 1
+    payload = manager.get_encoded_price(asset_name, market)
+    assert payload is not None
+    quote = schemas.PriceQuoteOut.model_validate_json(payload)
+    assert quote.version == 1
+    assert {price.version for price in manager.get_prices_snapshot()} == {1}
+    # stamped with the update time, for freshness tracing downstream
+    assert quote.updated_at >= manager.get_prices_snapshot()[-1].updated_at